@@ -1,11 +1,25 @@
 import pandas as pd
-import mysql.connector
-from prophet import Prophet
+import db_instrumentation
+import request_metrics
 from datetime import datetime, timedelta
 import os
+from model_registry import web_only
+import parquet_archive
+
+# Where the daily time series come from: 'db' (SQL over news and the enrichment
+# tables) or 'parquet' (pandas over the columnar archive, see parquet_archive.py,
+# which only reads the date partitions in range and the columns it needs).
+ANALYTICS_SOURCE = (os.getenv("ANALYTICS_SOURCE") or "db").lower()
+
+def use_parquet():
+    return ANALYTICS_SOURCE == "parquet"
+
+def window_start(days):
+    """CURDATE() - INTERVAL days DAY, as a constant: a partitioned news table only reads the months in range."""
+    return datetime.combine(datetime.now().date() - timedelta(days=days), datetime.min.time())
 
 def connect_db():
-    return mysql.connector.connect(
+    return db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
         user=os.getenv("MYSQL_USER"), 
         password=os.getenv("MYSQL_PASSWORD"), 
@@ -18,12 +32,12 @@ def fetch_daily_counts(table, column, start_days_ago=90):
     query = f"""
         SELECT DATE(publishedAt) as day, COUNT(*) as cnt
         FROM {table}
-        WHERE publishedAt >= CURDATE() - INTERVAL %s DAY
+        WHERE publishedAt >= %s
         AND {column} IS NOT NULL AND {column} != ''
         GROUP BY day
         ORDER BY day ASC;
     """
-    cursor.execute(query, (start_days_ago,))
+    cursor.execute(query, (window_start(start_days_ago),))
     days, counts = [], []
     for day, cnt in cursor.fetchall():
         days.append(str(day))
@@ -31,21 +45,45 @@ def fetch_daily_counts(table, column, start_days_ago=90):
     cursor.close(); conn.close()
     return days, counts
 
+def parquet_daily_counts(days=90):
+    counts = parquet_archive.read(['id'], days=days).groupby('date').size().sort_index()
+    return [str(day) for day in counts.index], counts.tolist()
+
+def parquet_sentiment_counts(days=90):
+    """Articles per day and overall sentiment, as a DataFrame indexed by date."""
+    df = parquet_archive.read(['sentiment'], days=days).dropna(subset=['sentiment'])
+    table = df.groupby(['date', 'sentiment']).size().unstack(fill_value=0).sort_index()
+    return table.reindex(columns=['positive', 'neutral', 'negative'], fill_value=0)
+
+def parquet_sentiment_percentages(days=90):
+    """Mean sentiment scores per day, rounded like the SQL version."""
+    df = parquet_archive.read(['positive', 'neutral', 'negative'], days=days).dropna(subset=['positive'])
+    means = df.astype({'positive': 'float64', 'neutral': 'float64', 'negative': 'float64'}) \
+              .groupby('date')[['positive', 'neutral', 'negative']].mean().sort_index()
+    return means.fillna(0).round().astype(int)
+
 def get_news_volume_timeseries(days=90):
-    days_list, counts = fetch_daily_counts('news', 'id', start_days_ago=days)
+    if use_parquet():
+        days_list, counts = parquet_daily_counts(days)
+    else:
+        days_list, counts = fetch_daily_counts('news', 'id', start_days_ago=days)
     return pd.DataFrame({'ds': days_list, 'y': counts}), days_list, counts
 
 def get_sentiment_timeseries(days=90):
+    if use_parquet():
+        table = parquet_sentiment_counts(days)
+        return ([str(day) for day in table.index], table['positive'].tolist(),
+                table['neutral'].tolist(), table['negative'].tolist())
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT DATE(n.publishedAt), s.overall, COUNT(*) 
         FROM news n 
         JOIN sentiments s ON n.id = s.article_id
-        WHERE n.publishedAt >= CURDATE() - INTERVAL %s DAY
+        WHERE n.publishedAt >= %s
         GROUP BY DATE(n.publishedAt), s.overall
         ORDER BY DATE(n.publishedAt) ASC;
-    """, (days,))
+    """, (window_start(days),))
     days_set = set()
     by_day = {}
     for day, sentiment, cnt in cursor.fetchall():
@@ -64,17 +102,22 @@ def get_sentiment_timeseries(days=90):
     return days_list, pos, neu, neg
 
 def get_topic_timeseries(topic_id, days=90):
+    if use_parquet():
+        df = parquet_archive.read(['topic_ids'], days=days).explode('topic_ids')
+        counts = df[df['topic_ids'] == topic_id].groupby('date').size().sort_index()
+        days_list, counts = [str(day) for day in counts.index], counts.tolist()
+        return pd.DataFrame({'ds': days_list, 'y': counts}), days_list, counts
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute("""
         SELECT DATE(n.publishedAt), COUNT(*)
         FROM article_topics_mapping atm
         JOIN news n ON atm.article_id = n.id
-        WHERE n.publishedAt >= CURDATE() - INTERVAL %s DAY
+        WHERE n.publishedAt >= %s
           AND atm.topic_id = %s
         GROUP BY DATE(n.publishedAt)
         ORDER BY DATE(n.publishedAt) ASC;
-    """, (days, topic_id))
+    """, (window_start(days), topic_id))
     days, counts = [], []
     for day, cnt in cursor.fetchall():
         days.append(str(day))
@@ -86,10 +129,15 @@ def get_topic_timeseries(topic_id, days=90):
 def forecast_timeseries(df, periods=7):
     if df.dropna().shape[0] < 2:
         return [], []
-    m = Prophet()
-    m.fit(df)
-    future = m.make_future_dataframe(periods=periods)
-    forecast = m.predict(future)
+    # Prophet (and its Stan backend) is only imported when a forecast is needed
+    if web_only():
+        return [], []
+    from prophet import Prophet
+    with request_metrics.timer("model"):
+        m = Prophet()
+        m.fit(df)
+        future = m.make_future_dataframe(periods=periods)
+        forecast = m.predict(future)
     fcast_dates = forecast['ds'][-periods:].dt.strftime('%Y-%m-%d').tolist()
     fcast_values = forecast['yhat'][-periods:].round(2).tolist()
     return fcast_dates, fcast_values
@@ -189,6 +237,14 @@ def get_sentiment_distribution_numerical():
     return stats
 
 def get_sentiment_numerical_trend_by_day(days=90):
+    if use_parquet():
+        means = parquet_sentiment_percentages(days)
+        return {
+            'days': [str(day) for day in means.index],
+            'positive': means['positive'].tolist(),
+            'neutral': means['neutral'].tolist(),
+            'negative': means['negative'].tolist()
+        }
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute("""
@@ -197,10 +253,10 @@ def get_sentiment_numerical_trend_by_day(days=90):
                SUM(s.positive), SUM(s.neutral), SUM(s.negative)
         FROM news n
         JOIN sentiments s ON n.id = s.article_id
-        WHERE n.publishedAt >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        WHERE n.publishedAt >= %s
         GROUP BY DATE(n.publishedAt)
         ORDER BY DATE(n.publishedAt) ASC;
-    """, (days,))
+    """, (window_start(days),))
     days_list, pos_list, neu_list, neg_list = [], [], [], []
     for day, total, pos, neu, neg in cursor.fetchall():
         days_list.append(str(day))
@@ -221,6 +277,10 @@ def get_sentiment_numerical_trend_by_day(days=90):
 
 # NEW ADDED: Sentiment percentage time-series forecast for dashboard
 def get_sentiment_percentage_forecast(days=90, predict_days=7):
+    if use_parquet():
+        trend = get_sentiment_numerical_trend_by_day(days)
+        return _sentiment_percentage_forecast(trend['days'], trend['positive'], trend['neutral'],
+                                              trend['negative'], predict_days)
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute("""
@@ -228,10 +288,10 @@ def get_sentiment_percentage_forecast(days=90, predict_days=7):
             SUM(s.positive), SUM(s.neutral), SUM(s.negative)
         FROM news n
         JOIN sentiments s ON n.id = s.article_id
-        WHERE n.publishedAt >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        WHERE n.publishedAt >= %s
         GROUP BY DATE(n.publishedAt)
         ORDER BY DATE(n.publishedAt) ASC;
-    """, (days,))
+    """, (window_start(days),))
     days_list, pos_list, neu_list, neg_list = [], [], [], []
     for day, total, pos, neu, neg in cursor.fetchall():
         days_list.append(str(day))
@@ -243,7 +303,9 @@ def get_sentiment_percentage_forecast(days=90, predict_days=7):
         neg_list.append(neg_pct)
     cursor.close()
     conn.close()
+    return _sentiment_percentage_forecast(days_list, pos_list, neu_list, neg_list, predict_days)
 
+def _sentiment_percentage_forecast(days_list, pos_list, neu_list, neg_list, predict_days):
     df_pos = pd.DataFrame({'ds': days_list, 'y': pos_list})
     df_neu = pd.DataFrame({'ds': days_list, 'y': neu_list})
     df_neg = pd.DataFrame({'ds': days_list, 'y': neg_list})
@@ -288,16 +350,20 @@ def get_sentiment_stats_from_db(days=90):
 
 
 def get_sentiment_trend_by_day(days=90):
+    if use_parquet():
+        table = parquet_sentiment_counts(days)
+        return {'days': list(table.index), 'positive': table['positive'].tolist(),
+                'neutral': table['neutral'].tolist(), 'negative': table['negative'].tolist()}
     conn = connect_db()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT DATE(n.publishedAt) as day, s.overall, COUNT(*) as cnt
         FROM news n
         JOIN sentiments s ON n.id = s.article_id
-        WHERE n.publishedAt >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        WHERE n.publishedAt >= %s
         GROUP BY day, s.overall
         ORDER BY day ASC;
-    ''', (days,))
+    ''', (window_start(days),))
     days_list = []
     data_dict = {}
     for day, sentiment, cnt in cursor.fetchall():
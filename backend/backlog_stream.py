@@ -0,0 +1,137 @@
+import os
+import time
+import queue
+import threading
+from dotenv import load_dotenv
+from fetch_news import connect_db
+import enrichment_stages
+
+load_dotenv()
+
+# Bounded-memory backlog processing. Rows are read in keyset-paginated chunks
+# (WHERE id > last ORDER BY id LIMIT n), so no query ever materializes the whole
+# backlog, and the read, infer and write phases run in their own threads connected
+# by bounded queues: a slow writer blocks inference, slow inference blocks the reader.
+# At most about (2 * STREAM_QUEUE_DEPTH + 3) chunks are alive at any time.
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 256))
+STREAM_QUEUE_DEPTH = int(os.getenv("STREAM_QUEUE_DEPTH", 2))
+
+_DONE = object()
+
+def iter_chunks(query, params=(), chunk_size=STREAM_CHUNK_SIZE, key="n.id", key_column="id"):
+    """
+    Yields lists of row dicts for `query`, which must have a WHERE clause and no
+    ORDER BY / LIMIT; keyset conditions on `key` are appended for every chunk.
+    """
+    conn = connect_db()
+    # Each chunk sees fresh data instead of the snapshot of the first read
+    conn.autocommit = True
+    cursor = conn.cursor(dictionary=True)
+    last = 0
+    try:
+        while True:
+            cursor.execute(f"{query} AND {key} > %s ORDER BY {key} LIMIT %s", tuple(params) + (last, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last = rows[-1][key_column]
+            yield rows
+            if len(rows) < chunk_size:
+                break
+    finally:
+        cursor.close()
+        conn.close()
+
+def iter_backlog(stage, chunk_size=STREAM_CHUNK_SIZE):
+    """Chunks of articles an enrichment stage has not processed (see enrichment_stages.py)."""
+    # LONGTEXT content is only read for the stage that uses it
+    content = ", n.content" if stage == 'topics' else ", NULL AS content"
+    query = f"SELECT n.id, n.title, n.description{content} " + enrichment_stages.pending_articles(stage)
+    return iter_chunks(query, (stage,), chunk_size=chunk_size)
+
+def run_pipeline(chunks, infer, write, queue_depth=STREAM_QUEUE_DEPTH, metrics=None):
+    """
+    Reads `chunks` in a reader thread, runs infer(chunk) in the calling thread and
+    write(chunk, result) in a writer thread; write returns the number of items stored.
+    The first error stops the pipeline and is re-raised. Returns the total written.
+    metrics: an optional pipeline_metrics.StageRun, given every chunk's sizes and timings.
+    """
+    read_queue = queue.Queue(maxsize=queue_depth)
+    write_queue = queue.Queue(maxsize=queue_depth)
+    errors = []
+    written = [0]
+
+    def reader():
+        try:
+            for chunk in chunks:
+                if errors:
+                    break
+                read_queue.put(chunk)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            read_queue.put(_DONE)
+
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                break
+            if errors:
+                # Keep draining so inference never blocks on a full queue
+                continue
+            chunk, result, infer_seconds = item
+            try:
+                start = time.perf_counter()
+                stored = write(chunk, result) or 0
+                written[0] += stored
+                if metrics is not None:
+                    metrics.batch(len(chunk), stored, infer_seconds, time.perf_counter() - start)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            chunk = read_queue.get()
+            if chunk is _DONE:
+                break
+            if errors:
+                continue
+            try:
+                start = time.perf_counter()
+                result = infer(chunk)
+                write_queue.put((chunk, result, time.perf_counter() - start))
+            except Exception as e:
+                errors.append(e)
+    finally:
+        write_queue.put(_DONE)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return written[0]
+
+def run_stage(stage, chunk_size=STREAM_CHUNK_SIZE, metrics=None):
+    """Streams the whole backlog of one enrichment stage through its models and into MySQL."""
+    enrichment_stages.prepare(stage)
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+
+    def infer(articles):
+        return enrichment_stages.compute(stage, articles)
+
+    def write(articles, computed):
+        kept, results = computed
+        enrichment_stages.write(cursor, stage, [article['id'] for article in kept], results)
+        enrichment_stages.mark_done(cursor, stage, [article['id'] for article in articles])
+        conn.commit()
+        return len(kept)
+
+    try:
+        return run_pipeline(iter_backlog(stage, chunk_size), infer, write, metrics=metrics)
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,2 @@
+# Throughput benchmarks for the pipeline stages and analytics queries.
+# Run from backend/: python -m benchmarks run --articles 10000 (see run.py)
@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import gzip
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# Deterministic synthetic NewsAPI articles. The same (seed, end date, settings)
+# always produce the same articles in the same order, so benchmark runs on
+# different commits or machines see identical input.
+#
+# Distributions, loosely modelled on a few weeks of real top-headlines polls:
+#   topics    Zipf-like popularity, and each topic has a burst of a few days where
+#             it is five times as common (so trend detection has something to find)
+#   entities  Zipf-like popularity within people, organisations and places
+#   sentiment about 40% neutral, 30% positive, 30% negative wording
+#   repeats   duplicate_rate of the articles re-emit an earlier URL (the same story
+#             seen in a later poll); syndication_rate re-publish an earlier story
+#             under another source and URL
+
+TOPICS = {
+    'economy': ['inflation', 'interest rates', 'central bank', 'markets', 'recession', 'jobs report', 'bond yields', 'consumer spending'],
+    'technology': ['artificial intelligence', 'chip makers', 'cloud computing', 'smartphones', 'data privacy', 'startups', 'software update', 'cybersecurity'],
+    'politics': ['election', 'parliament', 'coalition talks', 'campaign', 'legislation', 'referendum', 'opposition leader', 'budget vote'],
+    'health': ['vaccine', 'hospital', 'clinical trial', 'outbreak', 'public health', 'drug prices', 'mental health', 'health insurance'],
+    'climate': ['heatwave', 'emissions', 'renewable energy', 'flooding', 'wildfires', 'carbon tax', 'climate summit', 'drought'],
+    'sports': ['championship', 'transfer window', 'final', 'world cup', 'coach', 'injury', 'season opener', 'record'],
+    'science': ['space mission', 'telescope', 'researchers', 'discovery', 'fossil', 'quantum', 'genome', 'laboratory'],
+    'business': ['merger', 'earnings', 'layoffs', 'acquisition', 'shareholders', 'supply chain', 'quarterly profit', 'ipo'],
+    'entertainment': ['box office', 'streaming series', 'album', 'film festival', 'award show', 'concert tour', 'premiere', 'sequel'],
+    'world': ['ceasefire', 'summit', 'sanctions', 'embassy', 'peace talks', 'border', 'humanitarian aid', 'protests'],
+}
+
+PEOPLE = ['Maria Alvarez', 'John Carter', 'Aiko Tanaka', 'David Okafor', 'Elena Petrova', 'Rahul Mehta',
+          'Sarah Collins', 'Lucas Moreau', 'Fatima Haddad', 'Chen Wei', 'Olivia Brennan', 'Tomasz Nowak',
+          'Grace Mensah', 'Henrik Larsen', 'Isabel Duarte', 'Kwame Asante', 'Sofia Rossi', 'Daniel Weiss']
+ORGANIZATIONS = ['Northwind Energy', 'Helix Pharmaceuticals', 'Brightline Motors', 'Orion Bank', 'Vantage Labs',
+                 'the World Health Organization', 'the European Commission', 'the United Nations', 'Atlas Airways',
+                 'Summit Telecom', 'Riverstone Capital', 'Nimbus Software', 'the Federal Reserve', 'Quanta Systems']
+PLACES = ['Washington', 'London', 'Berlin', 'Tokyo', 'New Delhi', 'Nairobi', 'Sao Paulo', 'Paris', 'Beijing',
+          'Sydney', 'Toronto', 'Lagos', 'Madrid', 'Seoul', 'Cairo', 'Mexico City', 'Jakarta', 'Istanbul']
+SOURCES = [('reuters', 'Reuters', 'www.reuters.com'), ('bbc-news', 'BBC News', 'www.bbc.com'),
+           ('associated-press', 'Associated Press', 'apnews.com'), (None, 'The Guardian', 'www.theguardian.com'),
+           ('cnn', 'CNN', 'edition.cnn.com'), ('bloomberg', 'Bloomberg', 'www.bloomberg.com'),
+           (None, 'Al Jazeera English', 'www.aljazeera.com'), ('the-verge', 'The Verge', 'www.theverge.com'),
+           (None, 'Financial Times', 'www.ft.com'), ('abc-news', 'ABC News', 'abcnews.go.com'),
+           (None, 'Yahoo Entertainment', 'www.yahoo.com'), ('techcrunch', 'TechCrunch', 'techcrunch.com')]
+
+POSITIVE = ['surges', 'wins', 'welcomes', 'boosts', 'celebrates', 'breakthrough', 'recovers', 'strong', 'praised', 'success']
+NEGATIVE = ['slumps', 'warns', 'crisis', 'collapse', 'fears', 'criticised', 'losses', 'delays', 'scandal', 'fails']
+NEUTRAL = ['announces', 'reviews', 'discusses', 'plans', 'reports', 'considers', 'outlines', 'updates']
+
+TITLE_TEMPLATES = [
+    "{person} {verb} {subject} as {org} weighs next steps",
+    "{org} {verb} {subject} in {place}",
+    "{subject} {verb} in {place}, says {person}",
+    "What the {subject} news means for {place}",
+    "{place}: {org} {verb} {subject} amid {other}",
+]
+DESCRIPTION_TEMPLATES = [
+    "{person} of {org} said on {weekday} that the {subject} in {place} {verb} expectations, with {other} also in focus.",
+    "Officials in {place} {verb} plans on {subject} after {org} raised concerns about {other}.",
+    "The latest {subject} figures from {place} {verb} analysts, {person} told reporters.",
+]
+CONTENT_SENTENCES = [
+    "{person} said the {subject} would remain a priority for {org} over the coming months.",
+    "Analysts in {place} pointed to {other} as the main risk.",
+    "{org} declined to comment beyond a short statement on {subject}.",
+    "The debate over {subject} has intensified since {weekday}, according to people familiar with the matter.",
+    "Residents of {place} said the {other} had already changed their plans.",
+]
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+def _zipf_weights(n, s=1.1):
+    return [1.0 / (rank + 1) ** s for rank in range(n)]
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:80]
+
+def _sentiment(rng, mood):
+    """Enrichment labels in sentiment.py's format, consistent with the article's wording."""
+    score = rng.randint(70, 98)
+    if mood is POSITIVE:
+        return {'positive': score, 'neutral': 100 - score, 'negative': 0, 'overall': 'Positive'}
+    if mood is NEGATIVE:
+        return {'positive': 0, 'neutral': 100 - score, 'negative': score, 'overall': 'Negative'}
+    return {'positive': 0, 'neutral': score, 'negative': 0, 'overall': 'Neutral'}
+
+def generate_articles(n, **kwargs):
+    """
+    Yields n NewsAPI-shaped article dicts (including repeats), published over the
+    `days` days up to end_date (default: today, midnight UTC).
+    """
+    for article, _ in generate_labelled(n, **kwargs):
+        yield article
+
+def generate_labelled(n, seed=0, end_date=None, days=30, duplicate_rate=0.05, syndication_rate=0.03):
+    """
+    Like generate_articles, but yields (article, labels): the topic, sentiment,
+    entities and keywords the article was generated from, in the formats the
+    enrichment stages store. Used to seed a database without running the models.
+    """
+    rng = random.Random(seed)
+    if end_date is None:
+        end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end_date - timedelta(days=days)
+    topic_names = list(TOPICS)
+    topic_weights = _zipf_weights(len(topic_names))
+    # Every topic trends for three days somewhere in the window
+    bursts = {name: rng.randrange(max(1, days - 2)) for name in topic_names}
+    people_weights = _zipf_weights(len(PEOPLE))
+    org_weights = _zipf_weights(len(ORGANIZATIONS))
+    place_weights = _zipf_weights(len(PLACES))
+    source_weights = _zipf_weights(len(SOURCES), s=0.8)
+    # Earlier articles that may be repeated or syndicated
+    recent = []
+
+    for index in range(n):
+        if recent and rng.random() < duplicate_rate:
+            article, labels = rng.choice(recent)
+            yield dict(article), labels
+            continue
+        if recent and rng.random() < syndication_rate:
+            original, labels = rng.choice(recent)
+            source_id, source_name, domain = rng.choices(SOURCES, weights=source_weights)[0]
+            article = dict(original, source={'id': source_id, 'name': source_name},
+                           url=f"https://{domain}/news/{_slug(original['title'])}-{index}",
+                           urlToImage=f"https://{domain}/images/{index}.jpg")
+            recent.append((article, labels))
+            yield article, labels
+            continue
+
+        published = start + timedelta(seconds=rng.randrange(days * 86400))
+        day = (published - start).days
+        weights = [w * 5 if bursts[name] <= day < bursts[name] + 3 else w
+                   for name, w in zip(topic_names, topic_weights)]
+        topic = rng.choices(topic_names, weights=weights)[0]
+        mood = rng.choices((POSITIVE, NEGATIVE, NEUTRAL), weights=(0.3, 0.3, 0.4))[0]
+        fields = {
+            'person': rng.choices(PEOPLE, weights=people_weights)[0],
+            'org': rng.choices(ORGANIZATIONS, weights=org_weights)[0],
+            'place': rng.choices(PLACES, weights=place_weights)[0],
+            'subject': rng.choice(TOPICS[topic]),
+            'other': rng.choice(TOPICS[topic]),
+            'verb': rng.choice(mood),
+            'weekday': WEEKDAYS[published.weekday()],
+        }
+        title = rng.choice(TITLE_TEMPLATES).format(**fields)
+        title = title[0].upper() + title[1:]
+        description = rng.choice(DESCRIPTION_TEMPLATES).format(**fields)
+        body = " ".join(rng.choice(CONTENT_SENTENCES).format(**fields) for _ in range(rng.randint(2, 4)))
+        source_id, source_name, domain = rng.choices(SOURCES, weights=source_weights)[0]
+        article = {
+            'source': {'id': source_id, 'name': source_name},
+            'author': rng.choice(PEOPLE),
+            'title': title,
+            'description': description,
+            'url': f"https://{domain}/{topic}/{_slug(title)}-{index}",
+            'urlToImage': f"https://{domain}/images/{index}.jpg",
+            'publishedAt': published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            # NewsAPI truncates content and appends the remaining length
+            'content': f"{body[:200]}... [+{rng.randint(800, 6000)} chars]",
+        }
+        labels = {
+            'topic': topic,
+            'sentiment': _sentiment(rng, mood),
+            'entities': [{'text': fields['person'], 'label': 'PERSON'},
+                         {'text': fields['org'].replace('the ', '', 1), 'label': 'ORG'},
+                         {'text': fields['place'], 'label': 'GPE'}],
+            'keywords': [(fields['subject'], 0.62), (fields['place'].lower(), 0.48), (fields['other'], 0.41)],
+        }
+        recent.append((article, labels))
+        if len(recent) > 1000:
+            recent.pop(rng.randrange(len(recent)))
+        yield article, labels
+
+def write_jsonl(path, n, **kwargs):
+    """Writes generated articles one per line (gzipped for .gz); bulk_import.py can load the file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with opener(path, "wt", encoding="utf-8") as f:
+        for article in generate_articles(n, **kwargs):
+            f.write(json.dumps(article) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes a synthetic NewsAPI corpus as JSONL.")
+    parser.add_argument("path", help="output file, .jsonl or .jsonl.gz")
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end-date", help="YYYY-MM-DD, last day of the corpus (default: today)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--syndication-rate", type=float, default=0.03)
+    args = parser.parse_args()
+    write_jsonl(args.path, args.articles, seed=args.seed,
+                end_date=datetime.strptime(args.end_date, "%Y-%m-%d") if args.end_date else None,
+                days=args.days, duplicate_rate=args.duplicate_rate, syndication_rate=args.syndication_rate)
+    print(f"Wrote {args.articles} articles to {args.path}")
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import generate_labelled, TOPICS, PLACES
+from benchmarks.run import BENCH_MYSQL_DB, RESULTS_DIR, git_commit, isolate_caches, prepare_database, use_database
+
+load_dotenv()
+
+# HTTP load test of the Flask app. It seeds the scratch database with the synthetic
+# corpus and the enrichment results the corpus was generated from (no models needed),
+# starts the app on it in a subprocess, mints session cookies the way login() does
+# and drives a weighted mix of routes from many concurrent clients.
+#
+#   python -m benchmarks.loadtest run --articles 20000 --clients 1,10,50,100 --duration 30
+#   python -m benchmarks.loadtest run --no-seed --url http://127.0.0.1:8000 --clients 50 \
+#       --max dashboard.p95_ms=800 --max all.error_rate=0.01 --min all.rps=20
+#
+# Each client is a closed loop (send, wait for the response, optionally think, repeat),
+# so a list of client counts shows where throughput stops growing and latency climbs.
+
+# Corpus topics -> the topic ids topic_selection.py labels
+TOPIC_IDS = {'politics': 0, 'world': 0, 'health': 1, 'science': 2, 'climate': 2, 'sports': 3,
+             'technology': 4, 'entertainment': 5, 'economy': 6, 'business': 6}
+
+SEARCH_TERMS = ['latest'] + [term for terms in TOPICS.values() for term in terms[:3]] + [p.lower() for p in PLACES[:6]]
+
+# Route name -> function(rng, context) returning the path to request
+ROUTES = {
+    'dashboard': lambda rng, ctx: f"/dashboard?query={rng.choice(SEARCH_TERMS).replace(' ', '+')}",
+    'trends': lambda rng, ctx: "/trends",
+    'analytics': lambda rng, ctx: "/analytics",
+    'suggest': lambda rng, ctx: f"/api/suggest?q={rng.choice(SEARCH_TERMS)[:rng.randint(2, 4)]}",
+    'trending_articles': lambda rng, ctx: "/trending-articles",
+    'top_topics': lambda rng, ctx: "/api/top_topics?days=7",
+    'article': lambda rng, ctx: f"/article/{rng.randint(1, max(1, ctx['max_article_id']))}",
+}
+DEFAULT_MIX = "dashboard=3,trends=2,analytics=1,suggest=4"
+
+def seed_database(args):
+    """Fresh scratch database: articles, their enrichment results and a few users."""
+    import fetch_news
+    import enrichment_stages
+    prepare_database(args.database)
+    for stage in enrichment_stages.RESULT_TABLES:
+        enrichment_stages.prepare(stage)
+
+    conn = fetch_news.connect_db()
+    cursor = conn.cursor()
+    seeded = set()
+    batch = []
+
+    def flush(batch):
+        fetch_news.store_articles([article for article, _ in batch])
+        urls = list({article['url'] for article, _ in batch})
+        cursor.execute(f"SELECT id, url FROM news WHERE url IN ({','.join(['%s'] * len(urls))})", tuple(urls))
+        ids = {url: article_id for article_id, url in cursor.fetchall()}
+        fresh = []
+        for article, labels in batch:
+            article_id = ids.get(article['url'])
+            if article_id is not None and article_id not in seeded:
+                seeded.add(article_id)
+                fresh.append((article_id, labels))
+        article_ids = [article_id for article_id, _ in fresh]
+        enrichment_stages.write(cursor, 'sentiment', article_ids, [labels['sentiment'] for _, labels in fresh])
+        enrichment_stages.write(cursor, 'ner', article_ids, [labels['entities'] for _, labels in fresh])
+        enrichment_stages.write(cursor, 'keywords', article_ids, [labels['keywords'] for _, labels in fresh])
+        enrichment_stages.write(cursor, 'topics', article_ids,
+                                [(TOPIC_IDS[labels['topic']], 0.8) for _, labels in fresh])
+        conn.commit()
+
+    start = time.perf_counter()
+    for item in generate_labelled(args.articles, seed=args.seed, days=args.days):
+        batch.append(item)
+        if len(batch) == 500:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    cursor.close()
+    conn.close()
+    print(f"Seeded {len(seeded)} articles in {time.perf_counter() - start:.1f}s")
+
+    import users
+    for i in range(args.users):
+        users.register_user(f"loadtest{i}@example.com", "loadtest-password")
+
+def mint_cookies(count):
+    """Session tokens for the seeded users, made by the same code as login()."""
+    import users
+    secret_key = os.getenv("FLASK_SECRET_KEY")
+    tokens = []
+    for i in range(count):
+        user_data = users.login_user(f"loadtest{i}@example.com", "loadtest-password")
+        if user_data is None:
+            raise SystemExit(f"User loadtest{i}@example.com is missing, run without --no-seed first.")
+        tokens.append(users.create_token(user_data, secret_key))
+    return tokens
+
+def max_article_id():
+    import fetch_news
+    conn = fetch_news.connect_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(id) FROM news")
+    value = cursor.fetchone()[0] or 1
+    conn.close()
+    return value
+
+def serve(port):
+    """Runs the app on werkzeug's threaded WSGI server (the subprocess side of 'run')."""
+    import logging
+    from werkzeug.serving import make_server
+    import fetch_news
+    from veritascope import app
+    # /dashboard polls NewsAPI first; that would measure NewsAPI (and spend its quota),
+    # so the poll finds nothing new and only the app and the database are measured
+    fetch_news.fetch_live_news = lambda *args, **kwargs: []
+    # Per-request access logging would be part of what is measured
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    print(f"Serving on http://127.0.0.1:{port}", flush=True)
+    server.serve_forever()
+
+def start_server(args):
+    env = dict(os.environ, MYSQL_DB=args.database)
+    if args.web_only:
+        env["VERITASCOPE_WEB_ONLY"] = "1"
+    process = subprocess.Popen([sys.executable, "-m", "benchmarks.loadtest", "serve", "--port", str(args.port)],
+                               cwd=BACKEND_DIR, env=env)
+    url = f"http://127.0.0.1:{args.port}"
+    import requests
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"The app exited with status {process.returncode} during startup")
+        try:
+            requests.get(url + "/login", timeout=2)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"The app did not answer within {args.startup_timeout}s")
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}', expected some of {sorted(ROUTES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def drive(url, tokens, mix, clients, duration, warmup, think_ms, context, seed):
+    """Runs `clients` closed-loop clients; returns {route: [(latency_s, ok), ...]} after warm-up."""
+    import requests
+    samples = {name: [] for name in mix}
+    lock = threading.Lock()
+    names, weights = list(mix), list(mix.values())
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def client(index):
+        rng = random.Random(seed * 100003 + index)
+        session = requests.Session()
+        session.cookies.set('token', tokens[index % len(tokens)])
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, weights=weights)[0]
+            path = ROUTES[name](rng, context)
+            sent = time.perf_counter()
+            try:
+                # A redirect means the session was rejected (to /login) and counts as an error
+                response = session.get(url + path, allow_redirects=False, timeout=60)
+                ok = response.status_code < 300
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - sent
+            if sent >= measure_from:
+                with lock:
+                    samples[name].append((elapsed, ok))
+            if think_ms:
+                time.sleep(rng.expovariate(1000.0 / think_ms))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+def summarize_step(samples, clients, duration):
+    routes = {}
+    all_samples = []
+    for name, values in samples.items():
+        all_samples.extend(values)
+        routes[name] = _route_stats(values, duration)
+    return {'clients': clients, 'routes': routes, 'all': _route_stats(all_samples, duration)}
+
+def _route_stats(values, duration):
+    latencies = sorted(v[0] for v in values)
+    errors = sum(1 for v in values if not v[1])
+    ms = lambda s: round(s * 1000, 1) if s is not None else None
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': round(errors / len(values), 4) if values else 0.0,
+        'rps': round(len(values) / duration, 2),
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p90_ms': ms(percentile(latencies, 0.90)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+def parse_thresholds(specs, kind):
+    """'dashboard.p95_ms=500' -> ('dashboard', 'p95_ms', 500.0, kind); 'all' is every route together."""
+    thresholds = []
+    for spec in specs or []:
+        target, _, value = spec.partition("=")
+        route, _, metric = target.partition(".")
+        if not metric or not value:
+            raise SystemExit(f"Bad threshold '{spec}', expected route.metric=value")
+        thresholds.append((route, metric, float(value), kind))
+    return thresholds
+
+def check_thresholds(step, thresholds):
+    failures = []
+    for route, metric, limit, kind in thresholds:
+        stats = step['all'] if route == 'all' else step['routes'].get(route)
+        if stats is None or stats.get(metric) is None:
+            continue
+        value = stats[metric]
+        if (kind == 'max' and value > limit) or (kind == 'min' and value < limit):
+            failures.append(f"{step['clients']} clients: {route}.{metric} = {value} ({kind} {limit})")
+    return failures
+
+def print_step(step):
+    print(f"--- {step['clients']} clients")
+    print(f"  {'route':<18} {'requests':>8} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for name, stats in list(step['routes'].items()) + [('all', step['all'])]:
+        print(f"  {name:<18} {stats['requests']:>8} {stats['rps']:>8} {stats['p50_ms'] or '-':>8} "
+              f"{stats['p95_ms'] or '-':>8} {stats['p99_ms'] or '-':>8} {stats['errors']:>7}")
+
+def run(args):
+    isolate_caches()
+    mix = parse_mix(args.mix)
+    thresholds = parse_thresholds(args.max, 'max') + parse_thresholds(args.min, 'min')
+    if args.no_seed:
+        use_database(args.database)
+    else:
+        if args.url:
+            print("Note: seeding the scratch database, make sure the server at --url uses it")
+        seed_database(args)
+    tokens = mint_cookies(args.users)
+    context = {'max_article_id': max_article_id()}
+
+    process = None
+    url = args.url
+    if not url:
+        process, url = start_server(args)
+    steps = []
+    try:
+        for clients in [int(c) for c in args.clients.split(",")]:
+            samples = drive(url, tokens, mix, clients, args.duration, args.warmup, args.think_ms, context, args.seed)
+            step = summarize_step(samples, clients, args.duration)
+            print_step(step)
+            steps.append(step)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    failures = [failure for step in steps for failure in check_thresholds(step, thresholds)]
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'url': args.url, 'articles': args.articles, 'seed': args.seed, 'users': args.users,
+            'mix': mix, 'duration': args.duration, 'warmup': args.warmup, 'think_ms': args.think_ms,
+            'web_only': args.web_only, 'database': args.database,
+        },
+        'steps': steps,
+        'threshold_failures': failures,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"loadtest-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    for failure in failures:
+        print(f"THRESHOLD FAILED: {failure}")
+    return 1 if failures else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.loadtest", description="HTTP load test of the Flask app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, start the app and drive load")
+    run_parser.add_argument("--articles", type=int, default=20000, help="articles to seed")
+    run_parser.add_argument("--days", type=int, default=30)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--users", type=int, default=20, help="seeded users the clients log in as")
+    run_parser.add_argument("--no-seed", action="store_true", help="reuse the database of an earlier run")
+    run_parser.add_argument("--database", default=BENCH_MYSQL_DB, help="scratch database, dropped and recreated when seeding")
+    run_parser.add_argument("--url", help="test an already running server instead of starting one")
+    run_parser.add_argument("--port", type=int, default=5055)
+    run_parser.add_argument("--startup-timeout", type=int, default=300)
+    run_parser.add_argument("--web-only", action="store_true", help="start the app with VERITASCOPE_WEB_ONLY=1")
+    run_parser.add_argument("--mix", default=DEFAULT_MIX, help=f"route=weight list over {','.join(ROUTES)}")
+    run_parser.add_argument("--clients", default="1,10,50", help="concurrent clients, one step per value")
+    run_parser.add_argument("--duration", type=float, default=30, help="measured seconds per step")
+    run_parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds at the start of each step")
+    run_parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a client's requests")
+    run_parser.add_argument("--max", action="append", metavar="ROUTE.METRIC=VALUE",
+                            help="fail if exceeded in any step, e.g. dashboard.p95_ms=800 or all.error_rate=0.01")
+    run_parser.add_argument("--min", action="append", metavar="ROUTE.METRIC=VALUE",
+                            help="fail if not reached in any step, e.g. all.rps=20")
+    run_parser.add_argument("--output", help="JSON report path")
+
+    serve_parser = commands.add_parser("serve", help="run the app on a threaded server (used by 'run')")
+    serve_parser.add_argument("--port", type=int, default=5055)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        serve(args.port)
+    else:
+        sys.exit(run(args))
+
+if __name__ == "__main__":
+    main()
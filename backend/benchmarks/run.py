@@ -0,0 +1,401 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.corpus import generate_articles
+
+load_dotenv()
+
+# Runs the project's stages against a scratch MySQL database filled with the
+# synthetic corpus and writes one JSON file per run. Nothing here needs network
+# access: models must already be in the local Hugging Face / spaCy caches.
+#
+#   python -m benchmarks run --articles 10000
+#   python -m benchmarks run --articles 1000000 --stages store_articles,analytics
+#   python -m benchmarks compare results/old.json results/new.json --threshold 10
+#
+# Stages run in order, each on what the previous ones stored; a stage that fails
+# (e.g. a model that is not installed) is recorded as failed and the run goes on.
+BENCH_MYSQL_DB = os.getenv("BENCH_MYSQL_DB") or "newsdb_bench"
+
+STAGES = ['store_articles', 'preprocess_text', 'keywords', 'sentiment', 'ner', 'topics', 'trends', 'analytics',
+          'analytics_parquet']
+
+# analytics_utils queries, with the arguments the web app uses
+ANALYTICS_QUERIES = [
+    ('get_news_volume_timeseries', (90,)),
+    ('get_sentiment_timeseries', (90,)),
+    ('get_existing_topics', (20,)),
+    ('get_top_topics_from_db', (7, 5)),
+    ('get_sentiment_distribution_numerical', ()),
+    ('get_sentiment_numerical_trend_by_day', (90,)),
+    ('get_sentiment_stats_from_db', (90,)),
+    ('get_sentiment_trend_by_day', (90,)),
+]
+# The ones that have a Parquet mode (ANALYTICS_SOURCE=parquet)
+PARQUET_QUERIES = [
+    ('get_news_volume_timeseries', (90,)),
+    ('get_sentiment_timeseries', (90,)),
+    ('get_topic_timeseries', (1, 90)),
+    ('get_sentiment_numerical_trend_by_day', (90,)),
+    ('get_sentiment_trend_by_day', (90,)),
+]
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def isolate_caches(cache=False):
+    """
+    Keeps a run away from the production caches: its own Bloom filter file and no
+    enrichment cache (cached results would measure the cache, not the models).
+    Must run before fetch_news / the stage modules are imported.
+    """
+    scratch = tempfile.mkdtemp(prefix="veritascope-bench-")
+    os.environ["URL_BLOOM_PATH"] = os.path.join(scratch, "url_bloom.bin")
+    os.environ["ENRICHMENT_CACHE"] = "1" if cache else "0"
+    os.environ["PARQUET_DIR"] = os.path.join(scratch, "archive")
+    if cache:
+        os.environ["ENRICHMENT_CACHE_PATH"] = os.path.join(scratch, "enrichment_cache.sqlite")
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+def use_database(database):
+    """Points every module's connect_db (and child processes) at the scratch database."""
+    import storage
+    if storage.is_sqlite():
+        # The scratch database is a file next to SQLITE_PATH
+        os.environ["SQLITE_PATH"] = storage.SQLITE_PATH = os.path.join(
+            os.path.dirname(storage.SQLITE_PATH), f"{database}.sqlite")
+    os.environ["MYSQL_DB"] = database
+
+def prepare_database(database):
+    """Drops and recreates the scratch database, then points every module's connect_db at it."""
+    import mysql.connector
+    import storage
+    if storage.is_sqlite():
+        path = os.path.join(os.path.dirname(storage.SQLITE_PATH), f"{database}.sqlite")
+        if os.path.abspath(path) == os.path.abspath(storage.SQLITE_PATH):
+            raise SystemExit(f"Refusing to benchmark against SQLITE_PATH ('{path}'), it is deleted first.")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    else:
+        if database == os.getenv("MYSQL_DB"):
+            raise SystemExit(f"Refusing to benchmark against MYSQL_DB ('{database}'), it is dropped first.")
+        conn = mysql.connector.connect(
+            host=os.getenv("MYSQL_HOST"),
+            port=int(os.getenv("MYSQL_PORT") or 3306),
+            user=os.getenv("MYSQL_USER"),
+            password=os.getenv("MYSQL_PASSWORD")
+        )
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+        conn.commit()
+        conn.close()
+    use_database(database)
+    import fetch_news
+    fetch_news.create_database()
+
+def db_milliseconds():
+    import db_instrumentation
+    return sum(q['total_ms'] for q in db_instrumentation.query_stats(limit=db_instrumentation.QUERY_STATS_MAX + 1))
+
+def summarize(seconds):
+    """min / median / p95 / max in ms of repeated timings."""
+    ordered = sorted(seconds)
+    return {
+        'min': round(ordered[0] * 1000, 2),
+        'median': round(statistics.median(ordered) * 1000, 2),
+        'p95': round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+def result(name, items=None, seconds=None, **extra):
+    row = {'name': name, 'status': 'ok', 'items': items, 'seconds': round(seconds, 3) if seconds is not None else None}
+    row['items_per_sec'] = round(items / seconds, 2) if items and seconds else None
+    row.update(extra)
+    return row
+
+def corpus_kwargs(args):
+    return dict(seed=args.seed, end_date=args.end_date, days=args.days,
+                duplicate_rate=args.duplicate_rate, syndication_rate=args.syndication_rate)
+
+def bench_store_articles(args):
+    import fetch_news
+    polls, batch, stored = [], [], 0
+    start = time.perf_counter()
+
+    def store(batch):
+        poll_start = time.perf_counter()
+        inserted = fetch_news.store_articles(batch)
+        polls.append(time.perf_counter() - poll_start)
+        return inserted
+
+    # Articles arrive the way the fetcher sees them: one NewsAPI poll at a time
+    for article in generate_articles(args.articles, **corpus_kwargs(args)):
+        batch.append(article)
+        if len(batch) == args.poll_size:
+            stored += store(batch)
+            batch = []
+    if batch:
+        stored += store(batch)
+    return [result('store_articles', args.articles, time.perf_counter() - start,
+                   stored=stored, poll_size=args.poll_size, poll_ms=summarize(polls))]
+
+def bench_preprocess_text(args):
+    from text_preprocessing import preprocess_text
+    texts = [f"{a['title']} {a['description']}" for a in generate_articles(args.sample, **corpus_kwargs(args))]
+    # The first call loads spaCy; keep it out of the throughput numbers
+    load_start = time.perf_counter()
+    preprocess_text(texts[0])
+    load_seconds = time.perf_counter() - load_start
+    per_text = []
+    start = time.perf_counter()
+    for text in texts:
+        text_start = time.perf_counter()
+        preprocess_text(text)
+        per_text.append(time.perf_counter() - text_start)
+    return [result('preprocess_text', len(texts), time.perf_counter() - start,
+                   first_call_seconds=round(load_seconds, 3), per_text_ms=summarize(per_text))]
+
+def _enrichment(stage, run_stage):
+    """Runs a batch entry point over the stored backlog and attaches its pipeline_runs row."""
+    import db_instrumentation
+    import pipeline_metrics
+    start = time.perf_counter()
+    run_stage()
+    seconds = time.perf_counter() - start
+    conn = db_instrumentation.connect()
+    cursor = conn.cursor(dictionary=True)
+    runs = pipeline_metrics.recent_runs(cursor, stage=stage, limit=1)
+    conn.close()
+    if not runs:
+        return [dict(result(stage, 0, seconds), status='skipped',
+                     error="the stage did not run (see its output above)")]
+    run = runs[0]
+    return [dict(result(stage, run['items_out'], seconds), status=run['status'], pipeline_run={
+        key: run[key] for key in ('items_in', 'items_out', 'batches', 'avg_batch_ms', 'max_batch_ms',
+                                  'process_seconds', 'write_seconds', 'model_load_seconds', 'backlog_before',
+                                  'backlog_after', 'errors', 'last_error')
+    })]
+
+def bench_keywords(args):
+    import keyword_extractor
+    return _enrichment('keywords', lambda: keyword_extractor.extract_and_store_keywords(args.keyword_extractor))
+
+def bench_sentiment(args):
+    import sentiment
+    return _enrichment('sentiment', sentiment.analyze_and_save_sentiments)
+
+def bench_ner(args):
+    import ner
+    return _enrichment('ner', ner.analyze_and_save_entities)
+
+def bench_topics(args):
+    import topic_selection
+    return _enrichment('topics', topic_selection.assign_topic)
+
+def _repeated(name, fn, repeat):
+    fn()  # warm-up: connections, stopwords, imports
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return result(name, repeat, sum(timings), runs_ms=summarize(timings))
+
+def bench_trends(args):
+    from trend_detector import TrendDetector
+    detector = TrendDetector()
+    return [_repeated('TrendDetector.get_daily_trends', detector.get_daily_trends, args.repeat)]
+
+def bench_analytics(args):
+    import analytics_utils
+    rows = []
+    for name, call_args in ANALYTICS_QUERIES:
+        fn = getattr(analytics_utils, name)
+        try:
+            rows.append(_repeated(f"analytics_utils.{name}", lambda: fn(*call_args), args.repeat))
+        except Exception as e:
+            rows.append({'name': f"analytics_utils.{name}", 'status': 'failed', 'error': f"{type(e).__name__}: {e}"})
+    return rows
+
+def bench_analytics_parquet(args):
+    import analytics_utils
+    import parquet_archive
+    start = time.perf_counter()
+    exported = parquet_archive.export_all()
+    rows = [result('parquet_archive.export_all', exported, time.perf_counter() - start)]
+    analytics_utils.ANALYTICS_SOURCE = "parquet"
+    try:
+        for name, call_args in PARQUET_QUERIES:
+            fn = getattr(analytics_utils, name)
+            try:
+                rows.append(_repeated(f"analytics_utils.{name}[parquet]", lambda: fn(*call_args), args.repeat))
+            except Exception as e:
+                rows.append({'name': f"analytics_utils.{name}[parquet]", 'status': 'failed', 'error': f"{type(e).__name__}: {e}"})
+    finally:
+        analytics_utils.ANALYTICS_SOURCE = "db"
+    return rows
+
+BENCHMARKS = {
+    'store_articles': bench_store_articles,
+    'preprocess_text': bench_preprocess_text,
+    'keywords': bench_keywords,
+    'sentiment': bench_sentiment,
+    'ner': bench_ner,
+    'topics': bench_topics,
+    'trends': bench_trends,
+    'analytics': bench_analytics,
+    'analytics_parquet': bench_analytics_parquet,
+}
+
+def run(args):
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()] if args.stages else STAGES
+    unknown = set(stages) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown stages {sorted(unknown)}, expected some of {STAGES}")
+
+    isolate_caches(args.cache)
+    prepare_database(args.database)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'articles': args.articles,
+            'seed': args.seed,
+            'end_date': args.end_date.strftime("%Y-%m-%d"),
+            'days': args.days,
+            'duplicate_rate': args.duplicate_rate,
+            'syndication_rate': args.syndication_rate,
+            'poll_size': args.poll_size,
+            'sample': args.sample,
+            'repeat': args.repeat,
+            'enrichment_cache': args.cache,
+            'inference_url': os.getenv("INFERENCE_URL") or None,
+            'quantize': os.getenv("INFERENCE_QUANTIZE", "0"),
+            'database': args.database,
+        },
+        'benchmarks': [],
+    }
+    for stage in stages:
+        print(f"=== {stage}")
+        db_before = db_milliseconds()
+        try:
+            rows = BENCHMARKS[stage](args)
+        except Exception as e:
+            print(f"{stage} failed: {type(e).__name__}: {e}")
+            rows = [{'name': stage, 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}]
+        # Time spent in MySQL during the stage, from db_instrumentation
+        rows[-1]['db_ms'] = round(db_milliseconds() - db_before, 1)
+        for row in rows:
+            rate = f"{row['items_per_sec']}/s" if row.get('items_per_sec') else row.get('error', '')
+            print(f"  {row['name']:<55} {row['status']:<8} {rate}")
+        report['benchmarks'].extend(rows)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Results written to {output}")
+    return report
+
+def _score(row):
+    """(value, higher_is_better) used to compare a benchmark between runs."""
+    if row.get('runs_ms'):
+        return row['runs_ms']['median'], False
+    return row.get('items_per_sec'), True
+
+def compare(base_path, new_path, threshold=None):
+    """Prints the change of every benchmark; returns the names that regressed by more than threshold %."""
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if base['config'] != new['config']:
+        print("Warning: the runs used different settings, numbers may not be comparable")
+    base_rows = {row['name']: row for row in base['benchmarks']}
+    print(f"{'benchmark':<55} {base['commit'] or '?':>14} {new['commit'] or '?':>14} {'change':>8}")
+    regressions = []
+    for row in new['benchmarks']:
+        old = base_rows.get(row['name'])
+        old_value = _score(old)[0] if old else None
+        value, higher_is_better = _score(row)
+        if old_value is None or value is None or not old_value:
+            print(f"{row['name']:<55} {str(old_value):>14} {str(value):>14} {'-':>8}")
+            continue
+        change = (value - old_value) / old_value * 100
+        # Positive means slower: lower throughput or higher latency
+        slowdown = -change if higher_is_better else change
+        unit = "/s" if higher_is_better else "ms"
+        flag = ""
+        if threshold is not None and slowdown > threshold:
+            regressions.append(row['name'])
+            flag = " REGRESSION"
+        print(f"{row['name']:<55} {old_value:>12}{unit} {value:>12}{unit} {change:>+7.1f}%{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Throughput benchmarks on a synthetic corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON report")
+    run_parser.add_argument("--articles", type=int, default=10000, help="corpus size, including repeats")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--end-date", type=lambda s: datetime.strptime(s, "%Y-%m-%d"),
+                            default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+                            help="last day of the corpus, YYYY-MM-DD (default: today, so the 90-day queries see it)")
+    run_parser.add_argument("--days", type=int, default=30, help="days the corpus is spread over")
+    run_parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    run_parser.add_argument("--syndication-rate", type=float, default=0.03)
+    run_parser.add_argument("--stages", help=f"comma-separated subset of {','.join(STAGES)}")
+    run_parser.add_argument("--poll-size", type=int, default=100, help="articles per store_articles call")
+    run_parser.add_argument("--sample", type=int, default=1000, help="texts for the preprocess_text benchmark")
+    run_parser.add_argument("--repeat", type=int, default=5, help="timed repetitions of each query benchmark")
+    run_parser.add_argument("--keyword-extractor", choices=("keybert", "tfidf"), default=None,
+                            help="default: chosen by backlog size, as in production")
+    run_parser.add_argument("--cache", action="store_true", help="keep the enrichment cache on (in a scratch file)")
+    run_parser.add_argument("--database", default=BENCH_MYSQL_DB, help="scratch database, dropped and recreated")
+    run_parser.add_argument("--output", help="JSON report path (default: benchmarks/results/<time>-<commit>.json)")
+
+    compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, help="exit with status 1 if anything is this many percent slower")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+    else:
+        regressions = compare(args.base, args.new, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold}%")
+            sys.exit(1)
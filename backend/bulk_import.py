@@ -0,0 +1,308 @@
+import os
+import gzip
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+import db_instrumentation
+import storage
+from fetch_news import connect_db, convert_publishedAt, create_url_table, url_key
+from url_filter import get_url_filter
+
+load_dotenv()
+
+# Offline backfill from archived NewsAPI responses, e.g.
+#   python bulk_import.py dumps/2023-*.jsonl.gz --workers 4 --defer-indexes
+# Every line is either a full response ({"articles": [...]}) or one article object.
+# Lines are parsed in a process pool, URLs are deduplicated against the database
+# (news_urls) and the dump itself by hash, and rows go in with large multi-row INSERTs (or
+# LOAD DATA LOCAL INFILE with --load-data). After every committed batch the byte
+# offset is written to <dump>.checkpoint, so an interrupted import resumes there.
+IMPORT_BATCH_LINES = int(os.getenv("IMPORT_BATCH_LINES", 2000))
+IMPORT_INSERT_ROWS = int(os.getenv("IMPORT_INSERT_ROWS", 5000))
+
+NEWS_COLUMNS = ("title", "source", "publishedAt", "url", "description", "content", "imageurl")
+
+def parse_published(value):
+    published = convert_publishedAt(value)
+    if published is None and value:
+        # Archives also carry fractional seconds and explicit offsets
+        try:
+            published = datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            published = None
+    return published
+
+def article_row(article):
+    """(hash, row) for the news table, or None when the article would be skipped by store_articles."""
+    url = article.get("url")
+    if not article.get("title") or not url:
+        return None
+    return url_key(url), (
+        article.get("title"),
+        (article.get("source") or {}).get("name"),
+        parse_published(article.get("publishedAt")),
+        url,
+        article.get("description"),
+        article.get("content"),
+        article.get("urlToImage"),
+    )
+
+def parse_lines(lines):
+    """Pool task: raw JSONL lines -> ([(hash, row), ...], bad line count)."""
+    rows, bad = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            bad += 1
+            continue
+        articles = data.get("articles", []) if isinstance(data, dict) and "articles" in data else [data]
+        for article in articles:
+            if isinstance(article, dict):
+                parsed = article_row(article)
+                if parsed:
+                    rows.append(parsed)
+    return rows, bad
+
+def open_dump(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def read_batches(path, start_offset=0, batch_lines=IMPORT_BATCH_LINES):
+    """
+    Yields (lines, end_offset). Offsets are positions in the (decompressed) stream;
+    resuming a gzip dump decompresses up to the offset but skips all parsing and inserting.
+    """
+    with open_dump(path) as f:
+        if start_offset:
+            f.seek(start_offset)
+        offset = start_offset
+        batch = []
+        for line in f:
+            offset += len(line)
+            batch.append(line)
+            if len(batch) >= batch_lines:
+                yield batch, offset
+                batch = []
+        if batch:
+            yield batch, offset
+
+def checkpoint_path(path):
+    return path + ".checkpoint"
+
+def load_checkpoint(path):
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'offset': 0, 'rows': 0}
+
+def save_checkpoint(path, checkpoint):
+    tmp = checkpoint_path(path) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, checkpoint_path(path))
+
+def load_known_hashes(chunk_size=50000):
+    """URL hashes of everything already in 'news' (news_urls), read in keyset chunks."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    create_url_table(cursor, conn)
+    known, last = set(), -2 ** 63
+    while True:
+        cursor.execute("SELECT url_hash FROM news_urls WHERE url_hash > %s ORDER BY url_hash LIMIT %s", (last, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        known.update(row[0] for row in rows)
+        last = rows[-1][0]
+    cursor.close()
+    conn.close()
+    return known
+
+def claim_urls(cursor, hashed_rows):
+    """
+    Drops the rows whose URL was stored since the import started (e.g. by the
+    fetcher) and claims the rest in news_urls, in the batch's transaction.
+    """
+    if not hashed_rows:
+        return []
+    keys = [h for h, _ in hashed_rows]
+    cursor.execute(f"SELECT url_hash FROM news_urls WHERE url_hash IN ({','.join(['%s'] * len(keys))})", tuple(keys))
+    taken = {row[0] for row in cursor.fetchall()}
+    hashed_rows = [(h, row) for h, row in hashed_rows if h not in taken]
+    cursor.executemany("INSERT IGNORE INTO news_urls (url_hash) VALUES (%s)", [(h,) for h, _ in hashed_rows])
+    return [row for _, row in hashed_rows]
+
+def secondary_indexes(cursor):
+    """ALTER TABLE clauses that recreate every non-primary index on 'news'."""
+    cursor.execute("SHOW INDEX FROM news")
+    columns = [c[0] for c in cursor.description]
+    indexes = {}
+    for row in cursor.fetchall():
+        info = dict(zip(columns, row))
+        if info['Key_name'] == 'PRIMARY':
+            continue
+        index = indexes.setdefault(info['Key_name'], {'unique': not int(info['Non_unique']), 'type': info['Index_type'], 'parts': []})
+        part = f"`{info['Column_name']}`" + (f"({info['Sub_part']})" if info['Sub_part'] else "")
+        index['parts'].append((int(info['Seq_in_index']), part))
+    clauses = {}
+    for name, index in indexes.items():
+        kind = "FULLTEXT INDEX" if index['type'] == 'FULLTEXT' else ("UNIQUE INDEX" if index['unique'] else "INDEX")
+        parts = ", ".join(part for _, part in sorted(index['parts']))
+        clauses[name] = f"ADD {kind} `{name}` ({parts})"
+    return clauses
+
+def drop_indexes(cursor, clauses):
+    if clauses:
+        print(f"Deferring {len(clauses)} index(es) on news: {', '.join(clauses)}")
+        cursor.execute("ALTER TABLE news " + ", ".join(f"DROP INDEX `{name}`" for name in clauses))
+
+def restore_indexes(cursor, clauses):
+    if clauses:
+        print(f"Rebuilding {len(clauses)} index(es) on news...")
+        cursor.execute("ALTER TABLE news " + ", ".join(clauses.values()))
+
+def insert_rows(cursor, rows):
+    # mysql-connector sends an INSERT executemany as multi-row INSERT statements
+    query = f"INSERT INTO news ({', '.join(NEWS_COLUMNS)}) VALUES ({', '.join(['%s'] * len(NEWS_COLUMNS))})"
+    for i in range(0, len(rows), IMPORT_INSERT_ROWS):
+        cursor.executemany(query, rows[i:i + IMPORT_INSERT_ROWS])
+
+def _tsv_field(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r").replace("\0", "\\0"))
+
+def load_data_rows(cursor, rows):
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", delete=False) as f:
+        for row in rows:
+            f.write("\t".join(_tsv_field(v) for v in row) + "\n")
+        tmp = f.name
+    try:
+        cursor.execute(f"""LOAD DATA LOCAL INFILE %s INTO TABLE news
+                           CHARACTER SET utf8mb4
+                           FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                           LINES TERMINATED BY '\\n'
+                           ({', '.join(NEWS_COLUMNS)})""", (tmp,))
+    finally:
+        os.remove(tmp)
+
+def connect_for_import(load_data):
+    if not load_data:
+        return connect_db()
+    # LOAD DATA LOCAL needs local_infile=1 on the server as well
+    return db_instrumentation.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=db_instrumentation.mysql_port(),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DB"),
+        allow_local_infile=True
+    )
+
+def import_dump(path, pool, known, cursor, conn, load_data=False, window=8, url_filter=None):
+    checkpoint = load_checkpoint(path)
+    if checkpoint.get('done'):
+        print(f"{path}: already imported ({checkpoint['rows']} rows), skipping.")
+        return 0
+    if checkpoint['offset']:
+        print(f"{path}: resuming at byte {checkpoint['offset']} ({checkpoint['rows']} rows imported so far)")
+
+    start = time.perf_counter()
+    start_offset = checkpoint['offset']
+    inserted = duplicates = bad_lines = 0
+    batches = read_batches(path, start_offset)
+    # Results come back in file order, so the checkpoint offset only ever moves forward
+    for (parsed, bad), end_offset in _parse_in_order(pool, batches, window):
+        hashed_rows = []
+        for h, row in parsed:
+            if h in known:
+                duplicates += 1
+                continue
+            known.add(h)
+            hashed_rows.append((h, row))
+        rows = claim_urls(cursor, hashed_rows)
+        duplicates += len(hashed_rows) - len(rows)
+        if rows:
+            (load_data_rows if load_data else insert_rows)(cursor, rows)
+        conn.commit()
+        if url_filter is not None:
+            # Keep the fetcher's seen-URL filter in step with the table
+            url_filter.add_many([row[3] for row in rows])
+        inserted += len(rows)
+        bad_lines += bad
+        checkpoint.update(offset=end_offset, rows=checkpoint['rows'] + len(rows))
+        save_checkpoint(path, checkpoint)
+
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {inserted} rows ({inserted / elapsed:.0f} rows/s, "
+              f"{(end_offset - start_offset) / elapsed / 1e6:.1f} MB/s), "
+              f"{duplicates} duplicates, {bad_lines} bad lines", flush=True)
+
+    checkpoint['done'] = True
+    save_checkpoint(path, checkpoint)
+    return inserted
+
+def _parse_in_order(pool, batches, window):
+    # At most `window` batches are in flight, so memory stays flat however large the dump is
+    pending = deque()
+    for batch, end_offset in batches:
+        pending.append((pool.apply_async(parse_lines, (batch,)), end_offset))
+        if len(pending) >= window:
+            result, offset = pending.popleft()
+            yield result.get(), offset
+    while pending:
+        result, offset = pending.popleft()
+        yield result.get(), offset
+
+def run_import(paths, workers=None, load_data=False, defer_indexes=False):
+    if storage.is_sqlite() and (load_data or defer_indexes):
+        # No LOAD DATA in SQLite; batched executemany in one transaction is its bulk path
+        print("SQLite backend: ignoring --load-data / --defer-indexes.")
+        load_data = defer_indexes = False
+    print("Loading URL hashes already in the database...")
+    known = load_known_hashes()
+    print(f"{len(known)} known URLs.")
+
+    conn = connect_for_import(load_data)
+    cursor = conn.cursor()
+    # Duplicates are already filtered by the hash set
+    storage.tune_for_bulk_load(cursor)
+    clauses = secondary_indexes(cursor) if defer_indexes else {}
+    drop_indexes(cursor, clauses)
+
+    start = time.perf_counter()
+    total = 0
+    url_filter = get_url_filter()
+    workers = workers or os.cpu_count() or 1
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for path in paths:
+                total += import_dump(path, pool, known, cursor, conn, load_data, workers * 2, url_filter)
+    finally:
+        restore_indexes(cursor, clauses)
+        cursor.close()
+        conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"Imported {total} articles from {len(paths)} dump(s) in {elapsed:.0f}s "
+          f"({total / elapsed if elapsed else 0:.0f} rows/s).")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import NewsAPI JSONL / JSONL.gz dumps into 'news'")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    parser.add_argument("--load-data", action="store_true", help="use LOAD DATA LOCAL INFILE instead of multi-row INSERTs")
+    parser.add_argument("--defer-indexes", action="store_true", help="drop secondary indexes on news during the import")
+    args = parser.parse_args()
+    run_import(args.paths, args.workers, args.load_data, args.defer_indexes)
@@ -0,0 +1,236 @@
+import os
+import re
+import sys
+import time
+import threading
+from datetime import datetime
+from functools import lru_cache
+from dotenv import load_dotenv
+import request_metrics
+import storage
+
+load_dotenv()
+
+# Wrappers around the storage backend's connections and cursors (see storage.py)
+# that every module's connect_db goes through. Each query is timed and charged to the current web request
+# (see request_metrics.py), aggregated per normalized statement with its callers, and
+# queries slower than SLOW_QUERY_MS are written to the slow-query log with their EXPLAIN plan.
+# Everything else is passed straight through to the real objects.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG") or os.path.join(BASE_DIR, "logs", "slow_queries.log")
+# Distinct statements tracked; later ones are counted under a single '(other)' entry
+QUERY_STATS_MAX = int(os.getenv("QUERY_STATS_MAX", 500))
+# A statement is EXPLAINed at most once per this many seconds
+EXPLAIN_INTERVAL = 60
+
+_lock = threading.Lock()
+_stats = {}
+_last_explained = {}
+
+_comment_re = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_string_re = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_number_re = re.compile(r"\b\d+(?:\.\d+)?\b")
+_placeholder_re = re.compile(r"%\(\w+\)s|%s")
+_in_list_re = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_values_re = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+", re.I)
+_space_re = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def normalize_statement(operation):
+    """'SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a'' -> 'SELECT * FROM t WHERE id IN (...) AND x = ?'"""
+    sql = _comment_re.sub(" ", operation)
+    sql = _string_re.sub("?", sql)
+    sql = _placeholder_re.sub("?", sql)
+    sql = _number_re.sub("?", sql)
+    sql = _in_list_re.sub("(...)", sql)
+    sql = _values_re.sub(r"\1", sql)
+    return _space_re.sub(" ", sql).strip()
+
+def _caller():
+    """module.function:line of the first frame outside this file."""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+
+def _record(statement, seconds, caller):
+    with _lock:
+        entry = _stats.get(statement)
+        if entry is None:
+            if len(_stats) >= QUERY_STATS_MAX:
+                statement = "(other)"
+                entry = _stats.get(statement)
+            if entry is None:
+                entry = _stats[statement] = {'count': 0, 'total': 0.0, 'max': 0.0, 'rows': 0, 'callers': {}}
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        if caller not in entry['callers'] and len(entry['callers']) < 10:
+            entry['callers'][caller] = 0
+        if caller in entry['callers']:
+            entry['callers'][caller] += 1
+    return statement
+
+def _add_rows(statement, rows):
+    with _lock:
+        entry = _stats.get(statement)
+        if entry is not None:
+            entry['rows'] += rows
+
+def query_stats(limit=20):
+    """Per-statement aggregates, the statements with the most total time first."""
+    with _lock:
+        snapshot = [(statement, dict(entry, callers=dict(entry['callers']))) for statement, entry in _stats.items()]
+    rows = []
+    for statement, entry in snapshot:
+        rows.append({
+            'statement': statement,
+            'count': entry['count'],
+            'total_ms': round(entry['total'] * 1000, 1),
+            'avg_ms': round(entry['total'] / entry['count'] * 1000, 2),
+            'max_ms': round(entry['max'] * 1000, 1),
+            'avg_rows': round(entry['rows'] / entry['count'], 1),
+            'callers': [caller for caller, _ in sorted(entry['callers'].items(), key=lambda c: -c[1])],
+        })
+    rows.sort(key=lambda r: r['total_ms'], reverse=True)
+    return rows[:limit]
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+def _explain_and_log(connect_kwargs, operation, params, statement, seconds, caller):
+    plan = ""
+    explainable = operation.lstrip()[:7].upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE"))
+    # executemany batches are logged without a plan: there is no single parameter set to EXPLAIN
+    if explainable and (params is not None or "%s" not in operation):
+        conn = None
+        try:
+            # A separate, uninstrumented connection: the original may still have unread results
+            conn = storage.connect(**connect_kwargs)
+            cursor = conn.cursor()
+            cursor.execute(storage.explain_statement(operation), params)
+            columns = [c[0] for c in cursor.description]
+            plan = "\n".join("    " + ", ".join(f"{c}={v}" for c, v in zip(columns, row) if v is not None)
+                             for row in cursor.fetchall())
+            cursor.close()
+        except Exception as e:
+            plan = f"    EXPLAIN failed: {e}"
+        finally:
+            if conn is not None:
+                conn.close()
+    try:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG), exist_ok=True)
+        with open(SLOW_QUERY_LOG, "a") as f:
+            f.write(f"{datetime.now().isoformat(timespec='seconds')} {seconds * 1000:.1f}ms {caller}\n"
+                    f"  {statement}\n{plan}\n")
+    except OSError as e:
+        print(f"Error writing slow query log: {e}")
+
+def _slow_query(connect_kwargs, operation, params, statement, seconds, caller):
+    now = time.time()
+    with _lock:
+        if now - _last_explained.get(statement, 0) < EXPLAIN_INTERVAL:
+            return
+        _last_explained[statement] = now
+    # EXPLAIN runs in the background so the slow request is not made slower still
+    threading.Thread(target=_explain_and_log, args=(connect_kwargs, operation, params, statement, seconds, caller),
+                     daemon=True).start()
+
+class InstrumentedCursor:
+    def __init__(self, cursor, connect_kwargs):
+        self._cursor = cursor
+        self._connect_kwargs = connect_kwargs
+        self._statement = None
+
+    def _timed(self, method, operation, params, *args, **kwargs):
+        caller = _caller()
+        start = time.perf_counter()
+        try:
+            return method(operation, params, *args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            request_metrics.add_time('db', seconds)
+            self._statement = _record(normalize_statement(operation), seconds, caller)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                _slow_query(self._connect_kwargs, operation, params if method == self._cursor.execute else None,
+                            self._statement, seconds, caller)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _fetched(self, rows, seconds):
+        request_metrics.add_time('db', seconds)
+        if self._statement is not None:
+            _add_rows(self._statement, rows)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        result = self._cursor.fetchall()
+        self._fetched(len(result), time.perf_counter() - start)
+        return result
+
+    def fetchmany(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(len(result), time.perf_counter() - start)
+        return result
+
+    def fetchone(self):
+        start = time.perf_counter()
+        result = self._cursor.fetchone()
+        self._fetched(0 if result is None else 1, time.perf_counter() - start)
+        return result
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    def __init__(self, conn, connect_kwargs):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_connect_kwargs', connect_kwargs)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._connect_kwargs)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            request_metrics.add_time('db', time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # e.g. conn.autocommit = True
+        setattr(self._conn, name, value)
+
+def mysql_port():
+    """MYSQL_PORT as a number (3306 when unset); None for SQLite, which ignores the MySQL settings."""
+    if storage.is_sqlite():
+        return None
+    return int(os.getenv("MYSQL_PORT") or 3306)
+
+def connect(**kwargs):
+    """storage.connect (MySQL or SQLite) with query instrumentation; defaults to the MYSQL_* settings."""
+    if not kwargs:
+        kwargs = dict(
+            host=os.getenv("MYSQL_HOST"),
+            port=mysql_port(),
+            user=os.getenv("MYSQL_USER"),
+            password=os.getenv("MYSQL_PASSWORD"),
+            database=os.getenv("MYSQL_DB")
+        )
+    return InstrumentedConnection(storage.connect(**kwargs), kwargs)
@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Persistent cache of model outputs keyed by (stage, model version, normalized text hash),
+# so syndicated / re-fetched articles with identical text never hit a model twice.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("ENRICHMENT_CACHE_PATH", os.path.join(BASE_DIR, "models", "enrichment_cache.sqlite"))
+CACHE_MAX_MB = float(os.getenv("ENRICHMENT_CACHE_MAX_MB", 512))
+CACHE_ENABLED = os.getenv("ENRICHMENT_CACHE", "1").lower() not in ("0", "false", "no")
+
+_local = threading.local()
+_counters = {}
+_counters_lock = threading.Lock()
+_space_re = re.compile(r"\s+")
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB,
+            size INTEGER,
+            last_used REAL)''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_used ON cache(last_used)")
+        conn.commit()
+        _local.conn = conn
+    return conn
+
+def normalize_text(text):
+    return _space_re.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+def make_key(stage, model_version, text):
+    digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{stage}:{model_version}:{digest}"
+
+def _count(stage, hits, misses):
+    with _counters_lock:
+        counter = _counters.setdefault(stage, {'hits': 0, 'misses': 0})
+        counter['hits'] += hits
+        counter['misses'] += misses
+
+def get_many(keys):
+    """Returns {key: value} for the keys found, and marks them as recently used."""
+    if not keys:
+        return {}
+    conn = _connect()
+    found = {}
+    unique_keys = list(dict.fromkeys(keys))
+    for i in range(0, len(unique_keys), 500):
+        chunk = unique_keys[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        for key, value in conn.execute(f"SELECT key, value FROM cache WHERE key IN ({placeholders})", chunk):
+            found[key] = pickle.loads(value)
+    if found:
+        now = time.time()
+        conn.executemany("UPDATE cache SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+        conn.commit()
+    return found
+
+def put_many(items):
+    """Stores {key: value} and evicts least recently used entries beyond ENRICHMENT_CACHE_MAX_MB."""
+    if not items:
+        return
+    conn = _connect()
+    now = time.time()
+    rows = []
+    for key, value in items.items():
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        rows.append((key, blob, len(blob), now))
+    conn.executemany("INSERT OR REPLACE INTO cache (key, value, size, last_used) VALUES (?, ?, ?, ?)", rows)
+    conn.commit()
+    _evict(conn)
+
+def _evict(conn):
+    max_bytes = int(CACHE_MAX_MB * 1024 * 1024)
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+    while total > max_bytes:
+        rows = conn.execute("SELECT key, size FROM cache ORDER BY last_used ASC LIMIT 1000").fetchall()
+        if not rows:
+            break
+        evict = []
+        for key, size in rows:
+            evict.append((key,))
+            total -= size
+            if total <= max_bytes:
+                break
+        conn.executemany("DELETE FROM cache WHERE key = ?", evict)
+        conn.commit()
+
+def cached_batch(stage, model_version, texts, compute_fn):
+    """
+    Returns one result per text, only running compute_fn (a batch function)
+    on the distinct texts that are not cached yet for this stage and model version.
+    """
+    texts = list(texts)
+    if not CACHE_ENABLED or not texts:
+        return compute_fn(texts) if texts else []
+
+    keys = [make_key(stage, model_version, text) for text in texts]
+    found = get_many(keys)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    # Repeats of the same text within one batch count as hits, they are computed once
+    _count(stage, len(texts) - len(missing), len(missing))
+
+    if missing:
+        results = compute_fn(list(missing.values()))
+        computed = dict(zip(missing.keys(), results))
+        put_many(computed)
+        found.update(computed)
+    return [found[key] for key in keys]
+
+def stats():
+    with _counters_lock:
+        stages = {stage: dict(c) for stage, c in _counters.items()}
+    for c in stages.values():
+        total = c['hits'] + c['misses']
+        c['hit_rate'] = round(c['hits'] / total, 3) if total else 0.0
+    try:
+        entries, size = _connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+    except Exception as e:
+        print(f"Error reading enrichment cache: {e}")
+        entries, size = 0, 0
+    return {
+        'enabled': CACHE_ENABLED,
+        'entries': entries,
+        'size_mb': round(size / (1024 * 1024), 2),
+        'max_mb': CACHE_MAX_MB,
+        'stages': stages
+    }
+
+def clear(stage=None):
+    conn = _connect()
+    if stage:
+        conn.execute("DELETE FROM cache WHERE key LIKE ?", (f"{stage}:%",))
+    else:
+        conn.execute("DELETE FROM cache")
+    conn.commit()
@@ -0,0 +1,195 @@
+from dotenv import load_dotenv
+from fetch_news import connect_db
+
+load_dotenv()
+
+# The enrichment stages split into compute (models only, safe to run in worker
+# processes) and write (one bulk insert per batch, done by a single writer), shared
+# by the job queue workers and the process-pool runner.
+
+# Stage name -> table whose article_id marks an article as already enriched
+RESULT_TABLES = {
+    'sentiment': 'sentiments',
+    'ner': 'entities',
+    'keywords': 'keywords',
+    'topics': 'article_topics_mapping',
+}
+
+# Models each stage needs, so workers can load them up front
+STAGE_MODELS = {
+    'sentiment': ['sentiment'],
+    'ner': ['spacy'],
+    'keywords': ['keybert'],
+    'topics': ['bertopic'],
+}
+
+_done_ready = False
+
+def check_stage(stage):
+    if stage not in RESULT_TABLES:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {tuple(RESULT_TABLES)}")
+
+def create_done_table():
+    """enrichment_done: one row per (stage, article) processed, whether or not it produced a result."""
+    global _done_ready
+    if _done_ready:
+        return
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS enrichment_done (
+        stage VARCHAR(32) NOT NULL,
+        article_id INT NOT NULL,
+        done_at DATETIME NOT NULL,
+        PRIMARY KEY (stage, article_id),
+        FOREIGN KEY (article_id) REFERENCES news(id)
+    );''')
+    conn.commit()
+    conn.close()
+    _done_ready = True
+
+def mark_done(cursor, stage, article_ids):
+    """
+    Records that the stage has processed these articles, including the ones it
+    stored nothing for (no text, no entities). Uses the caller's cursor; the caller commits.
+    """
+    if not article_ids:
+        return
+    create_done_table()
+    cursor.executemany("INSERT IGNORE INTO enrichment_done (stage, article_id, done_at) VALUES (%s, %s, NOW())",
+                       [(stage, article_id) for article_id in article_ids])
+
+def pending_articles(stage):
+    """
+    FROM ... WHERE selecting the articles the stage has not processed: no enrichment_done
+    marker and no result row (results written before the markers existed). Takes the
+    stage as its one parameter, e.g. cursor.execute("SELECT n.id " + pending_articles(stage), (stage,)).
+    """
+    create_done_table()
+    return f'''FROM news n
+               LEFT JOIN {RESULT_TABLES[stage]} r ON n.id = r.article_id
+               LEFT JOIN enrichment_done d ON d.stage = %s AND d.article_id = n.id
+               WHERE r.article_id IS NULL AND d.article_id IS NULL'''
+
+def prepare(stage):
+    """Creates the stage's result tables (the stage modules do this in their connect_db)."""
+    check_stage(stage)
+    create_done_table()
+    if stage == 'sentiment':
+        import sentiment
+        sentiment.connect_db().close()
+    elif stage == 'ner':
+        import ner
+        import entity_dictionary
+        ner.connect_db().close()
+        entity_dictionary.create_entity_tables()
+    elif stage == 'keywords':
+        import keyword_extractor
+        import keyword_dictionary
+        keyword_extractor.create_keywords_table()
+        keyword_dictionary.create_keyword_tables()
+    elif stage == 'topics':
+        import topic_selection
+        topic_selection.create_and_sync_topic_tables()
+
+def article_text(stage, article):
+    title = article['title'] or ""
+    description = article['description'] or ""
+    if stage == 'topics':
+        from topic_selection import preprocess_text_for_bert
+        return preprocess_text_for_bert(title + " " + description + " " + (article['content'] or ""))
+    return (title + " " + description).strip()
+
+def fetch_articles(cursor, stage, article_ids=None, limit=None):
+    """
+    Articles this stage has not processed, optionally restricted to article_ids.
+    Expects a dictionary cursor.
+    """
+    query = "SELECT n.id, n.title, n.description, n.content " + pending_articles(stage)
+    params = [stage]
+    if article_ids is not None:
+        if not article_ids:
+            return []
+        query += f" AND n.id IN ({','.join(['%s'] * len(article_ids))})"
+        params.extend(article_ids)
+    query += " ORDER BY n.id"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    cursor.execute(query, tuple(params))
+    return cursor.fetchall()
+
+def compute(stage, articles):
+    """
+    Runs the stage's models. Returns (kept_articles, results): articles without any
+    text are dropped, like the serial stage functions do.
+    """
+    texts, kept = [], []
+    for article in articles:
+        text = article_text(stage, article)
+        if text:
+            texts.append(text)
+            kept.append(article)
+    if not kept:
+        return [], []
+
+    if stage == 'sentiment':
+        from sentiment import analyze_sentiments
+        results = analyze_sentiments(texts)
+    elif stage == 'ner':
+        from ner import extract_entities_many
+        results = extract_entities_many(texts)
+    elif stage == 'keywords':
+        from keyword_extractor import extract_keywords
+        results = extract_keywords(texts)
+    else:
+        from model_registry import get_model
+        from topic_selection import assign_topics_batch
+        results = assign_topics_batch(get_model("bertopic"), texts)
+    return kept, results
+
+def write(cursor, stage, article_ids, results):
+    """Bulk-inserts one batch of results with the caller's cursor; the caller commits."""
+    if not article_ids:
+        return
+    if stage == 'sentiment':
+        cursor.executemany('''INSERT IGNORE INTO sentiments (article_id, positive, neutral, negative, overall)
+                                     VALUES (%s, %s, %s, %s, %s)''',
+                           [(article_id, float(s['positive']), float(s['neutral']), float(s['negative']), str(s['overall']))
+                            for article_id, s in zip(article_ids, results)])
+    elif stage == 'ner':
+        import entity_dictionary
+        rows = [(article_id, ent['text'], ent['label'], float(ent.get('confidence', 1.0)))
+                for article_id, entities_list in zip(article_ids, results) for ent in entities_list]
+        # A batch that is re-run (e.g. a reclaimed job) replaces its rows rather than duplicating them
+        placeholders = ", ".join(["%s"] * len(article_ids))
+        cursor.execute(f"DELETE FROM entities WHERE article_id IN ({placeholders})", tuple(article_ids))
+        if rows:
+            cursor.executemany("INSERT INTO entities (article_id, name, type, confidence) VALUES (%s, %s, %s, %s)", rows)
+        for article_id, entities_list in zip(article_ids, results):
+            entity_dictionary.save_article_entities(cursor, article_id, entities_list)
+    elif stage == 'keywords':
+        import keyword_dictionary
+        cursor.executemany("INSERT INTO keywords (keywords, article_id, extractor) VALUES (%s, %s, 'keybert')",
+                           [(', '.join([kw for kw, _ in keywords]), article_id)
+                            for article_id, keywords in zip(article_ids, results)])
+        for article_id, keywords in zip(article_ids, results):
+            keyword_dictionary.save_article_keywords(cursor, article_id, keywords)
+    else:
+        cursor.executemany('''INSERT IGNORE INTO article_topics_mapping (article_id, topic_id, relevance_score, assigned_at)
+                              VALUES (%s, %s, %s, NOW())''',
+                           [(article_id, topic_id, score) for article_id, (topic_id, score) in zip(article_ids, results)])
+
+def run_batch(stage, article_ids):
+    """Fetch, compute and write one batch in this process. Returns the number of articles written."""
+    conn = connect_db()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        articles = fetch_articles(cursor, stage, article_ids)
+        kept, results = compute(stage, articles)
+        write(cursor, stage, [article['id'] for article in kept], results)
+        mark_done(cursor, stage, [article['id'] for article in articles])
+        conn.commit()
+        cursor.close()
+        return len(kept)
+    finally:
+        conn.close()
@@ -0,0 +1,245 @@
+import re
+import unicodedata
+from dotenv import load_dotenv
+from fetch_news import connect_db
+
+load_dotenv()
+
+# Canonical entity dictionary: every distinct (name, type) gets one integer id,
+# articles point at ids, and per-day counts are kept up to date as entities are saved,
+# so "which people are trending" is an index range scan instead of a GROUP BY over 'entities'.
+
+# Alias folding applied after case/whitespace normalization. Extend through the
+# entity_aliases table for feed-specific names.
+DEFAULT_ALIASES = {
+    'us': 'united states',
+    'usa': 'united states',
+    'united states of america': 'united states',
+    'america': 'united states',
+    'uk': 'united kingdom',
+    'britain': 'united kingdom',
+    'great britain': 'united kingdom',
+    'uae': 'united arab emirates',
+    'eu': 'european union',
+    'un': 'united nations',
+    'nyc': 'new york city',
+    'prc': 'china',
+}
+
+ENTITY_GROUPS = {
+    'PERSON': 'people',
+    'ORG': 'organizations',
+    'GPE': 'locations',
+    'LOC': 'locations'
+}
+
+_tables_ready = False
+_aliases = None
+_possessive_re = re.compile(r"['’]s$")
+_punct_re = re.compile(r"[\.’'`\"]")
+_space_re = re.compile(r"\s+")
+
+def create_entity_tables():
+    global _tables_ready
+    if _tables_ready:
+        return
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS entity_dict (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        norm_key VARCHAR(255) NOT NULL,
+        type VARCHAR(100) NOT NULL,
+        name VARCHAR(255),
+        UNIQUE KEY (norm_key, type)
+    );''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS entity_aliases (
+        alias VARCHAR(255) PRIMARY KEY,
+        norm_key VARCHAR(255) NOT NULL
+    );''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS article_entities (
+        article_id INT NOT NULL,
+        entity_id INT NOT NULL,
+        PRIMARY KEY (article_id, entity_id),
+        INDEX (entity_id),
+        FOREIGN KEY (article_id) REFERENCES news(id),
+        FOREIGN KEY (entity_id) REFERENCES entity_dict(id)
+    );''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS entity_daily_counts (
+        day DATE NOT NULL,
+        entity_id INT NOT NULL,
+        n INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, entity_id),
+        INDEX (entity_id, day),
+        FOREIGN KEY (entity_id) REFERENCES entity_dict(id)
+    );''')
+    conn.commit()
+    conn.close()
+    _tables_ready = True
+
+def load_aliases(cursor=None):
+    global _aliases
+    aliases = dict(DEFAULT_ALIASES)
+    close = False
+    if cursor is None:
+        conn = connect_db()
+        cursor = conn.cursor()
+        close = True
+    try:
+        cursor.execute("SELECT alias, norm_key FROM entity_aliases")
+        for alias, norm_key in cursor.fetchall():
+            aliases[alias] = norm_key
+    except Exception as e:
+        print(f"Error loading entity aliases: {e}")
+    finally:
+        if close:
+            conn.close()
+    _aliases = aliases
+    return aliases
+
+def canonical_key(name):
+    """
+    Case, whitespace and alias folding: 'The U.S.', 'US' and 'united  states'
+    all become 'united states'.
+    """
+    if _aliases is None:
+        load_aliases()
+    key = unicodedata.normalize("NFKC", name or "").lower().strip()
+    key = _possessive_re.sub("", key)
+    key = _punct_re.sub("", key)
+    key = _space_re.sub(" ", key).strip()
+    if key.startswith("the "):
+        key = key[4:]
+    return _aliases.get(key, key)[:255]
+
+def get_entity_ids(cursor, entities_list):
+    """Returns {(norm_key, type): id} for the entities, adding new ones to entity_dict."""
+    ids = {}
+    for ent in entities_list:
+        norm_key = canonical_key(ent['text'])
+        ent_type = ent['label']
+        if not norm_key or (norm_key, ent_type) in ids:
+            continue
+        # LAST_INSERT_ID(id) makes lastrowid return the existing id on duplicates
+        cursor.execute('''INSERT INTO entity_dict (norm_key, type, name) VALUES (%s, %s, %s)
+                          ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)''',
+                       (norm_key, ent_type, ent['text'][:255]))
+        ids[(norm_key, ent_type)] = cursor.lastrowid
+    return ids
+
+def save_article_entities(cursor, article_id, entities_list):
+    """
+    Links an article to its canonical entities and bumps the per-day counts for
+    new links only, so re-saving an article never double counts it.
+    Uses the caller's cursor; the caller commits.
+    """
+    create_entity_tables()
+    for entity_id in set(get_entity_ids(cursor, entities_list).values()):
+        cursor.execute("INSERT IGNORE INTO article_entities (article_id, entity_id) VALUES (%s, %s)",
+                       (article_id, entity_id))
+        if cursor.rowcount == 1:
+            cursor.execute('''INSERT INTO entity_daily_counts (day, entity_id, n)
+                              SELECT COALESCE(DATE(publishedAt), CURDATE()), %s, 1 FROM news WHERE id = %s
+                              ON DUPLICATE KEY UPDATE n = n + 1''', (entity_id, article_id))
+
+def backfill_from_entities(batch_size=1000):
+    """One-off migration of the raw 'entities' rows into the normalized tables."""
+    create_entity_tables()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT e.article_id, e.name, e.type
+                      FROM entities e
+                      LEFT JOIN article_entities ae ON e.article_id = ae.article_id
+                      WHERE ae.article_id IS NULL
+                      ORDER BY e.article_id''')
+    by_article = {}
+    for article_id, name, ent_type in cursor.fetchall():
+        by_article.setdefault(article_id, []).append({'text': name, 'label': ent_type})
+
+    print(f"Backfilling normalized entities for {len(by_article)} articles...")
+    for i, (article_id, entities_list) in enumerate(by_article.items(), 1):
+        save_article_entities(cursor, article_id, entities_list)
+        if i % batch_size == 0:
+            conn.commit()
+    conn.commit()
+    cursor.close()
+    conn.close()
+    print("Entity backfill complete.")
+
+def get_trending_entities(days=1, entity_type=None, limit=10):
+    """Top entities by article count over the last N days, e.g. entity_type='PERSON'."""
+    create_entity_tables()
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    query = '''SELECT d.id, d.name, d.type, SUM(c.n) AS count
+               FROM entity_daily_counts c
+               JOIN entity_dict d ON c.entity_id = d.id
+               WHERE c.day > CURDATE() - INTERVAL %s DAY'''
+    params = [days]
+    if entity_type:
+        query += " AND d.type = %s"
+        params.append(entity_type)
+    query += " GROUP BY d.id, d.name, d.type ORDER BY count DESC LIMIT %s"
+    params.append(limit)
+    cursor.execute(query, tuple(params))
+    rows = cursor.fetchall()
+    for row in rows:
+        row['count'] = int(row['count'])
+    cursor.close()
+    conn.close()
+    return rows
+
+def get_article_ids_for_entity(entity_id, limit=100):
+    create_entity_tables()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT ae.article_id FROM article_entities ae
+                      JOIN news n ON ae.article_id = n.id
+                      WHERE ae.entity_id = %s
+                      ORDER BY n.publishedAt DESC LIMIT %s''', (entity_id, limit))
+    ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return ids
+
+def get_grouped_entities(cursor, article_ids):
+    """
+    {article_id: {'people': [...], 'organizations': [...], 'locations': [...]}} from
+    the normalized tables, one row per canonical entity. Articles enriched before the
+    dictionary existed (not yet backfilled) fall back to their raw 'entities' rows.
+    Expects a dictionary cursor.
+    """
+    grouped = {article_id: {'people': [], 'organizations': [], 'locations': []} for article_id in article_ids}
+    if not article_ids:
+        return grouped
+    create_entity_tables()
+    ids_placeholder = ','.join(['%s'] * len(article_ids))
+    cursor.execute(f'''SELECT ae.article_id, d.name, d.type
+                       FROM article_entities ae
+                       JOIN entity_dict d ON ae.entity_id = d.id
+                       WHERE ae.article_id IN ({ids_placeholder})''', tuple(article_ids))
+    found = set()
+    for row in cursor.fetchall():
+        found.add(row['article_id'])
+        group = ENTITY_GROUPS.get(row['type'])
+        if group and row['article_id'] in grouped:
+            grouped[row['article_id']][group].append(row['name'])
+
+    legacy = [article_id for article_id in grouped if article_id not in found]
+    if legacy:
+        ids_placeholder = ','.join(['%s'] * len(legacy))
+        try:
+            cursor.execute(f'''SELECT DISTINCT article_id, name, type FROM entities
+                               WHERE article_id IN ({ids_placeholder})''', tuple(legacy))
+            rows = cursor.fetchall()
+        except Exception as e:
+            # NER has never run
+            print(f"Error loading raw entities: {e}")
+            rows = []
+        for row in rows:
+            group = ENTITY_GROUPS.get(row['type'])
+            if group and row['name'] not in grouped[row['article_id']][group]:
+                grouped[row['article_id']][group].append(row['name'])
+    return grouped
+
+if __name__ == "__main__":
+    backfill_from_entities()
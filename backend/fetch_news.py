@@ -5,24 +5,31 @@
 
 
 import os
+import time
+import hashlib
 from dotenv import load_dotenv
 import requests
-import mysql.connector
 from datetime import datetime
+from url_filter import get_url_filter
+import db_instrumentation
+import pipeline_metrics
 
 load_dotenv()
 
+_url_table_ready = False
+
 def create_database():
-    conn = mysql.connector.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD")
     )
     cursor = conn.cursor()
-    cursor.execute('''CREATE DATABASE IF NOT EXISTS newsdb;''')
+    database = os.getenv("MYSQL_DB") or "newsdb"
+    cursor.execute(f'''CREATE DATABASE IF NOT EXISTS `{database}`;''')
     conn.commit()
-    cursor.execute('USE newsdb;')
+    cursor.execute(f'USE `{database}`;')
     conn.commit()
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS news (
@@ -36,15 +43,59 @@ def create_database():
         imageurl TEXT,
         keywords VARCHAR(255),
         topic VARCHAR(255));''')
+    create_url_table(cursor, conn)
     print("Database and table ensured.")
     conn.commit()
     conn.close()
     return
 
+def url_key(url):
+    """Signed 64-bit hash of a URL, the key of news_urls."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def create_url_table(cursor, conn, chunk_size=50000):
+    """
+    news_urls holds the hash of every stored URL; its primary key is what keeps a URL
+    from being stored twice (news.url is LONGTEXT, and a unique key on news would block
+    partitioning). Keys of deleted articles stay, so they are not fetched again.
+    Filled from 'news' the first time it is created.
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS news_urls (
+        url_hash BIGINT PRIMARY KEY);''')
+    cursor.execute("SELECT 1 FROM news_urls LIMIT 1")
+    if cursor.fetchall():
+        return
+    last = 0
+    while True:
+        cursor.execute("SELECT id, url FROM news WHERE id > %s ORDER BY id LIMIT %s", (last, chunk_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany("INSERT IGNORE INTO news_urls (url_hash) VALUES (%s)",
+                           [(url_key(url),) for _, url in rows if url])
+        conn.commit()
+        last = rows[-1][0]
+    if last:
+        print("Filled news_urls from the stored articles.")
+
+def _ensure_url_table(cursor, conn):
+    """create_url_table once per process, for databases created before news_urls existed."""
+    global _url_table_ready
+    if not _url_table_ready:
+        create_url_table(cursor, conn)
+        _url_table_ready = True
+
+def claim_url(cursor, url):
+    """Reserves a URL for a new article; False if it is already stored. Commits with the article."""
+    if not url:
+        return True
+    cursor.execute("INSERT IGNORE INTO news_urls (url_hash) VALUES (%s)", (url_key(url),))
+    return cursor.rowcount == 1
+
 def connect_db():
-    return mysql.connector.connect(
+    return db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -70,12 +121,22 @@ def convert_publishedAt(publishedAt_str):
 def insert_news(article):
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(1) FROM news WHERE url = %s", (article.get("url"),))
-    exists = cursor.fetchone()[0]
-    if exists:
+    _ensure_url_table(cursor, conn)
+    if not claim_url(cursor, article.get("url")):
+        conn.commit()
         cursor.close()
         conn.close()
-        return
+        return False
+    _insert_article(cursor, article)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    url_filter = get_url_filter()
+    if url_filter is not None:
+        url_filter.add(article.get("url"))
+    return True
+
+def _insert_article(cursor, article):
     published = convert_publishedAt(article.get("publishedAt"))
 
     cursor.execute(
@@ -90,18 +151,54 @@ def insert_news(article):
             article.get("urlToImage"),
         )
     )
-    conn.commit()
-    cursor.close()
-    conn.close()
 
 def store_articles(articles):
+    """Inserts the articles not stored yet; returns how many were inserted."""
+    articles = [article for article in articles if article.get("title")]
+    url_filter = get_url_filter()
+    if url_filter is None:
+        return sum(1 for article in articles if insert_news(article))
+
+    # URLs the Bloom filter has never seen are almost certainly new and go straight to
+    # their insert; the possible matches are looked up with one query for the whole
+    # poll. Either way claim_url (news_urls' primary key) has the final say.
+    maybe_known = list({article.get("url") for article in articles
+                        if article.get("url") and article.get("url") in url_filter})
+    conn = connect_db()
+    cursor = conn.cursor()
+    _ensure_url_table(cursor, conn)
+    known = set()
+    if maybe_known:
+        keys = {url_key(url): url for url in maybe_known}
+        placeholders = ','.join(['%s'] * len(keys))
+        cursor.execute(f"SELECT url_hash FROM news_urls WHERE url_hash IN ({placeholders})", tuple(keys))
+        known = {keys[row[0]] for row in cursor.fetchall()}
+
+    inserted = []
     for article in articles:
-        if article.get("title"):
-            insert_news(article)
+        url = article.get("url")
+        if url in known:
+            continue
+        known.add(url)
+        if not claim_url(cursor, url):
+            continue
+        _insert_article(cursor, article)
+        inserted.append(url)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    url_filter.add_many(inserted)
+    print(f"Stored {len(inserted)} new articles, {len(articles) - len(inserted)} already known "
+          f"({len(maybe_known)} checked in the database).")
+    return len(inserted)
 
 def fetch_and_store():
-    articles = fetch_live_news()
-    store_articles(articles)
+    with pipeline_metrics.track('fetch') as run:
+        start = time.perf_counter()
+        articles = fetch_live_news()
+        fetched = time.perf_counter()
+        stored = store_articles(articles)
+        run.batch(len(articles), stored, fetched - start, time.perf_counter() - fetched)
 
 if __name__ == "__main__":
     fetch_and_store()
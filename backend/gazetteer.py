@@ -0,0 +1,186 @@
+import os
+import re
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Gazetteer fast path for NER: an Aho-Corasick automaton over every entity spaCy
+# has already confirmed, so known names are found in one linear pass per document
+# and only documents with unknown capitalized spans need the statistical model.
+GAZETTEER_ENABLED = os.getenv("NER_GAZETTEER", "1").lower() not in ("0", "false", "no")
+# An entity is 'confirmed' once spaCy has tagged it in this many articles
+GAZETTEER_MIN_COUNT = int(os.getenv("NER_GAZETTEER_MIN_COUNT", 3))
+
+_word_char_re = re.compile(r"\w")
+_token_re = re.compile(r"[A-Za-z][\w'’\-]*")
+_sentence_end_re = re.compile(r"[.!?:;\"“”]\s*$")
+
+class AhoCorasick:
+    """Aho-Corasick automaton over exact (case-sensitive) patterns."""
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+        self._dirty = False
+
+    def add(self, pattern, value):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            node = nxt
+        self.output[node] = (len(pattern), value)
+        self._dirty = True
+
+    def _build_links(self):
+        # Breadth-first pass recomputing failure links; cheap compared to re-adding every pattern
+        self.fail = [0] * len(self.goto)
+        self.dict_link = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                fl = self.fail[nxt]
+                self.dict_link[nxt] = fl if self.output[fl] is not None else self.dict_link[fl]
+        self._dirty = False
+
+    def iter_matches(self, text):
+        """Yields (start, end, value) for every pattern occurrence, in a single pass over text."""
+        if self._dirty or not hasattr(self, "dict_link"):
+            self._build_links()
+        goto, fail, output, dict_link = self.goto, self.fail, self.output, self.dict_link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            match = node if output[node] is not None else dict_link[node]
+            while match:
+                length, value = output[match]
+                yield i + 1 - length, i + 1, value
+                match = dict_link[match]
+
+    def __len__(self):
+        return sum(1 for o in self.output if o is not None)
+
+class Gazetteer:
+    def __init__(self):
+        self.automaton = AhoCorasick()
+        self.known = {}
+        # Words seen in lowercase in the corpus: a capitalized 'Rally' or 'Stocks'
+        # in a title-case headline is not an entity candidate
+        self.common_words = set()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, label):
+        name = name.strip()
+        if not name or name in self.known:
+            return
+        self.known[name] = label
+        self.automaton.add(name, label)
+
+    def confirm(self, name, label):
+        """Counts a model-found entity and adds it to the automaton once it reaches GAZETTEER_MIN_COUNT."""
+        with self.lock:
+            if name in self.known:
+                return
+            key = (name, label)
+            self.pending[key] = self.pending.get(key, 0) + 1
+            if self.pending[key] >= GAZETTEER_MIN_COUNT:
+                del self.pending[key]
+                self.add(name, label)
+
+    def match(self, text):
+        """
+        Returns (entities, needs_model). Matches are kept at word boundaries with
+        leftmost-longest resolution; needs_model is True when a capitalized span
+        is left that the gazetteer does not cover.
+        """
+        with self.lock:
+            matches = list(self.automaton.iter_matches(text))
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+
+        entities, covered_until, spans = set(), -1, []
+        for start, end, label in matches:
+            if start < covered_until:
+                continue
+            if start > 0 and _word_char_re.match(text[start - 1]):
+                continue
+            if end < len(text) and _word_char_re.match(text[end]):
+                continue
+            entities.add((text[start:end], label))
+            spans.append((start, end))
+            covered_until = end
+
+        return [{'text': t, 'label': l} for t, l in entities], self._has_unknown_span(text, spans)
+
+    def _has_unknown_span(self, text, spans):
+        span_index = 0
+        for token in _token_re.finditer(text):
+            while span_index < len(spans) and spans[span_index][1] <= token.start():
+                span_index += 1
+            if span_index < len(spans) and spans[span_index][0] <= token.start() < spans[span_index][1]:
+                continue
+            word = token.group(0)
+            if not word[0].isupper() or word.lower() in self.common_words:
+                continue
+            # Sentence-initial capitals are not a signal on their own
+            if token.start() == 0 or _sentence_end_re.search(text[max(0, token.start() - 3):token.start()]):
+                continue
+            return True
+        return False
+
+def build_gazetteer(min_count=GAZETTEER_MIN_COUNT):
+    """Builds the automaton from entities confirmed at least min_count times in the 'entities' table."""
+    from fetch_news import connect_db
+
+    gazetteer = Gazetteer()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT name, type, COUNT(*) AS cnt FROM entities
+                      GROUP BY name, type HAVING cnt >= %s
+                      ORDER BY cnt DESC''', (min_count,))
+    # Most frequent type wins when a name was tagged with several
+    for name, label, _ in cursor.fetchall():
+        if name:
+            gazetteer.add(name, label)
+
+    cursor.execute("SELECT title, description FROM news ORDER BY id DESC LIMIT 50000")
+    for title, description in cursor.fetchall():
+        for word in _token_re.findall((title or "") + " " + (description or "")):
+            if word.islower():
+                gazetteer.common_words.add(word)
+    cursor.close()
+    conn.close()
+    print(f"Gazetteer built with {len(gazetteer.known)} entities, {len(gazetteer.common_words)} common words.")
+    return gazetteer
+
+_gazetteer = None
+_build_lock = threading.Lock()
+
+def get_gazetteer():
+    """The process-wide gazetteer, built on first use. None if disabled, empty if the build fails."""
+    global _gazetteer
+    if not GAZETTEER_ENABLED:
+        return None
+    with _build_lock:
+        if _gazetteer is None:
+            try:
+                _gazetteer = build_gazetteer()
+            except Exception as e:
+                print(f"Could not build gazetteer, using spaCy only: {e}")
+                _gazetteer = Gazetteer()
+    return _gazetteer
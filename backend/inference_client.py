@@ -0,0 +1,37 @@
+import os
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Thin client for inference_server.py. When INFERENCE_URL is set, sentiment, ner,
+# keyword_extractor and topic_selection send their texts to the shared server
+# instead of loading their own copy of each model.
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", 60))
+
+def server_url():
+    return os.getenv("INFERENCE_URL", "").rstrip("/")
+
+def enabled():
+    return bool(server_url())
+
+def call(endpoint, texts):
+    """
+    Sends a list of texts to an endpoint ('sentiment', 'ner', 'keywords', 'embed').
+    Returns one result per text, or None if the server could not be reached,
+    in which case callers fall back to local inference.
+    """
+    try:
+        response = requests.post(f"{server_url()}/{endpoint}", json={'texts': list(texts)}, timeout=INFERENCE_TIMEOUT)
+        response.raise_for_status()
+        return response.json()['results']
+    except Exception as e:
+        print(f"Inference server error on /{endpoint}, using local model: {e}")
+        return None
+
+def server_stats():
+    try:
+        return requests.get(f"{server_url()}/stats", timeout=5).json()
+    except Exception as e:
+        print(f"Could not reach inference server: {e}")
+        return None
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared local inference service. Hosts each model once per node and merges
+# texts from concurrent requests into one batch per model call.
+# Run it with: python inference_server.py, then set INFERENCE_URL=http://127.0.0.1:8765
+INFERENCE_HOST = os.getenv("INFERENCE_HOST", "127.0.0.1")
+INFERENCE_PORT = int(os.getenv("INFERENCE_PORT", 8765))
+MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", 10))
+
+class _Pending:
+    def __init__(self, text):
+        self.text = text
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class DynamicBatcher:
+    """
+    Collects texts submitted from any thread and runs batch_fn on up to
+    max_batch_size of them at once. A batch is started as soon as it is full
+    or max_wait_ms after its first text arrived, whichever comes first.
+    """
+    def __init__(self, batch_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        pending = [_Pending(text) for text in texts]
+        for p in pending:
+            self.queue.put(p)
+        for p in pending:
+            p.done.wait()
+            if p.error is not None:
+                raise p.error
+        return [p.result for p in pending]
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn([p.text for p in batch])
+                for p, result in zip(batch, results):
+                    p.result = result
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.items += len(batch)
+            for p in batch:
+                p.done.set()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'queued': self.queue.qsize()
+        }
+
+def _embed_batch(texts):
+    from topic_selection import embed_texts
+    return embed_texts(texts).tolist()
+
+def create_batchers():
+    # The batch functions below always run the local model
+    from sentiment import analyze_sentiment_batch
+    from ner import extract_entities_batch
+    from keyword_extractor import extract_keywords_batch
+
+    return {
+        'sentiment': DynamicBatcher(analyze_sentiment_batch),
+        'ner': DynamicBatcher(extract_entities_batch),
+        'keywords': DynamicBatcher(extract_keywords_batch),
+        'embed': DynamicBatcher(_embed_batch)
+    }
+
+batchers = {}
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, {name: b.stats() for name, b in batchers.items()})
+        elif self.path == "/health":
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        batcher = batchers.get(self.path.strip("/"))
+        if batcher is None:
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length) or b"{}").get('texts', [])
+            self._send_json(200, {'results': batcher.submit([t or "" for t in texts])})
+        except Exception as e:
+            print(f"Error on {self.path}: {e}")
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, one line per request is too noisy under load
+        pass
+
+def serve(host=INFERENCE_HOST, port=INFERENCE_PORT, warm_up=True):
+    global batchers
+    batchers = create_batchers()
+    if warm_up:
+        import model_registry
+        model_registry.warm_up(["sentiment", "spacy", "keybert", "sentence_encoder"])
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.daemon_threads = True
+    print(f"Inference server listening on http://{host}:{port} "
+          f"(max batch {MAX_BATCH_SIZE}, max wait {MAX_WAIT_MS}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,146 @@
+from dotenv import load_dotenv
+from fetch_news import connect_db
+
+load_dotenv()
+
+# Keywords stored as integer ids: keyword_dict holds each distinct keyword once,
+# article_keywords keeps the KeyBERT score per article, and keyword_daily_counts is
+# maintained at extraction time so top keywords for any window are an index range sum.
+
+_tables_ready = False
+
+def create_keyword_tables():
+    global _tables_ready
+    if _tables_ready:
+        return
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS keyword_dict (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        keyword VARCHAR(255) NOT NULL,
+        UNIQUE KEY (keyword)
+    );''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS article_keywords (
+        article_id INT NOT NULL,
+        keyword_id INT NOT NULL,
+        score FLOAT,
+        PRIMARY KEY (article_id, keyword_id),
+        INDEX (keyword_id),
+        FOREIGN KEY (article_id) REFERENCES news(id),
+        FOREIGN KEY (keyword_id) REFERENCES keyword_dict(id)
+    );''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS keyword_daily_counts (
+        day DATE NOT NULL,
+        keyword_id INT NOT NULL,
+        n INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, keyword_id),
+        INDEX (keyword_id, day),
+        FOREIGN KEY (keyword_id) REFERENCES keyword_dict(id)
+    );''')
+    conn.commit()
+    conn.close()
+    _tables_ready = True
+
+def normalize_keyword(keyword):
+    return " ".join((keyword or "").lower().split())[:255]
+
+def save_article_keywords(cursor, article_id, keywords):
+    """
+    keywords: [(keyword, score), ...] as returned by KeyBERT (score may be None).
+    Bumps the daily counts only for new article/keyword pairs. Uses the caller's cursor; the caller commits.
+    """
+    create_keyword_tables()
+    seen = set()
+    for keyword, score in keywords:
+        keyword = normalize_keyword(keyword)
+        if not keyword or keyword in seen:
+            continue
+        seen.add(keyword)
+        # LAST_INSERT_ID(id) makes lastrowid return the existing id on duplicates
+        cursor.execute('''INSERT INTO keyword_dict (keyword) VALUES (%s)
+                          ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)''', (keyword,))
+        keyword_id = cursor.lastrowid
+        cursor.execute('''INSERT IGNORE INTO article_keywords (article_id, keyword_id, score)
+                          VALUES (%s, %s, %s)''', (article_id, keyword_id, None if score is None else float(score)))
+        if cursor.rowcount == 1:
+            cursor.execute('''INSERT INTO keyword_daily_counts (day, keyword_id, n)
+                              SELECT COALESCE(DATE(publishedAt), CURDATE()), %s, 1 FROM news WHERE id = %s
+                              ON DUPLICATE KEY UPDATE n = n + 1''', (keyword_id, article_id))
+
+def replace_article_keywords(cursor, article_id, keywords):
+    """Swaps an article's keywords (e.g. TF-IDF -> KeyBERT), moving its daily counts along."""
+    create_keyword_tables()
+    cursor.execute("SELECT keyword_id FROM article_keywords WHERE article_id = %s", (article_id,))
+    old_ids = [row[0] for row in cursor.fetchall()]
+    for keyword_id in old_ids:
+        cursor.execute('''UPDATE keyword_daily_counts
+                          SET n = n - 1
+                          WHERE keyword_id = %s AND n > 0
+                            AND day = (SELECT COALESCE(DATE(publishedAt), CURDATE()) FROM news WHERE id = %s)''',
+                       (keyword_id, article_id))
+    cursor.execute("DELETE FROM article_keywords WHERE article_id = %s", (article_id,))
+    save_article_keywords(cursor, article_id, keywords)
+
+def backfill_from_keywords(batch_size=1000):
+    """One-off migration of the comma-joined 'keywords' rows (scores were not kept, stored as NULL)."""
+    create_keyword_tables()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT k.article_id, k.keywords
+                      FROM keywords k
+                      LEFT JOIN article_keywords ak ON k.article_id = ak.article_id
+                      WHERE ak.article_id IS NULL AND k.keywords IS NOT NULL''')
+    rows = cursor.fetchall()
+    print(f"Backfilling normalized keywords for {len(rows)} articles...")
+    for i, (article_id, keywords_str) in enumerate(rows, 1):
+        save_article_keywords(cursor, article_id, [(kw, None) for kw in keywords_str.split(',')])
+        if i % batch_size == 0:
+            conn.commit()
+    conn.commit()
+    cursor.close()
+    conn.close()
+    print("Keyword backfill complete.")
+
+def get_top_keywords(days=7, limit=10):
+    """{keyword: article count} for the last N calendar days (today included), most frequent first."""
+    create_keyword_tables()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT d.keyword, SUM(c.n) AS count
+                      FROM keyword_daily_counts c
+                      JOIN keyword_dict d ON c.keyword_id = d.id
+                      WHERE c.day > CURDATE() - INTERVAL %s DAY
+                      GROUP BY d.keyword
+                      ORDER BY count DESC
+                      LIMIT %s''', (days, limit))
+    top = {keyword: int(count) for keyword, count in cursor.fetchall()}
+    cursor.close()
+    conn.close()
+    return top
+
+def get_article_keywords(cursor, article_ids):
+    """{article_id: [keyword, ...]} ordered by KeyBERT score. Expects a dictionary cursor."""
+    keywords = {article_id: [] for article_id in article_ids}
+    if not article_ids:
+        return keywords
+    create_keyword_tables()
+    ids_placeholder = ','.join(['%s'] * len(article_ids))
+    cursor.execute(f'''SELECT ak.article_id, d.keyword
+                       FROM article_keywords ak
+                       JOIN keyword_dict d ON ak.keyword_id = d.id
+                       WHERE ak.article_id IN ({ids_placeholder})
+                       ORDER BY ak.article_id, ak.score DESC''', tuple(article_ids))
+    for row in cursor.fetchall():
+        if row['article_id'] in keywords:
+            keywords[row['article_id']].append(row['keyword'])
+    return keywords
+
+def search_keywords(cursor, query, limit=10):
+    """Distinct keywords containing the query string, for search suggestions. Expects a tuple cursor."""
+    create_keyword_tables()
+    cursor.execute('''SELECT keyword FROM keyword_dict WHERE keyword LIKE %s LIMIT %s''',
+                   (f"%{query.lower()}%", limit))
+    return [row[0] for row in cursor.fetchall()]
+
+if __name__ == "__main__":
+    backfill_from_keywords()
@@ -1,12 +1,30 @@
 import os
+import re
 from dotenv import load_dotenv
-import pandas as pd
+import numpy as np
 import mysql.connector
-from keybert import KeyBERT
 from fetch_news import connect_db
+from model_registry import get_model, precision_tag
+import inference_client
+import enrichment_cache
+import keyword_dictionary
+import backlog_stream
+import enrichment_stages
+import retention
+import pipeline_metrics
 
 load_dotenv()
 
+KEYWORDS_TOP_N = 3
+# Bump when the KeyBERT model or its parameters change so cached results are not reused
+KEYWORDS_MODEL_VERSION = "keybert-minilm-1-2gram-top3-v1"
+# Backlogs larger than this use the TF-IDF tier unless an extractor is chosen explicitly
+TFIDF_BACKLOG_THRESHOLD = int(os.getenv("KEYWORD_TFIDF_THRESHOLD", 5000))
+EXTRACTORS = ("keybert", "tfidf")
+_token_re = re.compile(r"(?u)\b\w\w+\b")
+# Sentence and clause breaks (and the title / description line break): no phrase spans them
+_boundary_re = re.compile(r"[.!?,;:()\[\]{}\"“”|\n\r\t—–]+|\s-\s")
+
 def create_keywords_table():
     conn = connect_db()
     cursor = conn.cursor()
@@ -14,43 +32,188 @@ def create_keywords_table():
                     id INT AUTO_INCREMENT PRIMARY KEY,
                     article_id INT UNIQUE,
                     keywords TEXT,
-                    FOREIGN KEY(article_id) REFERENCES news(id)
+                    extractor VARCHAR(20) DEFAULT 'keybert',
+                    FOREIGN KEY(article_id) REFERENCES news(id),
+                    INDEX(extractor)
                 );''')
+    # Tables created before the TF-IDF tier existed
+    cursor.execute("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'keywords' AND COLUMN_NAME = 'extractor'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("ALTER TABLE keywords ADD COLUMN extractor VARCHAR(20) DEFAULT 'keybert', ADD INDEX (extractor)")
+        conn.commit()
+        print("Added extractor column to keywords table")
     conn.close()
     return
 
-def extract_and_store_keywords():
+def extract_keywords_tfidf(docs, top_n=KEYWORDS_TOP_N):
+    """
+    Statistical tier for large backfills: one TF-IDF fit over 1-2-gram candidates of
+    `docs`, then the top_n terms of every row are picked with vectorized sparse ops.
+    The backlog passes one streamed chunk at a time, so IDF comes from a chunk of
+    max(STREAM_CHUNK_SIZE, 2000) documents, not from the whole corpus.
+    Returns a [(keyword, score), ...] list per document, like extract_keywords_batch.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer, ENGLISH_STOP_WORDS
+
+    def candidate_phrases(doc):
+        # Unigrams and bigrams that do not span a stop word or punctuation, so "cools in
+        # the united states" yields "united states" but never "cools united", and
+        # "rates. markets" never "rates markets"
+        for segment in _boundary_re.split(doc.lower()):
+            chunk = []
+            for token in _token_re.findall(segment):
+                if token in ENGLISH_STOP_WORDS or token.isdigit():
+                    chunk = []
+                    continue
+                yield token
+                if chunk:
+                    yield chunk[-1] + " " + token
+                chunk.append(token)
+
+    docs = list(docs)
+    if not docs:
+        return []
+    vectorizer = TfidfVectorizer(analyzer=candidate_phrases, sublinear_tf=True,
+                                 max_df=0.5 if len(docs) > 100 else 1.0)
+    try:
+        X = vectorizer.fit_transform(docs).tocsr()
+    except ValueError:
+        # Every document was empty after stop word removal
+        return [[] for _ in docs]
+    X.sum_duplicates()
+    terms = vectorizer.get_feature_names_out()
+
+    # Sort all non-zeros by (row, -score, -phrase length) at once, then keep the first top_n of each row
+    phrase_lengths = np.array([term.count(" ") + 1 for term in terms])
+    rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+    order = np.lexsort((-phrase_lengths[X.indices], -X.data, rows))
+    rank = np.arange(len(order)) - X.indptr[rows[order]]
+    keep = order[rank < top_n]
+
+    results = [[] for _ in docs]
+    for row, col, score in zip(rows[keep], X.indices[keep], X.data[keep]):
+        results[row].append((terms[col], round(float(score), 4)))
+    return results
+
+def extract_keywords_batch(docs, top_n=KEYWORDS_TOP_N):
+    """Runs KeyBERT on a list of documents, returns a [(keyword, score), ...] list per document."""
+    kw_model = get_model("keybert")
+    keywords = kw_model.extract_keywords(list(docs), keyphrase_ngram_range=(1, 2), stop_words='english', top_n=top_n)
+    # KeyBERT unwraps the result when it is given a single document
+    if len(docs) == 1:
+        keywords = [keywords]
+    return [[(kw, float(score)) for kw, score in doc_keywords] for doc_keywords in keywords]
+
+def _infer_keywords(docs):
+    # Use the shared inference server when one is configured
+    if inference_client.enabled():
+        results = inference_client.call("keywords", docs)
+        if results is not None:
+            return results
+    return extract_keywords_batch(docs)
+
+def extract_keywords(docs):
+    """KeyBERT keywords per document, skipping documents whose text was already seen."""
+    return enrichment_cache.cached_batch("keywords", f"{KEYWORDS_MODEL_VERSION}-{precision_tag()}", docs, _infer_keywords)
+
+def save_keywords(cursor, news_id, keywords, extractor="keybert"):
+    """Stores one article's keywords plus their ids, scores and daily counts. The caller commits."""
+    keywords_str = ', '.join([kw for kw, _ in keywords])
+    cursor.execute("INSERT INTO keywords (keywords, article_id, extractor) VALUES(%s, %s, %s)", (keywords_str, news_id, extractor))
+    keyword_dictionary.save_article_keywords(cursor, news_id, keywords)
+
+def extract_and_store_keywords(extractor=None):
+    """
+    extractor: 'keybert', 'tfidf', or None to pick TF-IDF automatically when the
+    backlog is larger than KEYWORD_TFIDF_THRESHOLD. TF-IDF rows are marked so that
+    upgrade_tfidf_keywords() can re-run them through KeyBERT later.
+    The backlog is streamed in STREAM_CHUNK_SIZE chunks; TF-IDF is fitted per chunk.
+    """
     create_keywords_table()
+    keyword_dictionary.create_keyword_tables()
     conn = connect_db()
     cursor = conn.cursor()
 
-    cursor.execute('''SELECT n.id, n.title, n.description
-                      FROM news n
-                      LEFT JOIN keywords k ON n.id = k.article_id
-                      WHERE k.article_id IS NULL;''')
-    rows = cursor.fetchall()
-    raw_news = pd.DataFrame(rows, columns=['id', 'title', 'description'])
-
-    # Keyword extraction per-document using KeyBERT
-    kw_model = KeyBERT()
-    keywords_dict = {}
-    for i, row in raw_news.iterrows():
-        title = row['title'] or ""
-        description = row['description'] or ""
-        doc = (title + " " + description).strip()
-        if not doc:
-            continue
-        keywords = kw_model.extract_keywords(doc, keyphrase_ngram_range=(1, 2), stop_words='english', top_n=3)
-        keywords_dict[row['id']] = [kw for kw, _ in keywords]
-
-    # Store keywords back to the database
-    for news_id, keywords in keywords_dict.items():
-        keywords_str = ', '.join(keywords)
-        cursor.execute("INSERT INTO keywords (keywords, article_id) VALUES(%s, %s)", (keywords_str, news_id))
+    if extractor is None:
+        cursor.execute("SELECT COUNT(*) " + enrichment_stages.pending_articles('keywords'), ('keywords',))
+        backlog = cursor.fetchone()[0]
+        extractor = "tfidf" if backlog > TFIDF_BACKLOG_THRESHOLD else "keybert"
+    if extractor not in EXTRACTORS:
+        raise ValueError(f"Unknown keyword extractor '{extractor}', expected one of {EXTRACTORS}")
+    print(f"Extracting keywords for new articles with {extractor}...")
+
+    def infer(rows):
+        doc_ids, docs = [], []
+        for row in rows:
+            title = row['title'] or ""
+            description = row['description'] or ""
+            # TF-IDF phrases stop at the line break; KeyBERT keeps its usual input
+            separator = "\n" if extractor == "tfidf" else " "
+            doc = (title + separator + description).strip()
+            if not doc:
+                continue
+            doc_ids.append(row['id'])
+            docs.append(doc)
+        if extractor == "tfidf":
+            return doc_ids, extract_keywords_tfidf(docs)
+        # Keyword extraction using KeyBERT
+        return doc_ids, extract_keywords(docs)
+
+    def write(rows, extracted):
+        # Store keywords back to the database, plus their ids, scores and daily counts
+        doc_ids, results = extracted
+        for news_id, keywords in zip(doc_ids, results):
+            save_keywords(cursor, news_id, keywords, extractor)
+        enrichment_stages.mark_done(cursor, 'keywords', [row['id'] for row in rows])
         conn.commit()
+        return len(doc_ids)
+
+    chunk_size = backlog_stream.STREAM_CHUNK_SIZE
+    if extractor == "tfidf":
+        # IDF statistics need a reasonably large sample of documents
+        chunk_size = max(chunk_size, 2000)
+    try:
+        with pipeline_metrics.track('keywords') as run:
+            stored = backlog_stream.run_pipeline(backlog_stream.iter_backlog('keywords', chunk_size), infer, write,
+                                                 metrics=run)
+        print(f"Stored keywords for {stored} articles.")
+    finally:
+        cursor.close()
+        conn.close()
+
+def upgrade_tfidf_keywords(limit=1000):
+    """Re-extracts up to `limit` TF-IDF rows with KeyBERT, e.g. from an off-peak job."""
+    create_keywords_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT n.id, n.title, n.description
+                      FROM keywords k
+                      JOIN news n ON n.id = k.article_id
+                      WHERE k.extractor = 'tfidf'
+                      ORDER BY n.publishedAt DESC
+                      LIMIT %s''', (limit,))
+    articles = [{'id': news_id, 'title': title, 'description': description}
+                for news_id, title, description in cursor.fetchall()]
+    # Bodies of old articles are in news_archive
+    retention.hydrate_many(cursor, articles)
+    rows = [(a['id'], ((a['title'] or "") + " " + (a['description'] or "")).strip()) for a in articles]
+    rows = [(news_id, doc) for news_id, doc in rows if doc]
+    if not rows:
+        print("No TF-IDF keyword rows to upgrade.")
+        conn.close()
+        return 0
 
+    print(f"Upgrading {len(rows)} TF-IDF keyword rows with KeyBERT...")
+    docs = [doc for _, doc in rows]
+    results = extract_keywords(docs)
+    for (news_id, _), keywords in zip(rows, results):
+        keywords_str = ', '.join([kw for kw, _ in keywords])
+        cursor.execute("UPDATE keywords SET keywords = %s, extractor = 'keybert' WHERE article_id = %s", (keywords_str, news_id))
+        keyword_dictionary.replace_article_keywords(cursor, news_id, keywords)
+        conn.commit()
     cursor.close()
     conn.close()
+    return len(rows)
 
 if __name__ == "__main__":
     extract_and_store_keywords()
\ No newline at end of file
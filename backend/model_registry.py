@@ -0,0 +1,149 @@
+import os
+import time
+import importlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Models are loaded on first use (or by warm_up) instead of at import time,
+# so importing a module never pays for spaCy, transformers or BERTopic.
+_loaders = {}
+_models = {}
+_load_times = {}
+_import_times = {}
+# Re-entrant: a loader may itself call get_model() (KeyBERT reuses the sentence encoder)
+_lock = threading.RLock()
+_process_start = time.perf_counter()
+
+def web_only():
+    """
+    VERITASCOPE_WEB_ONLY=1 runs the Flask app without the ML stack: no models are
+    loaded, enrichment is left to the batch scripts and forecasts are skipped.
+    """
+    return os.getenv("VERITASCOPE_WEB_ONLY", "0").lower() in ("1", "true", "yes")
+
+def register(name, loader):
+    """Registers a zero-argument loader function for a model name."""
+    _loaders[name] = loader
+
+def get_model(name):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    if web_only():
+        raise RuntimeError(f"Model '{name}' is not available in web-only mode.")
+    if name not in _loaders:
+        raise KeyError(f"No loader registered for model '{name}'.")
+    with _lock:
+        if name not in _models:
+            print(f"Loading model '{name}'...")
+            start = time.perf_counter()
+            _models[name] = _loaders[name]()
+            _load_times[name] = time.perf_counter() - start
+            print(f"Model '{name}' loaded in {_load_times[name]:.2f}s.")
+    return _models[name]
+
+def unload(name):
+    """Drops a cached model so the next get_model() reloads it (e.g. after retraining)."""
+    with _lock:
+        _models.pop(name, None)
+
+def is_loaded(name):
+    return name in _models
+
+def warm_up(names=None):
+    """Loads the given models (all registered ones by default) ahead of the first request."""
+    for name in names or list(_loaders):
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            get_model(name)
+        except Exception as e:
+            print(f"Warm-up of model '{name}' failed: {e}")
+
+def timed_import(module_name):
+    """Imports a module and records how long the import took for the startup report."""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_times.setdefault(module_name, time.perf_counter() - start)
+    return module
+
+def load_times():
+    """Seconds each loaded model took to load in this process."""
+    return dict(_load_times)
+
+def startup_report():
+    return {
+        'web_only': web_only(),
+        'imports': {k: round(v, 3) for k, v in _import_times.items()},
+        'models': {k: round(v, 3) for k, v in _load_times.items()},
+        'registered_models': sorted(_loaders),
+        'seconds_since_start': round(time.perf_counter() - _process_start, 3)
+    }
+
+def print_startup_report():
+    report = startup_report()
+    print(f"Startup report (web_only={report['web_only']}):")
+    for module_name, seconds in sorted(report['imports'].items(), key=lambda x: -x[1]):
+        print(f"  import {module_name:<20} {seconds:8.3f}s")
+    for name, seconds in sorted(report['models'].items(), key=lambda x: -x[1]):
+        print(f"  model  {name:<20} {seconds:8.3f}s")
+    print(f"  total since start         {report['seconds_since_start']:8.3f}s")
+
+def quantize_enabled():
+    """INFERENCE_QUANTIZE=1 runs the torch models with dynamic int8 Linear layers (CPU only)."""
+    return os.getenv("INFERENCE_QUANTIZE", "0").lower() in ("1", "true", "yes")
+
+def precision_tag():
+    # Part of the enrichment cache key, int8 and fp32 outputs are cached separately
+    return "int8" if quantize_enabled() else "fp32"
+
+_torch_configured = False
+
+def configure_torch():
+    """Applies TORCH_NUM_THREADS once per process, before the first torch model is loaded."""
+    global _torch_configured
+    if _torch_configured:
+        return
+    import torch
+    num_threads = os.getenv("TORCH_NUM_THREADS")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    _torch_configured = True
+
+def quantize_model(model):
+    """Dynamic int8 quantization of every nn.Linear: weights stored as int8, activations quantized per batch."""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _load_spacy():
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+def load_sentiment_pipeline(quantize=None):
+    configure_torch()
+    from transformers import pipeline
+    sentiment_pipeline = pipeline("sentiment-analysis", device=-1)
+    if quantize_enabled() if quantize is None else quantize:
+        sentiment_pipeline.model = quantize_model(sentiment_pipeline.model)
+    return sentiment_pipeline
+
+def load_sentence_encoder(quantize=None):
+    configure_torch()
+    from sentence_transformers import SentenceTransformer
+    encoder = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+    if quantize_enabled() if quantize is None else quantize:
+        encoder = quantize_model(encoder)
+    return encoder
+
+def _load_keybert():
+    from keybert import KeyBERT
+    # Same MiniLM encoder as topic_selection, so only one copy is held in memory
+    return KeyBERT(model=get_model("sentence_encoder"))
+
+register("spacy", _load_spacy)
+register("sentiment", load_sentiment_pipeline)
+register("keybert", _load_keybert)
+register("sentence_encoder", load_sentence_encoder)
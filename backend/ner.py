@@ -1,19 +1,25 @@
-import spacy
-import mysql.connector as mysql
 import os
 from dotenv import load_dotenv
+import db_instrumentation
+from model_registry import get_model
+import inference_client
+import enrichment_cache
+import entity_dictionary
+import backlog_stream
+import pipeline_metrics
+from gazetteer import get_gazetteer
 
 load_dotenv()
 
-# Load spaCy NER model once
-print("Loading spaCy model...")
-nlp = spacy.load("en_core_web_sm")
-print("spaCy model loaded.")
+ALLOWED_LABELS = {'PERSON', 'ORG', 'GPE', 'LOC'}
+NER_BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", 64))
+# Bump when the spaCy model or ALLOWED_LABELS change so cached results are not reused
+NER_MODEL_VERSION = "en_core_web_sm-gazetteer-v2"
 
 def connect_db():
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -34,11 +40,57 @@ def connect_db():
 
 def extract_entities(text):
     #Extract named entities from text.
-    doc = nlp(text)
-    allowed_labels = {'PERSON', 'ORG', 'GPE', 'LOC'}
-    unique_ents = list(set([(ent.text, ent.label_) for ent in doc.ents if ent.label_ in allowed_labels]))
+    return extract_entities_many([text])[0]
+
+def extract_entities_many(texts):
+    # Identical text is only ever run through the model once (see enrichment_cache.py)
+    return enrichment_cache.cached_batch("ner", NER_MODEL_VERSION, texts, _infer_entities)
+
+def _infer_entities(texts):
+    # Use the shared inference server when one is configured
+    if inference_client.enabled():
+        results = inference_client.call("ner", texts)
+        if results is not None:
+            return results
+    return extract_entities_batch(texts)
+
+def entities_from_doc(doc):
+    unique_ents = list(set([(ent.text, ent.label_) for ent in doc.ents if ent.label_ in ALLOWED_LABELS]))
     return [{'text': text, 'label': label} for text, label in unique_ents]
 
+def extract_entities_batch(texts):
+    """
+    Finds known entities with the gazetteer first; only texts with unmatched
+    capitalized spans are run through the local spaCy model with nlp.pipe.
+    """
+    texts = list(texts)
+    gazetteer = get_gazetteer()
+    results = [None] * len(texts)
+    fallthrough = []
+    for i, text in enumerate(texts):
+        if gazetteer is None:
+            fallthrough.append(i)
+            continue
+        known, needs_model = gazetteer.match(text)
+        results[i] = known
+        if needs_model:
+            fallthrough.append(i)
+
+    if fallthrough:
+        # spaCy model is shared with text_preprocessing and loaded on first use
+        nlp = get_model("spacy")
+        docs = nlp.pipe([texts[i] for i in fallthrough], batch_size=NER_BATCH_SIZE)
+        for i, doc in zip(fallthrough, docs):
+            found = entities_from_doc(doc)
+            if gazetteer is not None:
+                # New entities join the automaton once spaCy has confirmed them often enough
+                for ent in found:
+                    gazetteer.confirm(ent['text'], ent['label'])
+                seen = {(ent['text'], ent['label']) for ent in found}
+                found += [ent for ent in results[i] if (ent['text'], ent['label']) not in seen]
+            results[i] = found
+    return results
+
 def save_entities(article_id, entities_list):
     """
     Store entity results for a news article in the database.
@@ -61,7 +113,11 @@ def save_entities(article_id, entities_list):
 
     try:
         if rows_to_insert:
+            # Saving an article again replaces its rows rather than duplicating them
+            cursor.execute("DELETE FROM entities WHERE article_id = %s", (article_id,))
             cursor.executemany(query, rows_to_insert)
+            # Canonical ids and daily entity counts, in the same transaction
+            entity_dictionary.save_article_entities(cursor, article_id, entities_list)
             conn.commit()
     except Exception as e:
         print(f"Error saving entities for article {article_id}: {e}")
@@ -72,42 +128,15 @@ def analyze_and_save_entities():
     """
     Batch function to find articles without entities, analyze them,
     and save the results to the 'entities' table.
+    The backlog is streamed in STREAM_CHUNK_SIZE chunks, so memory stays flat however large it is.
     """
-    conn = connect_db()
-    cursor = conn.cursor(dictionary=True)
-
-    cursor.execute('''
-        SELECT n.id, n.title, n.description, n.content
-        FROM news n
-        LEFT JOIN entities e ON n.id = e.article_id
-        WHERE e.article_id IS NULL;
-    ''')
-
-    articles_to_process = cursor.fetchall()
-    
-    if not articles_to_process:
+    print("Streaming new articles for NER...")
+    with pipeline_metrics.track('ner') as run:
+        processed = backlog_stream.run_stage('ner', metrics=run)
+    if not processed:
         print("No new articles for NER.")
-        conn.close()
         return
-
-    print(f"Found {len(articles_to_process)} new articles for NER...")
-
-    for article in articles_to_process:
-        article_id = article['id']
-        title = article['title'] or ""
-        description = article['description'] or ""
-        text = title + " " + description
-
-        if not text.strip():
-            continue
-            
-        print(f"Extracting entities for article {article_id}...")
-        
-        entities_list = extract_entities(text)
-        save_entities(article_id, entities_list)
-        
-    conn.close()
-    print("NER batch processing complete.")
+    print(f"NER batch processing complete. {processed} articles processed.")
 
 if __name__ == "__main__":
     analyze_and_save_entities()
@@ -0,0 +1,208 @@
+import os
+import time
+import json
+import argparse
+import itertools
+import multiprocessing
+from collections import deque
+from dotenv import load_dotenv
+from fetch_news import connect_db
+import enrichment_stages
+import backlog_stream
+
+load_dotenv()
+
+# Runs one enrichment stage across a pool of worker processes on this host. Each
+# worker is pinned to its own share of the cores, gets the same share of torch
+# threads and loads its models once in the pool initializer; results stream back
+# to the parent, which is the only process writing to MySQL (one bulk insert per chunk).
+#
+# python parallel_runner.py sentiment --workers 4
+# python parallel_runner.py ner --scaling 8 --sample 2000
+PARALLEL_WORKERS = int(os.getenv("PARALLEL_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+PARALLEL_CHUNK_SIZE = int(os.getenv("PARALLEL_CHUNK_SIZE", 64))
+
+_stage = None
+
+def available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_cores(workers):
+    """Splits this process's cores into `workers` disjoint sets. Returns (core sets, torch threads per worker)."""
+    cores = available_cores()
+    workers = max(1, min(workers, len(cores)))
+    per_worker = len(cores) // workers
+    return [cores[i * per_worker:(i + 1) * per_worker] for i in range(workers)], per_worker
+
+def _init_worker(stage, core_queue, threads, ready_queue):
+    global _stage
+    _stage = stage
+    try:
+        cores = core_queue.get(timeout=5)
+    except Exception:
+        # A replacement for a crashed worker: its core set was already handed out
+        cores = None
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # Read by model_registry.configure_torch and the BLAS libraries before the first model loads
+    for var in ("TORCH_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from model_registry import get_model, configure_torch
+    if stage == 'topics':
+        import topic_selection  # registers the "bertopic" loader
+    configure_torch()
+    for name in enrichment_stages.STAGE_MODELS[stage]:
+        get_model(name)
+    ready_queue.put(os.getpid())
+
+def _compute_chunk(articles):
+    kept, results = enrichment_stages.compute(_stage, articles)
+    return [article['id'] for article in kept], results, [article['id'] for article in articles]
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def start_pool(stage, workers):
+    """Starts the pool and waits until every worker has loaded its models. Returns (pool, seconds spent loading)."""
+    # spawn rather than fork: torch and the enrichment cache's sqlite handles do not survive a fork
+    ctx = multiprocessing.get_context("spawn")
+    core_sets, threads = plan_cores(workers)
+    core_queue, ready_queue = ctx.Queue(), ctx.Queue()
+    for cores in core_sets:
+        core_queue.put(cores)
+
+    start = time.perf_counter()
+    pool = ctx.Pool(len(core_sets), initializer=_init_worker, initargs=(stage, core_queue, threads, ready_queue))
+    for _ in core_sets:
+        ready_queue.get(timeout=600)
+    load_seconds = time.perf_counter() - start
+    print(f"{len(core_sets)} {stage} workers ready in {load_seconds:.1f}s ({threads} cores/torch threads each).")
+    return pool, load_seconds
+
+def _limited(chunks, limit):
+    for chunk in chunks:
+        if limit is not None:
+            if limit <= 0:
+                break
+            chunk = chunk[:limit]
+            limit -= len(chunk)
+        yield chunk
+
+def run_parallel(stage, workers=PARALLEL_WORKERS, chunk_size=PARALLEL_CHUNK_SIZE, limit=None):
+    """Enriches the whole backlog for a stage. Returns the number of articles written."""
+    enrichment_stages.check_stage(stage)
+    enrichment_stages.prepare(stage)
+    # The backlog is streamed: only the chunks in flight are held in this process
+    chunks = _limited(backlog_stream.iter_backlog(stage, chunk_size), limit)
+    first = next(chunks, None)
+    if not first:
+        print(f"No new articles for {stage}.")
+        return 0
+
+    pool, _ = start_pool(stage, workers)
+    # A couple of chunks queued per worker keeps them busy
+    in_flight = 2 * len(plan_cores(workers)[0])
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    written = 0
+    start = time.perf_counter()
+
+    def write(computed):
+        article_ids, results, processed_ids = computed
+        enrichment_stages.write(cursor, stage, article_ids, results)
+        enrichment_stages.mark_done(cursor, stage, processed_ids)
+        conn.commit()
+        return len(article_ids)
+
+    try:
+        # Chunks are written in submission order; this process is the single writer
+        pending = deque()
+        for chunk in itertools.chain([first], chunks):
+            pending.append(pool.apply_async(_compute_chunk, (chunk,)))
+            if len(pending) >= in_flight:
+                written += write(pending.popleft().get())
+        while pending:
+            written += write(pending.popleft().get())
+    finally:
+        pool.close()
+        pool.join()
+        cursor.close()
+        conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"{stage}: {written} articles in {elapsed:.1f}s ({written / elapsed:.1f} docs/s).")
+    return written
+
+def _throughput(stage, workers, articles, chunk_size):
+    pool, load_seconds = start_pool(stage, workers)
+    try:
+        start = time.perf_counter()
+        processed = sum(len(ids) for _, _, ids in pool.imap_unordered(_compute_chunk, _chunks(articles, chunk_size)))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+        pool.join()
+    return processed / elapsed, load_seconds
+
+def scaling_report(stage, max_workers=None, sample_size=1000, chunk_size=PARALLEL_CHUNK_SIZE):
+    """
+    Compute-only throughput (nothing is written) on the same sample of backlog articles
+    for 1, 2, 4 ... max_workers workers. Efficiency is speedup / workers.
+    The workers run with the enrichment cache off, or later runs would be served from it.
+    """
+    enrichment_stages.check_stage(stage)
+    max_workers = min(max_workers or len(available_cores()), len(available_cores()))
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    articles = enrichment_stages.fetch_articles(cursor, stage, limit=sample_size)
+    conn.close()
+    if not articles:
+        print(f"No backlog articles to benchmark {stage} on.")
+        return []
+
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+
+    report, base = [], None
+    # Spawned workers read ENRICHMENT_CACHE from the environment when they import enrichment_cache
+    previous = os.environ.get("ENRICHMENT_CACHE")
+    os.environ["ENRICHMENT_CACHE"] = "0"
+    try:
+        for workers in counts:
+            docs_per_sec, load_seconds = _throughput(stage, workers, articles, chunk_size)
+            base = base or docs_per_sec
+            speedup = docs_per_sec / base
+            report.append({
+                'workers': workers,
+                'docs_per_sec': round(docs_per_sec, 1),
+                'speedup': round(speedup, 2),
+                'efficiency': round(speedup / workers, 2),
+                'model_load_seconds': round(load_seconds, 1)
+            })
+            print(json.dumps(report[-1]))
+    finally:
+        if previous is None:
+            os.environ.pop("ENRICHMENT_CACHE", None)
+        else:
+            os.environ["ENRICHMENT_CACHE"] = previous
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process-pool runner for one enrichment stage")
+    parser.add_argument("stage", choices=sorted(enrichment_stages.RESULT_TABLES))
+    parser.add_argument("--workers", type=int, default=PARALLEL_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=PARALLEL_CHUNK_SIZE)
+    parser.add_argument("--scaling", type=int, metavar="MAX_WORKERS", help="report scaling efficiency instead of writing results")
+    parser.add_argument("--sample", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.scaling:
+        scaling_report(args.stage, args.scaling, args.sample, args.chunk_size)
+    else:
+        run_parallel(args.stage, args.workers, args.chunk_size)
@@ -0,0 +1,216 @@
+import os
+import shutil
+import argparse
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import mysql.connector
+from dotenv import load_dotenv
+import db_instrumentation
+import partitioning
+
+load_dotenv()
+
+# Columnar archive of enriched articles for the historical analytics scans.
+# One Parquet file per publication day, in hive-style partitions:
+#   PARQUET_DIR/date=2024-05-01/articles.parquet
+# Each row is one article: id, publishedAt, source, its topic ids, its (latest)
+# sentiment scores and its keyword / entity dictionary ids. No title, description
+# or content, so a year of articles is a few MB. Readers filter on the date
+# partition (only the matching directories are opened) and read only the columns
+# they need; see analytics_utils with ANALYTICS_SOURCE=parquet.
+#
+# Days older than the oldest article left in 'news' (e.g. months dropped by
+# partitioning.py) exist only here, so their partitions are never removed.
+#
+# Enrichment lags the fetch, so the export is re-run for the last few days:
+#   python parquet_archive.py             # the last PARQUET_REFRESH_DAYS days
+#   python parquet_archive.py --all       # everything in 'news'
+#   python parquet_archive.py --start 2024-01-01 --end 2024-12-31
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PARQUET_DIR = os.getenv("PARQUET_DIR") or os.path.join(BASE_DIR, "archive")
+PARQUET_REFRESH_DAYS = int(os.getenv("PARQUET_REFRESH_DAYS", 3))
+# Days read from the database per round of queries
+EXPORT_WINDOW_DAYS = 31
+
+def connect_db():
+    return db_instrumentation.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=db_instrumentation.mysql_port(),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DB")
+    )
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('published_at', pa.timestamp('s')),
+        ('source', pa.string()),
+        ('topic_ids', pa.list_(pa.int32())),
+        ('sentiment', pa.string()),
+        ('positive', pa.float32()),
+        ('neutral', pa.float32()),
+        ('negative', pa.float32()),
+        ('keyword_ids', pa.list_(pa.int32())),
+        ('entity_ids', pa.list_(pa.int32())),
+    ])
+
+def partition_path(day):
+    return os.path.join(PARQUET_DIR, f"date={day.isoformat()}")
+
+def _pairs(cursor, query, start, end):
+    """(article_id, value) rows of an enrichment table for articles published in [start, end)."""
+    try:
+        cursor.execute(query, (start, end))
+        return cursor.fetchall()
+    except mysql.connector.Error as e:
+        # e.g. the stage has never run, so its table does not exist yet
+        print(f"Skipping an enrichment table: {e}")
+        return []
+
+def _read_window(cursor, start, end):
+    """{day: [row dict, ...]} for the articles published in [start, end)."""
+    cursor.execute('''SELECT id, publishedAt, source FROM news
+                      WHERE publishedAt >= %s AND publishedAt < %s
+                      ORDER BY publishedAt, id''', (start, end))
+    articles = {}
+    for article_id, published, source in cursor.fetchall():
+        articles[article_id] = {
+            'id': article_id, 'published_at': published, 'source': source,
+            'topic_ids': [], 'sentiment': None, 'positive': None, 'neutral': None, 'negative': None,
+            'keyword_ids': [], 'entity_ids': [],
+        }
+
+    # Ordered by id, so an article with several sentiment rows keeps the latest
+    for article_id, overall, pos, neu, neg in _pairs(cursor, '''
+            SELECT s.article_id, s.overall, s.positive, s.neutral, s.negative
+            FROM sentiments s JOIN news n ON n.id = s.article_id
+            WHERE n.publishedAt >= %s AND n.publishedAt < %s
+            ORDER BY s.id''', start, end):
+        if article_id in articles:
+            articles[article_id].update(sentiment=overall.lower() if overall else None,
+                                        positive=pos, neutral=neu, negative=neg)
+    for column, query in (
+            ('topic_ids', '''SELECT atm.article_id, atm.topic_id
+                             FROM article_topics_mapping atm JOIN news n ON n.id = atm.article_id
+                             WHERE n.publishedAt >= %s AND n.publishedAt < %s'''),
+            ('keyword_ids', '''SELECT ak.article_id, ak.keyword_id
+                               FROM article_keywords ak JOIN news n ON n.id = ak.article_id
+                               WHERE n.publishedAt >= %s AND n.publishedAt < %s'''),
+            ('entity_ids', '''SELECT ae.article_id, ae.entity_id
+                              FROM article_entities ae JOIN news n ON n.id = ae.article_id
+                              WHERE n.publishedAt >= %s AND n.publishedAt < %s''')):
+        for article_id, value in _pairs(cursor, query, start, end):
+            if article_id in articles:
+                articles[article_id][column].append(value)
+
+    by_day = defaultdict(list)
+    for row in articles.values():
+        by_day[row['published_at'].date()].append(row)
+    return by_day
+
+def _write_partition(day, rows, oldest_live):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    directory = partition_path(day)
+    if not rows:
+        # A day inside the live range whose articles were deleted loses its partition;
+        # before it, the archive is the only copy left
+        if oldest_live is not None and day >= oldest_live:
+            shutil.rmtree(directory, ignore_errors=True)
+        return
+    os.makedirs(directory, exist_ok=True)
+    for row in rows:
+        for column in ('topic_ids', 'keyword_ids', 'entity_ids'):
+            row[column].sort()
+    table = pa.Table.from_pylist(rows, schema=_schema())
+    # Written aside and renamed, so readers never see half a file (dot files are not read)
+    tmp = os.path.join(directory, ".articles.parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, os.path.join(directory, "articles.parquet"))
+
+def oldest_live_day(cursor):
+    """Publication day of the oldest dated article in 'news', or None when there is none."""
+    cursor.execute("SELECT MIN(publishedAt) FROM news WHERE publishedAt > %s", (partitioning.UNDATED,))
+    first = cursor.fetchone()[0]
+    return first.date() if first else None
+
+def export(start, end):
+    """Rewrites the partitions of every day in [start, end]. Returns the number of articles written."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    total = 0
+    try:
+        oldest_live = oldest_live_day(cursor)
+        window_start = start
+        while window_start <= end:
+            window_end = min(window_start + timedelta(days=EXPORT_WINDOW_DAYS - 1), end)
+            by_day = _read_window(cursor, datetime.combine(window_start, datetime.min.time()),
+                                  datetime.combine(window_end + timedelta(days=1), datetime.min.time()))
+            day = window_start
+            while day <= window_end:
+                _write_partition(day, by_day.get(day, []), oldest_live)
+                total += len(by_day.get(day, []))
+                day += timedelta(days=1)
+            print(f"Exported {window_start} .. {window_end}: {sum(len(r) for r in by_day.values())} articles")
+            window_start = window_end + timedelta(days=1)
+    finally:
+        cursor.close()
+        conn.close()
+    return total
+
+def export_all():
+    conn = connect_db()
+    cursor = conn.cursor()
+    # Undated articles of a partitioned news table are not exported
+    cursor.execute("SELECT MIN(publishedAt), MAX(publishedAt) FROM news WHERE publishedAt > %s",
+                   (partitioning.UNDATED,))
+    first, last = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if first is None:
+        print("No articles to export.")
+        return 0
+    return export(first.date(), last.date())
+
+def read(columns, days=None, start=None, end=None):
+    """
+    Archived articles as a pandas DataFrame with the given columns plus 'date'
+    (a datetime.date), published in the last `days` days (as CURDATE() - INTERVAL days DAY)
+    or in [start, end]. Only the partitions in range are opened.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    if days is not None:
+        start = date.today() - timedelta(days=days)
+    if not os.path.isdir(PARQUET_DIR):
+        return pd.DataFrame(columns=list(columns) + ['date'])
+    partitioning = ds.partitioning(pa.schema([('date', pa.date32())]), flavor="hive")
+    # An explicit schema, so a directory without any partition yet reads as an empty table
+    schema = _schema().append(pa.field('date', pa.date32()))
+    dataset = ds.dataset(PARQUET_DIR, format="parquet", partitioning=partitioning, schema=schema)
+    condition = None
+    if start is not None:
+        condition = ds.field('date') >= pa.scalar(start, type=pa.date32())
+    if end is not None:
+        upper = ds.field('date') <= pa.scalar(end, type=pa.date32())
+        condition = upper if condition is None else condition & upper
+    return dataset.to_table(columns=list(columns) + ['date'], filter=condition).to_pandas()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports enriched articles to date-partitioned Parquet files.")
+    parser.add_argument("--all", action="store_true", help="export every day in 'news'")
+    parser.add_argument("--days", type=int, default=PARQUET_REFRESH_DAYS, help="re-export the last N days (default: %(default)s)")
+    parser.add_argument("--start", help="YYYY-MM-DD, first day to export")
+    parser.add_argument("--end", help="YYYY-MM-DD, last day to export (default: today)")
+    args = parser.parse_args()
+    if args.all:
+        exported = export_all()
+    elif args.start:
+        exported = export(datetime.strptime(args.start, "%Y-%m-%d").date(),
+                          datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else date.today())
+    else:
+        exported = export(date.today() - timedelta(days=args.days - 1), date.today())
+    print(f"{exported} articles in {PARQUET_DIR}")
@@ -0,0 +1,224 @@
+import os
+import re
+import argparse
+from datetime import date, timedelta
+import mysql.connector
+from dotenv import load_dotenv
+import db_instrumentation
+import storage
+
+load_dotenv()
+
+# Monthly RANGE partitioning of 'news' on publishedAt (MySQL only). Queries that
+# bound publishedAt by a constant (see analytics_utils, TrendDetector.get_recent_news)
+# then only read the partitions in range, and old months can be dropped as a whole.
+#
+#   python partitioning.py convert     # one-time: partitions the existing table
+#   python partitioning.py maintain    # daily, e.g. from cron: months ahead, retention
+#   python partitioning.py status
+#
+# MySQL requires every unique key of a partitioned table to contain the partition
+# column and allows no foreign keys to or from it, so conversion makes the primary
+# key (id, publishedAt) and drops the foreign keys that reference news(id). Articles
+# without a publish date are stored as UNDATED (a trigger fills it in) and live in
+# p_start, which is never dropped. Lookups by id alone probe every partition.
+#
+# The enrichment tables have no publish date of their own; they stay unpartitioned,
+# are joined to the pruned news rows by article_id, and their rows are deleted with
+# the news partition they belong to.
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+# Months of news kept by 'maintain'; 0 keeps everything
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", 0))
+# Write a month to the Parquet archive (parquet_archive.py) before dropping it
+PARTITION_ARCHIVE = os.getenv("PARTITION_ARCHIVE", "1").lower() not in ("0", "false", "no")
+
+UNDATED = "1970-01-01 00:00:00"
+# Tables whose rows belong to a news article
+DEPENDENT_TABLES = ('sentiments', 'entities', 'keywords', 'article_topics_mapping',
+                    'article_keywords', 'article_entities', 'enrichment_jobs', 'enrichment_done', 'news_archive')
+
+_month_re = re.compile(r"^p(\d{4})(\d{2})$")
+
+def connect_db():
+    return db_instrumentation.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=db_instrumentation.mysql_port(),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DB")
+    )
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+def _month_partition(month):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+
+def partitions(cursor):
+    """[(name, rows), ...] of news in order; empty while it is not partitioned."""
+    cursor.execute('''SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+                      WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'news' AND PARTITION_NAME IS NOT NULL
+                      ORDER BY PARTITION_ORDINAL_POSITION''')
+    return cursor.fetchall()
+
+def partition_months(cursor):
+    months = []
+    for name, _ in partitions(cursor):
+        match = _month_re.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return months
+
+def _ensure_dependent_tables():
+    # Their CREATE TABLE statements reference news(id), which fails once news is
+    # partitioned; created first, the IF NOT EXISTS makes them no-ops afterwards
+    import enrichment_stages
+    import work_queue
+    import retention
+    for stage in enrichment_stages.RESULT_TABLES:
+        enrichment_stages.prepare(stage)
+    work_queue.create_jobs_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    retention.create_archive_table(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def convert(months_ahead=PARTITION_MONTHS_AHEAD):
+    """Partitions the existing news table by month. Rebuilds the table, so run it off-peak."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        if partitions(cursor):
+            print("news is already partitioned.")
+            return False
+        cursor.execute('''SELECT INDEX_NAME, INDEX_TYPE, NON_UNIQUE FROM information_schema.STATISTICS
+                          WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'news' AND INDEX_NAME != 'PRIMARY'
+                          GROUP BY INDEX_NAME, INDEX_TYPE, NON_UNIQUE''')
+        blocking = [name for name, kind, non_unique in cursor.fetchall() if kind == 'FULLTEXT' or not int(non_unique)]
+        if blocking:
+            print(f"Cannot partition news: drop its FULLTEXT / UNIQUE indexes first ({', '.join(blocking)}).")
+            return False
+
+        _ensure_dependent_tables()
+        cursor.execute('''SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+                          WHERE CONSTRAINT_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME = 'news' ''')
+        for table, constraint in cursor.fetchall():
+            print(f"Dropping foreign key {table}.{constraint}")
+            cursor.execute(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{constraint}`")
+
+        cursor.execute("UPDATE news SET publishedAt = %s WHERE publishedAt IS NULL", (UNDATED,))
+        conn.commit()
+        cursor.execute(f'''ALTER TABLE news
+                           MODIFY publishedAt DATETIME NOT NULL DEFAULT '{UNDATED}',
+                           DROP PRIMARY KEY, ADD PRIMARY KEY (id, publishedAt)''')
+        # The ingest paths insert NULL for unparseable dates, as they did before
+        cursor.execute("DROP TRIGGER IF EXISTS news_undated")
+        cursor.execute(f'''CREATE TRIGGER news_undated BEFORE INSERT ON news FOR EACH ROW
+                           SET NEW.publishedAt = COALESCE(NEW.publishedAt, '{UNDATED}')''')
+
+        cursor.execute("SELECT MIN(publishedAt) FROM news WHERE publishedAt > %s", (UNDATED,))
+        first = cursor.fetchone()[0]
+        current = date.today().replace(day=1)
+        month = first.date().replace(day=1) if first else current
+        months = []
+        while month <= add_months(current, months_ahead):
+            months.append(month)
+            month = add_months(month, 1)
+        clauses = [f"PARTITION p_start VALUES LESS THAN ('{months[0].isoformat()}')"]
+        clauses += [_month_partition(m) for m in months]
+        clauses.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+        print(f"Partitioning news into {len(months)} months ({months[0]} .. {months[-1]})...")
+        cursor.execute("ALTER TABLE news PARTITION BY RANGE COLUMNS(publishedAt) (" + ", ".join(clauses) + ")")
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+        conn.close()
+
+def _drop_month(cursor, conn, month, archive):
+    name = partition_name(month)
+    if archive:
+        import parquet_archive
+        parquet_archive.export(month, add_months(month, 1) - timedelta(days=1))
+    for table in DEPENDENT_TABLES:
+        try:
+            cursor.execute(f'''DELETE r FROM {table} r
+                               JOIN news PARTITION ({name}) n ON n.id = r.article_id''')
+            conn.commit()
+        except mysql.connector.Error as e:
+            # e.g. a stage that has never run
+            print(f"Skipping {table}: {e}")
+    cursor.execute(f"ALTER TABLE news DROP PARTITION {name}")
+    print(f"Dropped {name}{' (archived to Parquet)' if archive else ''}")
+
+def maintain(months_ahead=PARTITION_MONTHS_AHEAD, retention_months=PARTITION_RETENTION_MONTHS,
+             archive=PARTITION_ARCHIVE):
+    """Adds the months up to months_ahead from now and drops the ones past retention."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        months = partition_months(cursor)
+        if not months:
+            print("news is not partitioned, run 'python partitioning.py convert' first.")
+            return
+        current = date.today().replace(day=1)
+        # Rows of months without a partition (e.g. maintenance did not run) sit in
+        # p_future; reorganizing moves them into their month
+        new_months = []
+        month = add_months(months[-1], 1)
+        while month <= add_months(current, months_ahead):
+            new_months.append(month)
+            month = add_months(month, 1)
+        if new_months:
+            clauses = [_month_partition(m) for m in new_months]
+            clauses.append("PARTITION p_future VALUES LESS THAN (MAXVALUE)")
+            cursor.execute("ALTER TABLE news REORGANIZE PARTITION p_future INTO (" + ", ".join(clauses) + ")")
+            print(f"Added partitions {', '.join(partition_name(m) for m in new_months)}")
+
+        if retention_months > 0:
+            cutoff = add_months(current, -retention_months)
+            for month in months:
+                if month < cutoff:
+                    _drop_month(cursor, conn, month, archive)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def status():
+    conn = connect_db()
+    cursor = conn.cursor()
+    rows = partitions(cursor)
+    cursor.close()
+    conn.close()
+    if not rows:
+        print("news is not partitioned.")
+    for name, count in rows:
+        print(f"  {name:<10} ~{count} rows")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly RANGE partitioning of the news table (MySQL).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert_parser = commands.add_parser("convert", help="partition the existing news table")
+    convert_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    maintain_parser = commands.add_parser("maintain", help="create months ahead, drop months past retention")
+    maintain_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    maintain_parser.add_argument("--retention-months", type=int, default=PARTITION_RETENTION_MONTHS)
+    maintain_parser.add_argument("--no-archive", action="store_true", help="drop old months without a Parquet copy")
+    commands.add_parser("status", help="list the partitions of news")
+    args = parser.parse_args()
+
+    if storage.is_sqlite():
+        print("SQLite backend: news is not partitioned, nothing to do.")
+    elif args.command == "convert":
+        convert(args.months_ahead)
+    elif args.command == "maintain":
+        maintain(args.months_ahead, args.retention_months, PARTITION_ARCHIVE and not args.no_archive)
+    else:
+        status()
@@ -0,0 +1,216 @@
+import os
+import time
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from dotenv import load_dotenv
+import db_instrumentation
+import model_registry
+
+load_dotenv()
+
+# Structured metrics for the batch stages (fetch, keywords, topics, sentiment, ner).
+# Each run of a stage writes one row to pipeline_runs: items in/out, docs/s, batch
+# latency, time spent loading models, the stage's backlog before and after the run,
+# and errors. The admin dashboard compares the latest runs to find the slowest stage
+# and whether a backlog is growing. Runs that found nothing to do (every /dashboard
+# load runs the stages) are not recorded, and rows older than PIPELINE_RUNS_KEEP_DAYS
+# are pruned as new ones are written.
+STAGES = ('fetch', 'keywords', 'topics', 'sentiment', 'ner')
+PIPELINE_RUNS_KEEP_DAYS = int(os.getenv("PIPELINE_RUNS_KEEP_DAYS", 30))
+
+_table_ready = False
+
+def create_pipeline_runs_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS pipeline_runs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        stage VARCHAR(32) NOT NULL,
+        status ENUM('ok', 'failed') NOT NULL,
+        started_at DATETIME NOT NULL,
+        finished_at DATETIME NOT NULL,
+        items_in INT NOT NULL DEFAULT 0,
+        items_out INT NOT NULL DEFAULT 0,
+        batches INT NOT NULL DEFAULT 0,
+        docs_per_sec FLOAT,
+        avg_batch_ms FLOAT,
+        max_batch_ms FLOAT,
+        process_seconds FLOAT,
+        write_seconds FLOAT,
+        model_load_seconds FLOAT,
+        backlog_before INT,
+        backlog_after INT,
+        errors INT NOT NULL DEFAULT 0,
+        last_error TEXT,
+        INDEX idx_stage_started (stage, started_at));''')
+
+def backlog_depth(cursor, stage):
+    """Articles an enrichment stage has not processed; None for stages without a backlog."""
+    import enrichment_stages
+    if stage not in enrichment_stages.RESULT_TABLES:
+        return None
+    try:
+        cursor.execute("SELECT COUNT(*) " + enrichment_stages.pending_articles(stage), (stage,))
+        return cursor.fetchone()[0]
+    except Exception as e:
+        # e.g. the result table has not been created yet
+        print(f"Could not measure the {stage} backlog: {e}")
+        return None
+
+class StageRun:
+    """Counters for one run of a stage; batch() may be called from the pipeline's writer thread."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.items_in = 0
+        self.items_out = 0
+        self.batches = 0
+        self.process_seconds = 0.0
+        self.write_seconds = 0.0
+        self.max_batch_seconds = 0.0
+        self.errors = 0
+        self.last_error = None
+        # Set by stages that already counted their backlog, saving the count query
+        self.backlog_before = None
+        self._lock = threading.Lock()
+
+    def batch(self, items_in, items_out, process_seconds, write_seconds=0.0):
+        """One batch: items read, items stored, and the time spent computing and writing it."""
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.batches += 1
+            self.process_seconds += process_seconds
+            self.write_seconds += write_seconds
+            self.max_batch_seconds = max(self.max_batch_seconds, process_seconds + write_seconds)
+
+    def error(self, e):
+        with self._lock:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+
+def _model_load_total():
+    return sum(model_registry.load_times().values())
+
+def _save_run(run, started_at, elapsed, model_load_seconds, backlog_before, backlog_after):
+    global _table_ready
+    batch_seconds = run.process_seconds + run.write_seconds
+    row = (
+        run.stage,
+        'failed' if run.errors else 'ok',
+        started_at,
+        datetime.now(),
+        run.items_in,
+        run.items_out,
+        run.batches,
+        round(run.items_out / elapsed, 2) if elapsed > 0 else None,
+        round(batch_seconds / run.batches * 1000, 1) if run.batches else None,
+        round(run.max_batch_seconds * 1000, 1) if run.batches else None,
+        round(run.process_seconds, 3),
+        round(run.write_seconds, 3),
+        round(model_load_seconds, 3),
+        backlog_before,
+        backlog_after,
+        run.errors,
+        run.last_error,
+    )
+    conn = db_instrumentation.connect()
+    cursor = conn.cursor()
+    try:
+        if not _table_ready:
+            create_pipeline_runs_table(cursor)
+            _table_ready = True
+        cursor.execute('''INSERT INTO pipeline_runs
+            (stage, status, started_at, finished_at, items_in, items_out, batches, docs_per_sec, avg_batch_ms,
+             max_batch_ms, process_seconds, write_seconds, model_load_seconds, backlog_before, backlog_after,
+             errors, last_error)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''', row)
+        if PIPELINE_RUNS_KEEP_DAYS > 0:
+            cursor.execute("DELETE FROM pipeline_runs WHERE started_at < NOW() - INTERVAL %s DAY",
+                           (PIPELINE_RUNS_KEEP_DAYS,))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _record(run, started_at, elapsed, model_load_seconds):
+    # One count, after the run; the backlog before it is that plus what was stored
+    backlog_before = run.backlog_before
+    if backlog_before is not None:
+        backlog_after = max(backlog_before - run.items_out, 0)
+    else:
+        conn = db_instrumentation.connect()
+        cursor = conn.cursor()
+        backlog_after = backlog_depth(cursor, run.stage)
+        cursor.close()
+        conn.close()
+        if backlog_after is not None:
+            backlog_before = backlog_after + run.items_out
+    _save_run(run, started_at, elapsed, model_load_seconds, backlog_before, backlog_after)
+    print(f"[{run.stage}] {run.items_in} in, {run.items_out} out in {elapsed:.1f}s, "
+          f"{run.errors} errors, backlog {backlog_before} -> {backlog_after}")
+
+@contextmanager
+def track(stage):
+    """
+    with track('sentiment') as run: ... run.batch(...) ...
+    Records the run in pipeline_runs when the block exits, unless it read nothing and
+    failed nothing; an exception is counted as an error and re-raised. Recording
+    problems never fail the stage itself.
+    """
+    run = StageRun(stage)
+    started_at = datetime.now()
+    start = time.perf_counter()
+    loaded_before = _model_load_total()
+    try:
+        yield run
+    except Exception as e:
+        run.error(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        model_load_seconds = _model_load_total() - loaded_before
+        if run.items_in or run.errors:
+            try:
+                _record(run, started_at, elapsed, model_load_seconds)
+            except Exception as e:
+                print(f"Error recording the {stage} run: {e}")
+
+def stage_summary(cursor, window=10):
+    """
+    The latest run of every stage, with the average docs/s over its last `window`
+    runs and the change in backlog across them. Expects a dictionary cursor.
+    """
+    create_pipeline_runs_table(cursor)
+    summary = []
+    for stage in STAGES:
+        cursor.execute('''SELECT * FROM pipeline_runs
+                          WHERE stage = %s
+                          ORDER BY started_at DESC
+                          LIMIT %s''', (stage, window))
+        runs = cursor.fetchall()
+        if not runs:
+            continue
+        latest = dict(runs[0])
+        rates = [r['docs_per_sec'] for r in runs if r['docs_per_sec'] is not None]
+        latest['avg_docs_per_sec'] = round(sum(rates) / len(rates), 2) if rates else None
+        backlogs = [r['backlog_after'] for r in runs if r['backlog_after'] is not None]
+        # Newest minus oldest in the window: positive means the stage is falling behind
+        latest['backlog_trend'] = backlogs[0] - backlogs[-1] if len(backlogs) > 1 else None
+        latest['failed_runs'] = sum(1 for r in runs if r['status'] == 'failed')
+        summary.append(latest)
+
+    # The enrichment stage with the lowest throughput is the one to look at first
+    enrichment = [s for s in summary if s['stage'] != 'fetch' and s['avg_docs_per_sec']]
+    bottleneck = min(enrichment, key=lambda s: s['avg_docs_per_sec'])['stage'] if enrichment else None
+    for s in summary:
+        s['bottleneck'] = s['stage'] == bottleneck
+    return summary
+
+def recent_runs(cursor, stage=None, limit=50):
+    """Most recent runs first, optionally for one stage. Expects a dictionary cursor."""
+    create_pipeline_runs_table(cursor)
+    if stage:
+        cursor.execute("SELECT * FROM pipeline_runs WHERE stage = %s ORDER BY started_at DESC LIMIT %s", (stage, limit))
+    else:
+        cursor.execute("SELECT * FROM pipeline_runs ORDER BY started_at DESC LIMIT %s", (limit,))
+    return cursor.fetchall()
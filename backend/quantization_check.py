@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import numpy as np
+from dotenv import load_dotenv
+from model_registry import load_sentiment_pipeline, load_sentence_encoder
+
+load_dotenv()
+
+# Compares the int8 (INFERENCE_QUANTIZE=1) models against fp32 on a fixed corpus.
+# Run this from your terminal before switching a node to quantized mode:
+# python quantization_check.py
+MIN_LABEL_AGREEMENT = float(os.getenv("QUANTIZE_MIN_AGREEMENT", 0.95))
+MIN_COSINE = float(os.getenv("QUANTIZE_MIN_COSINE", 0.98))
+
+FIXED_CORPUS = [
+    "Stocks rally as inflation cools faster than economists expected",
+    "Central bank holds interest rates steady amid slowing growth",
+    "Tech giant unveils new AI chip to rival industry leader",
+    "Massive earthquake leaves thousands homeless in coastal region",
+    "Local team clinches championship in dramatic overtime victory",
+    "Hospital reports surge in flu cases as winter approaches",
+    "Government announces plan to cut carbon emissions by half",
+    "Protesters clash with police outside parliament building",
+    "Startup raises record funding round for battery technology",
+    "Airline cancels hundreds of flights after system outage",
+    "Scientists discover new species of frog in rainforest",
+    "Film festival opens with premiere of acclaimed drama",
+    "Company recalls vehicles over faulty brake systems",
+    "Unemployment falls to lowest level in two decades",
+    "Wildfire forces evacuation of several mountain towns",
+    "New vaccine shows strong results in late-stage trial",
+    "Election results delayed as officials recount ballots",
+    "Streaming service loses subscribers after price increase",
+    "Researchers warn of rising sea levels threatening cities",
+    "Star striker suffers season-ending knee injury",
+    "Retail sales beat forecasts during holiday shopping season",
+    "Cyberattack disrupts services at major bank",
+    "City opens new park on former industrial site",
+    "Trade talks collapse as both sides refuse to compromise",
+]
+
+def _best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def compare_sentiment(texts, repeats=3):
+    fp32 = load_sentiment_pipeline(quantize=False)
+    int8 = load_sentiment_pipeline(quantize=True)
+    fp32_out, fp32_time = _best_time(lambda: fp32(texts), repeats)
+    int8_out, int8_time = _best_time(lambda: int8(texts), repeats)
+
+    agree = sum(a['label'] == b['label'] for a, b in zip(fp32_out, int8_out))
+    score_diff = [abs(a['score'] - b['score']) for a, b in zip(fp32_out, int8_out)]
+    return {
+        'fp32_ms_per_doc': round(fp32_time * 1000 / len(texts), 2),
+        'int8_ms_per_doc': round(int8_time * 1000 / len(texts), 2),
+        'speedup': round(fp32_time / int8_time, 2) if int8_time else None,
+        'label_agreement': round(agree / len(texts), 4),
+        'max_score_diff': round(max(score_diff), 4)
+    }
+
+def compare_embeddings(texts, repeats=3):
+    fp32 = load_sentence_encoder(quantize=False)
+    int8 = load_sentence_encoder(quantize=True)
+    fp32_out, fp32_time = _best_time(lambda: fp32.encode(texts, show_progress_bar=False), repeats)
+    int8_out, int8_time = _best_time(lambda: int8.encode(texts, show_progress_bar=False), repeats)
+
+    a = fp32_out / np.linalg.norm(fp32_out, axis=1, keepdims=True)
+    b = int8_out / np.linalg.norm(int8_out, axis=1, keepdims=True)
+    cosine = (a * b).sum(axis=1)
+    # Does each document still have the same nearest neighbour?
+    nn_fp32 = np.argsort(-(a @ a.T), axis=1)[:, 1]
+    nn_int8 = np.argsort(-(b @ b.T), axis=1)[:, 1]
+    return {
+        'fp32_ms_per_doc': round(fp32_time * 1000 / len(texts), 2),
+        'int8_ms_per_doc': round(int8_time * 1000 / len(texts), 2),
+        'speedup': round(fp32_time / int8_time, 2) if int8_time else None,
+        'mean_cosine': round(float(cosine.mean()), 4),
+        'min_cosine': round(float(cosine.min()), 4),
+        'nearest_neighbour_agreement': round(float((nn_fp32 == nn_int8).mean()), 4)
+    }
+
+def run_comparison(texts=None, repeats=3):
+    texts = texts or FIXED_CORPUS
+    print(f"Comparing fp32 vs int8 on {len(texts)} documents "
+          f"(TORCH_NUM_THREADS={os.getenv('TORCH_NUM_THREADS', 'default')})...")
+    report = {
+        'sentiment': compare_sentiment(texts, repeats),
+        'embeddings': compare_embeddings(texts, repeats)
+    }
+    print(json.dumps(report, indent=2))
+
+    report['passed'] = (report['sentiment']['label_agreement'] >= MIN_LABEL_AGREEMENT
+                        and report['embeddings']['min_cosine'] >= MIN_COSINE)
+    if report['passed']:
+        print("int8 models agree with fp32 within thresholds.")
+    else:
+        print(f"WARNING: int8 results drift beyond thresholds (label agreement >= {MIN_LABEL_AGREEMENT}, "
+              f"cosine >= {MIN_COSINE}). Keep INFERENCE_QUANTIZE=0.")
+    return report
+
+if __name__ == "__main__":
+    run_comparison()
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import string
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+LEMMA_TABLE_PATH = os.path.join(MODEL_DIR, "lemma_table.json")
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 4096))
+
+# Loaded once per process from LEMMA_TABLE_PATH, see load_lemma_table()
+_lemma_table = None
+_stop_words = None
+
+_url_re = re.compile(r"http\S+|www\S+|https\S+", flags=re.MULTILINE)
+_digits_re = re.compile(r'\d+')
+_punct_table = str.maketrans('', '', string.punctuation)
+
+def _clean(text):
+    # Same cleaning steps as text_preprocessing.preprocess_text, minus spaCy
+    text = text.lower()
+    text = _url_re.sub('', text)
+    text = text.translate(_punct_table)
+    text = _digits_re.sub('', text)
+    return text
+
+def build_lemma_table(limit=None):
+    """
+    Builds the token -> lemma table OFFLINE using the full spaCy pipeline
+    over the vocabulary of the 'news' table, and saves it to disk.
+    Run this from your terminal: python query_normalizer.py
+    """
+    import spacy
+    from fetch_news import connect_db
+    from nltk.corpus import stopwords
+
+    conn = connect_db()
+    cursor = conn.cursor()
+    query = "SELECT title, description FROM news"
+    if limit:
+        query += " ORDER BY id DESC LIMIT %s"
+        cursor.execute(query, (int(limit),))
+    else:
+        cursor.execute(query)
+
+    vocab = set()
+    for title, description in cursor.fetchall():
+        vocab.update(_clean((title or "") + " " + (description or "")).split())
+    cursor.close()
+    conn.close()
+
+    print(f"Lemmatizing {len(vocab)} distinct tokens...")
+    nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+    lemmas = {}
+    for doc in nlp.pipe(sorted(vocab), batch_size=1000):
+        for token in doc:
+            lemma = token.lemma_.strip()
+            if lemma and lemma != '-PRON-' and lemma != token.text:
+                lemmas[token.text] = lemma
+
+    try:
+        stop_words = sorted(stopwords.words('english'))
+    except LookupError:
+        stop_words = []
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(LEMMA_TABLE_PATH, "w", encoding="utf-8") as f:
+        json.dump({'lemmas': lemmas, 'stopwords': stop_words}, f)
+    print(f"Lemma table saved to {LEMMA_TABLE_PATH} ({len(lemmas)} entries).")
+    reset_cache()
+    return lemmas
+
+def load_lemma_table():
+    """Loads the precomputed lemma table and stopwords (no model required)."""
+    global _lemma_table, _stop_words
+    if _lemma_table is not None:
+        return _lemma_table, _stop_words
+
+    lemmas, stop_words = {}, []
+    try:
+        with open(LEMMA_TABLE_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        lemmas = data.get('lemmas', {})
+        stop_words = data.get('stopwords', [])
+    except FileNotFoundError:
+        print("Lemma table not found, queries will not be lemmatized. Build it with:")
+        print("python query_normalizer.py")
+    except Exception as e:
+        print(f"Error loading lemma table: {e}")
+
+    if not stop_words:
+        try:
+            from nltk.corpus import stopwords
+            stop_words = stopwords.words('english')
+        except Exception:
+            stop_words = []
+
+    _lemma_table = lemmas
+    _stop_words = frozenset(stop_words)
+    return _lemma_table, _stop_words
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def normalize_query(text):
+    """
+    Fast request-time counterpart of text_preprocessing.preprocess_text.
+    Uses the lemma table lookup instead of a spaCy parse and skips spell correction.
+    """
+    if not text:
+        return ""
+    lemmas, stop_words = load_lemma_table()
+    tokens = []
+    for word in _clean(text).split():
+        if word in stop_words:
+            continue
+        tokens.append(lemmas.get(word, word))
+    return " ".join(tokens)
+
+def reset_cache():
+    """Drops the loaded table and cached queries, e.g. after rebuilding the table."""
+    global _lemma_table, _stop_words
+    _lemma_table = None
+    _stop_words = None
+    normalize_query.cache_clear()
+
+def cache_info():
+    return normalize_query.cache_info()
+
+if __name__ == "__main__":
+    build_lemma_table()
@@ -0,0 +1,149 @@
+import os
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-endpoint request latency, with the DB and model time spent inside each request.
+# Recording is an append to a bounded deque plus one histogram bucket increment, so
+# it is cheap enough to leave on. Percentiles come from the last REQUEST_METRICS_WINDOW
+# requests of each endpoint; the histograms behind /metrics are cumulative.
+REQUEST_METRICS_WINDOW = int(os.getenv("REQUEST_METRICS_WINDOW", 1024))
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SKIPPED_ENDPOINTS = {'static', 'metrics'}
+
+_local = threading.local()
+_lock = threading.Lock()
+_endpoints = {}
+
+class EndpointStats:
+    __slots__ = ('count', 'total', 'db', 'model', 'errors', 'buckets', 'recent')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.db = 0.0
+        self.model = 0.0
+        self.errors = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        # (total, db, model) seconds of the most recent requests
+        self.recent = deque(maxlen=REQUEST_METRICS_WINDOW)
+
+def start_request():
+    _local.timings = {'db': 0.0, 'model': 0.0}
+    _local.start = time.perf_counter()
+
+def add_time(kind, seconds):
+    """Adds DB or model time to the current request, if there is one."""
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[kind] = timings.get(kind, 0.0) + seconds
+
+@contextmanager
+def timer(kind):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(kind, time.perf_counter() - start)
+
+def finish_request(endpoint, status):
+    start = getattr(_local, 'start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    timings = _local.timings
+    _local.start = _local.timings = None
+    db, model = timings['db'], timings['model']
+    with _lock:
+        stats = _endpoints.get(endpoint)
+        if stats is None:
+            stats = _endpoints[endpoint] = EndpointStats()
+        stats.count += 1
+        stats.total += elapsed
+        stats.db += db
+        stats.model += model
+        if status >= 500:
+            stats.errors += 1
+        stats.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+        stats.recent.append((elapsed, db, model))
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summary():
+    """Per-endpoint percentiles (ms) over the recent window, slowest p95 first, plus the overall mean."""
+    with _lock:
+        snapshot = {endpoint: (stats.count, stats.errors, list(stats.recent)) for endpoint, stats in _endpoints.items()}
+    rows, all_totals = [], []
+    for endpoint, (count, errors, recent) in snapshot.items():
+        totals = sorted(r[0] for r in recent)
+        all_totals.extend(totals)
+        rows.append({
+            'endpoint': endpoint,
+            'count': count,
+            'errors': errors,
+            'p50_ms': round(_percentile(totals, 0.50) * 1000, 1),
+            'p95_ms': round(_percentile(totals, 0.95) * 1000, 1),
+            'p99_ms': round(_percentile(totals, 0.99) * 1000, 1),
+            'avg_db_ms': round(sum(r[1] for r in recent) / len(recent) * 1000, 1) if recent else 0.0,
+            'avg_model_ms': round(sum(r[2] for r in recent) / len(recent) * 1000, 1) if recent else 0.0,
+        })
+    rows.sort(key=lambda r: r['p95_ms'], reverse=True)
+    avg_ms = round(sum(all_totals) / len(all_totals) * 1000) if all_totals else 0
+    return {'avg_response_ms': avg_ms, 'endpoints': rows}
+
+def prometheus_text():
+    """Request histograms and DB/model time counters in the Prometheus text format."""
+    with _lock:
+        snapshot = {endpoint: (stats.count, stats.total, stats.db, stats.model, stats.errors, list(stats.buckets))
+                    for endpoint, stats in _endpoints.items()}
+    lines = [
+        "# HELP veritascope_request_duration_seconds Request latency by endpoint.",
+        "# TYPE veritascope_request_duration_seconds histogram",
+    ]
+    for endpoint, (count, total, _, _, _, buckets) in sorted(snapshot.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS, buckets):
+            cumulative += n
+            lines.append(f'veritascope_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+        lines.append(f'veritascope_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {count}')
+        lines.append(f'veritascope_request_duration_seconds_sum{{endpoint="{endpoint}"}} {total:.6f}')
+        lines.append(f'veritascope_request_duration_seconds_count{{endpoint="{endpoint}"}} {count}')
+    counters = (
+        ("veritascope_request_db_seconds_total", "Time spent in MySQL queries, by endpoint.", 2),
+        ("veritascope_request_model_seconds_total", "Time spent in model inference, by endpoint.", 3),
+        ("veritascope_request_errors_total", "Requests answered with a 5xx status, by endpoint.", 4),
+    )
+    for metric, help_text, index in counters:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for endpoint, values in sorted(snapshot.items()):
+            lines.append(f'{metric}{{endpoint="{endpoint}"}} {values[index]:g}')
+    return "\n".join(lines) + "\n"
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+def init_app(app):
+    """Registers the timing hooks on a Flask app."""
+    from flask import request
+
+    @app.before_request
+    def _start_timer():
+        if request.endpoint not in SKIPPED_ENDPOINTS:
+            start_request()
+
+    @app.after_request
+    def _stop_timer(response):
+        if request.endpoint not in SKIPPED_ENDPOINTS:
+            finish_request(request.endpoint or 'unmatched', response.status_code)
+        return response
@@ -0,0 +1,151 @@
+import os
+import time
+import pstats
+import cProfile
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# On-demand profiling of single requests. An admin adds ?profile=1 or the header
+# 'X-Profile: 1' to any page; that request runs under cProfile (view, SQL and
+# template rendering alike) and two files are written to PROFILE_DIR:
+#   <id>.prof       pstats, e.g. python -m pstats or snakeviz
+#   <id>.collapsed  collapsed stacks for flamegraph.pl / speedscope
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(BASE_DIR, "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))
+# Deepest call chain written to the collapsed-stack file
+MAX_STACK_DEPTH = 64
+
+def profiling_requested(request):
+    return request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        # Built-ins such as <method 'execute' of ...>
+        return name.strip("<>")
+    return f"{os.path.basename(filename)}:{name}:{line}"
+
+def collapsed_stacks(stats):
+    """
+    Derives collapsed stacks ('a;b;c <microseconds>') from cProfile's caller/callee
+    graph. cProfile keeps edges, not full stacks, so time is split down each edge in
+    proportion to the time the caller spent in that callee.
+    """
+    callees = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, (_, _, _, edge_ct) in callers.items():
+            callees.setdefault(caller, []).append((func, edge_ct))
+
+    lines = {}
+    def walk(func, path, labels, weight):
+        # weight: the share of func's total time that was spent on this call path
+        tt = stats.stats[func][2]
+        labels = labels + [_label(func)]
+        if tt * weight > 0:
+            key = ";".join(labels)
+            lines[key] = lines.get(key, 0) + tt * weight
+        if len(labels) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_ct in callees.get(func, []):
+            callee_ct = stats.stats[callee][3]
+            # Skip recursion and paths too small to show up in a flamegraph
+            if callee in path or not callee_ct or edge_ct * weight < 1e-5:
+                continue
+            walk(callee, path | {callee}, labels, weight * min(1.0, edge_ct / callee_ct))
+
+    for root in roots:
+        walk(root, {root}, [], 1.0)
+    return [f"{stack} {int(seconds * 1_000_000)}" for stack, seconds in lines.items() if seconds >= 1e-6]
+
+def save_profile(profiler, endpoint, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}"
+    path = os.path.join(PROFILE_DIR, profile_id)
+    profiler.dump_stats(path + ".prof")
+    stats = pstats.Stats(path + ".prof")
+    with open(path + ".collapsed", "w") as f:
+        f.write("\n".join(collapsed_stacks(stats)) + "\n")
+    _prune()
+    print(f"Profiled {endpoint} in {elapsed * 1000:.0f}ms -> {path}.prof")
+    return profile_id
+
+def _prune():
+    profiles = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof"))
+    for name in profiles[:-PROFILE_KEEP] if len(profiles) > PROFILE_KEEP else []:
+        for ext in (".prof", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-5] + ext))
+            except OSError:
+                pass
+
+def list_profiles(limit=20):
+    """Most recent profiles first: id, endpoint, time, total seconds and the slowest functions."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted((f for f in os.listdir(PROFILE_DIR) if f.endswith(".prof")), reverse=True)[:limit]:
+        profile_id = name[:-5]
+        try:
+            stats = pstats.Stats(os.path.join(PROFILE_DIR, name))
+        except Exception as e:
+            print(f"Error reading profile {name}: {e}")
+            continue
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:3]
+        profiles.append({
+            'id': profile_id,
+            'endpoint': profile_id.split("-", 3)[-1],
+            'created': datetime.strptime(profile_id[:22], '%Y%m%d-%H%M%S-%f').strftime('%Y-%m-%d %H:%M:%S'),
+            'total_ms': round(stats.total_tt * 1000, 1),
+            'top_functions': [_label(func) for func, _ in top],
+        })
+    return profiles
+
+def profile_path(profile_id, kind):
+    """Path of a saved profile file, or None for unknown ids (ids come from the URL)."""
+    ext = {"pstats": ".prof", "collapsed": ".collapsed"}.get(kind)
+    if not ext or os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ext)
+    return path if os.path.isfile(path) else None
+
+def init_app(app, is_admin):
+    """Registers the profiling hooks; is_admin(user_id) decides who may profile."""
+    import jwt
+    from flask import request, g
+
+    def requester_is_admin():
+        token = request.cookies.get('token')
+        if not token:
+            return False
+        try:
+            data = jwt.decode(token, os.getenv("FLASK_SECRET_KEY"), algorithms=['HS256'])
+            return is_admin(data['sub'])
+        except Exception:
+            return False
+
+    @app.before_request
+    def _start_profiler():
+        if request.endpoint == 'static' or not profiling_requested(request) or not requester_is_admin():
+            return
+        g._profiler = cProfile.Profile()
+        g._profile_start = time.perf_counter()
+        g._profiler.enable()
+
+    @app.after_request
+    def _stop_profiler(response):
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed = time.perf_counter() - g.pop('_profile_start')
+        try:
+            response.headers['X-Profile-Id'] = save_profile(profiler, request.endpoint or 'unmatched', elapsed)
+        except Exception as e:
+            print(f"Error saving profile: {e}")
+        return response
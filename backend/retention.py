@@ -0,0 +1,184 @@
+import os
+import json
+import zlib
+import argparse
+from datetime import datetime, timedelta
+import mysql.connector
+from dotenv import load_dotenv
+import db_instrumentation
+import enrichment_stages
+
+load_dotenv()
+
+# Tiered retention for article bodies. Articles older than RETENTION_DAYS have
+# their description and content moved, compressed, into news_archive; the row in
+# 'news' keeps the metadata (title, source, dates, url, image) and NULL bodies, so
+# scans and SELECT n.* stay small. The detail page puts the body back in on read
+# (hydrate). Listings and the description search only cover the hot window; topic
+# training and the TF-IDF keyword upgrade hydrate in bulk (hydrate_many), the
+# vocabulary builders (spelling, lemmas, gazetteer) deliberately read titles only
+# for archived articles.
+#
+# Only articles that every enrichment stage has processed (enrichment_done, or a
+# result row from before it existed) are archived, so a backfilled or backlogged
+# article is never enriched from its title alone.
+#   python retention.py                 # archive bodies older than RETENTION_DAYS
+#   python retention.py --days 30 --dry-run
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 90))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", 1000))
+# zlib (standard library) or zstd (needs the zstandard package); stored per row
+RETENTION_CODEC = (os.getenv("RETENTION_CODEC") or "zlib").lower()
+
+def connect_db():
+    return db_instrumentation.connect(
+        host=os.getenv("MYSQL_HOST"),
+        port=db_instrumentation.mysql_port(),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD"),
+        database=os.getenv("MYSQL_DB")
+    )
+
+def create_archive_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS news_archive (
+        article_id INT PRIMARY KEY,
+        codec VARCHAR(8) NOT NULL,
+        body LONGBLOB NOT NULL,
+        raw_bytes INT NOT NULL,
+        archived_at DATETIME NOT NULL,
+        FOREIGN KEY (article_id) REFERENCES news(id));''')
+
+def compress(data, codec=RETENTION_CODEC):
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    raise ValueError(f"Unknown RETENTION_CODEC '{codec}', expected 'zlib' or 'zstd'")
+
+def decompress(data, codec):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown codec '{codec}' in news_archive")
+
+def _enriched_condition(cursor):
+    """A condition that holds once every stage has processed article n."""
+    clauses = []
+    for stage, table in enrichment_stages.RESULT_TABLES.items():
+        try:
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            cursor.fetchall()
+        except mysql.connector.Error:
+            # The stage has never run: nothing can be enriched by it yet, nothing is archived
+            return None
+        # Articles processed before enrichment_done existed only have their result rows
+        clauses.append(f'''(EXISTS (SELECT 1 FROM enrichment_done d WHERE d.stage = '{stage}' AND d.article_id = n.id)
+                          OR EXISTS (SELECT 1 FROM {table} r WHERE r.article_id = n.id))''')
+    return " AND ".join(clauses)
+
+def archive_bodies(days=RETENTION_DAYS, batch_size=RETENTION_BATCH, dry_run=False):
+    """Moves the bodies of enriched articles published more than `days` days ago. Returns the number moved."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    create_archive_table(cursor)
+    conn.commit()
+    enrichment_stages.create_done_table()
+    enriched = _enriched_condition(cursor)
+    if enriched is None:
+        print("Not every enrichment stage has run yet, nothing to archive.")
+        conn.close()
+        return 0
+    cutoff = datetime.now() - timedelta(days=days)
+    query = f'''SELECT n.id, n.description, n.content
+                FROM news n
+                LEFT JOIN news_archive a ON a.article_id = n.id
+                WHERE n.publishedAt < %s AND a.article_id IS NULL
+                  AND (n.description IS NOT NULL OR n.content IS NOT NULL)
+                  AND {enriched}
+                  AND n.id > %s
+                ORDER BY n.id
+                LIMIT %s'''
+    moved = raw_total = stored_total = 0
+    last_id = 0
+    try:
+        while True:
+            # Keyset pagination, so a dry run (which moves nothing) still advances
+            cursor.execute(query, (cutoff, last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            archived = []
+            for article_id, description, content in rows:
+                raw = json.dumps({'description': description, 'content': content}).encode("utf-8")
+                body = compress(raw)
+                raw_total += len(raw)
+                stored_total += len(body)
+                archived.append((article_id, RETENTION_CODEC, body, len(raw), datetime.now()))
+            if not dry_run:
+                cursor.executemany('''INSERT INTO news_archive (article_id, codec, body, raw_bytes, archived_at)
+                                      VALUES (%s, %s, %s, %s, %s)''', archived)
+                ids = [row[0] for row in archived]
+                cursor.execute(f'''UPDATE news SET description = NULL, content = NULL
+                                   WHERE id IN ({','.join(['%s'] * len(ids))})''', tuple(ids))
+                conn.commit()
+            moved += len(rows)
+            print(f"{'Would archive' if dry_run else 'Archived'} {moved} article bodies "
+                  f"({raw_total / 1e6:.1f} MB -> {stored_total / 1e6:.1f} MB)", flush=True)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    if moved and not dry_run:
+        print("Space is reused for new rows; run OPTIMIZE TABLE news to return it to the OS.")
+    return moved
+
+def load_body(cursor, article_id):
+    """{'description': ..., 'content': ...} of an archived article, or None."""
+    try:
+        cursor.execute("SELECT codec, body FROM news_archive WHERE article_id = %s", (article_id,))
+        row = cursor.fetchone()
+    except mysql.connector.Error:
+        # Retention has never run
+        return None
+    if row is None:
+        return None
+    codec, body = (row['codec'], row['body']) if isinstance(row, dict) else row
+    return json.loads(decompress(bytes(body), codec))
+
+def hydrate(cursor, article):
+    """Puts an archived article's description and content back into its row dict."""
+    if article.get('description') is None and article.get('content') is None:
+        body = load_body(cursor, article['id'])
+        if body:
+            article.update(body)
+    return article
+
+def hydrate_many(cursor, articles):
+    """hydrate() for a list of row dicts (with 'id'), one news_archive query for all of them."""
+    missing = {a['id']: a for a in articles if a.get('description') is None and a.get('content') is None}
+    if not missing:
+        return articles
+    try:
+        cursor.execute(f"SELECT article_id, codec, body FROM news_archive WHERE article_id IN ({','.join(['%s'] * len(missing))})",
+                       tuple(missing))
+        rows = cursor.fetchall()
+    except mysql.connector.Error:
+        # Retention has never run
+        return articles
+    for row in rows:
+        article_id, codec, body = (row['article_id'], row['codec'], row['body']) if isinstance(row, dict) else row
+        missing[article_id].update(json.loads(decompress(bytes(body), codec)))
+    return articles
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moves old article bodies into the compressed news_archive table.")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="archive articles older than this (default: %(default)s)")
+    parser.add_argument("--batch", type=int, default=RETENTION_BATCH)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    args = parser.parse_args()
+    archive_bodies(args.days, args.batch, args.dry_run)
@@ -1,17 +1,25 @@
-from transformers import pipeline
-import mysql.connector
 import os
+import time
 from dotenv import load_dotenv
+import db_instrumentation
+from model_registry import get_model, precision_tag
+import inference_client
+import enrichment_cache
+import pipeline_metrics
+import enrichment_stages
 
 load_dotenv()
 
-# Load Hugging Face sentiment analysis pipeline once
-sentiment_analyzer = pipeline("sentiment-analysis")
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", 32))
+# Bump when the sentiment model changes so cached results are not reused
+SENTIMENT_MODEL_VERSION = "distilbert-sst2-v1"
+
+_unique_ready = False
 
 def connect_db():
-    conn = mysql.connector.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -27,9 +35,23 @@ def connect_db():
                FOREIGN KEY (article_id) REFERENCES news(id)
            );'''
     cursor.execute(query)
+    ensure_unique_article(cursor)
     conn.commit()
     return conn
 
+def ensure_unique_article(cursor):
+    """One sentiment row per article, so a batch redone after an expired job lease is not stored twice."""
+    global _unique_ready
+    if _unique_ready:
+        return
+    cursor.execute("SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'sentiments' AND INDEX_NAME = 'ux_sentiments_article'")
+    if cursor.fetchone()[0] == 0:
+        # Older tables can hold duplicates; the latest row of each article is kept
+        cursor.execute('''DELETE FROM sentiments WHERE id NOT IN (
+                              SELECT id FROM (SELECT MAX(id) AS id FROM sentiments GROUP BY article_id) latest)''')
+        cursor.execute("CREATE UNIQUE INDEX ux_sentiments_article ON sentiments (article_id)")
+    _unique_ready = True
+
 def analyze_sentiment(text):
     """
     Analyze sentiment of the given text.
@@ -41,10 +63,31 @@ def analyze_sentiment(text):
             'overall': 'Positive' or 'Neutral' or 'Negative'
         }
     """
-    
-    result = sentiment_analyzer(text)
-    label = result[0]['label'].upper()
-    score = result[0]['score']
+    return analyze_sentiments([text])[0]
+
+def analyze_sentiments(texts):
+    """analyze_sentiment for a list of texts, one result dict per text."""
+    # Identical text is only ever run through the model once (see enrichment_cache.py)
+    return enrichment_cache.cached_batch("sentiment", f"{SENTIMENT_MODEL_VERSION}-{precision_tag()}", texts, _infer_sentiments)
+
+def _infer_sentiments(texts):
+    # Use the shared inference server when one is configured
+    if inference_client.enabled():
+        results = inference_client.call("sentiment", texts)
+        if results is not None:
+            return results
+    return analyze_sentiment_batch(texts)
+
+def analyze_sentiment_batch(texts):
+    """Runs the local pipeline on a list of texts in one call, one result dict per text."""
+    # Hugging Face pipeline is loaded once, on first use
+    sentiment_analyzer = get_model("sentiment")
+    return [sentiment_from_prediction(result) for result in sentiment_analyzer(list(texts), batch_size=SENTIMENT_BATCH_SIZE)]
+
+def sentiment_from_prediction(prediction):
+    """Converts a pipeline prediction {'label', 'score'} into our percentage dict."""
+    label = prediction['label'].upper()
+    score = prediction['score']
     
     # Default to zero for all scores
     positive, neutral, negative = 0, 0, 0
@@ -87,7 +130,7 @@ def save_sentiment(article_id, sentiment_dict):
     """
     conn = connect_db()
     cursor = conn.cursor()
-    query = '''INSERT INTO sentiments (article_id, positive, neutral, negative, overall)
+    query = '''INSERT IGNORE INTO sentiments (article_id, positive, neutral, negative, overall)
                VALUES (%s, %s, %s, %s, %s)'''
     cursor.execute(query, (
         article_id,
@@ -102,10 +145,7 @@ def save_sentiment(article_id, sentiment_dict):
 def analyze_and_save_sentiments():
     conn = connect_db()
     cursor = conn.cursor(dictionary=True) 
-    cursor.execute('''SELECT n.id
-                      FROM news n
-                      LEFT JOIN sentiments s ON n.id = s.article_id
-                      WHERE s.article_id IS NULL;''')
+    cursor.execute("SELECT n.id " + enrichment_stages.pending_articles('sentiment'), ('sentiment',))
     article_rows = cursor.fetchall()
     if not article_rows:
         print("No new articles to analyze.")
@@ -113,19 +153,28 @@ def analyze_and_save_sentiments():
         return
 
     print(f"Found {len(article_rows)} new articles to analyze...")
-    for row in article_rows:
-        article_id_int = row['id'] 
-        cursor.execute('''SELECT title, description FROM news where id = %s''', (article_id_int,))
-        article = cursor.fetchone()
-        if not article:
-            continue
-        title = article.get('title') or ""
-        description = article.get('description') or ""
-        text = title + " " + description
-        if not text.strip():
-            continue   
-        sentiment = analyze_sentiment(text)
-        save_sentiment(article_id_int, sentiment)    
+    with pipeline_metrics.track('sentiment') as run:
+        run.backlog_before = len(article_rows)
+        for row in article_rows:
+            article_id_int = row['id'] 
+            cursor.execute('''SELECT title, description FROM news where id = %s''', (article_id_int,))
+            article = cursor.fetchone()
+            if not article:
+                continue
+            title = article.get('title') or ""
+            description = article.get('description') or ""
+            text = title + " " + description
+            if not text.strip():
+                run.batch(1, 0, 0.0)
+                continue   
+            start = time.perf_counter()
+            sentiment = analyze_sentiment(text)
+            analyzed = time.perf_counter()
+            save_sentiment(article_id_int, sentiment)
+            run.batch(1, 1, analyzed - start, time.perf_counter() - analyzed)
+    # Articles without text count as done too, so retention does not wait on them
+    enrichment_stages.mark_done(cursor, 'sentiment', [row['id'] for row in article_rows])
+    conn.commit()
     conn.close()
     print("Sentiment analysis complete.")
 
@@ -0,0 +1,295 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, date
+from functools import lru_cache
+import mysql.connector
+from mysql.connector import errors as mysql_errors
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Storage backends behind db_instrumentation.connect(). DB_BACKEND=mysql (default)
+# is the MySQL server configured by MYSQL_*; DB_BACKEND=sqlite keeps everything in
+# one local file (SQLITE_PATH) for laptops, CI and single-node deployments.
+#
+# The modules keep writing the MySQL dialect they always have. For SQLite each
+# statement is translated once (and cached): placeholders, CURDATE()/NOW() and
+# INTERVAL arithmetic, INSERT IGNORE, ON DUPLICATE KEY UPDATE, AUTO_INCREMENT and
+# inline INDEX clauses, information_schema column and index checks, FOR UPDATE.
+# The connection and cursor wrappers mimic the parts of mysql.connector the code relies on
+# (dictionary cursors, lastrowid, autocommit, mysql.connector.Error subclasses).
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_BACKEND = (os.getenv("DB_BACKEND") or "mysql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH") or os.path.join(BASE_DIR, "models", "veritascope.sqlite")
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", 64))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", 256))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 10000))
+
+if DB_BACKEND not in ("mysql", "sqlite"):
+    raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}', expected 'mysql' or 'sqlite'")
+
+def is_sqlite():
+    return DB_BACKEND == "sqlite"
+
+def connect(**kwargs):
+    """A raw connection for the configured backend; the MySQL kwargs are ignored for SQLite."""
+    if is_sqlite():
+        return SQLiteConnection(SQLITE_PATH)
+    return mysql.connector.connect(**kwargs)
+
+# --- SQLite dialect translation ---
+
+# Values go in as MySQL's text formats, so string comparisons and DATE() work on them
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" ", timespec="seconds"))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+_UNITS = {'DAY': 'days', 'HOUR': 'hours', 'MINUTE': 'minutes', 'SECOND': 'seconds'}
+_NOW = "datetime('now', 'localtime')"
+_TODAY = "date('now', 'localtime')"
+
+_skip_re = re.compile(r"^\s*(CREATE\s+DATABASE|USE\s|SET\s+SESSION)", re.I)
+_placeholder_re = re.compile(r"%s")
+_date_sub_re = re.compile(r"DATE_SUB\(\s*(CURDATE\(\)|NOW\(\))\s*,\s*INTERVAL\s+(\?|\d+)\s+(DAY|HOUR|MINUTE|SECOND)\s*\)", re.I)
+_interval_re = re.compile(r"(CURDATE\(\)|NOW\(\))\s*([+-])\s*INTERVAL\s+(\?|\d+)\s+(DAY|HOUR|MINUTE|SECOND)", re.I)
+_on_duplicate_id_re = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(\w+)\s*=\s*LAST_INSERT_ID\(\s*\1\s*\)", re.I)
+_on_duplicate_re = re.compile(r"ON\s+DUPLICATE\s+KEY\s+UPDATE", re.I)
+_values_fn_re = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_auto_increment_re = re.compile(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", re.I)
+_create_table_re = re.compile(r"^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?", re.I)
+_inline_index_re = re.compile(r",\s*(?:FULLTEXT\s+)?(?:INDEX|KEY)\b\s*(?:`?\w+`?\s*)?\(([^)]*)\)", re.I)
+_unique_key_re = re.compile(r"\bUNIQUE\s+(?:KEY|INDEX)\b\s*(?:`?\w+`?\s*)?\(", re.I)
+_enum_re = re.compile(r"\bENUM\([^)]*\)", re.I)
+_column_check_re = re.compile(
+    r"SELECT\s+COUNT\(\*\)\s+FROM\s+information_schema\.COLUMNS\s+WHERE\s+TABLE_SCHEMA\s*=\s*DATABASE\(\)\s+"
+    r"AND\s+TABLE_NAME\s*=\s*'(\w+)'\s+AND\s+COLUMN_NAME\s*=\s*'(\w+)'", re.I)
+_index_check_re = re.compile(
+    r"SELECT\s+COUNT\(\*\)\s+FROM\s+information_schema\.STATISTICS\s+WHERE\s+TABLE_SCHEMA\s*=\s*DATABASE\(\)\s+"
+    r"AND\s+TABLE_NAME\s*=\s*'(\w+)'\s+AND\s+INDEX_NAME\s*=\s*'(\w+)'", re.I)
+_alter_add_re = re.compile(r"^\s*ALTER\s+TABLE\s+`?(\w+)`?\s+(ADD\s+.*)$", re.I | re.S)
+
+def _interval(base, sign, amount, unit):
+    base = _TODAY if base.upper().startswith("CURDATE") else _NOW
+    function = "date" if base == _TODAY and unit.upper() == "DAY" else "datetime"
+    return f"{function}({base[base.index('(') + 1:-1]}, '{sign}' || {amount} || ' {_UNITS[unit.upper()]}')"
+
+def _index_statements(table, columns_list):
+    statements = []
+    for columns in columns_list:
+        names = [c.strip().strip("`") for c in columns.split(",")]
+        statements.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(names)} ON {table} ({', '.join(names)})")
+    return statements
+
+@lru_cache(maxsize=1024)
+def translate(operation):
+    """MySQL statement -> (sqlite statements, returns_id). Extra statements (indexes) take no parameters."""
+    if _skip_re.match(operation):
+        return (), False
+    sql = _placeholder_re.sub("?", operation.replace("%%", "%"))
+    sql = _column_check_re.sub(r"SELECT COUNT(*) FROM pragma_table_info('\1') WHERE name = '\2'", sql)
+    sql = _index_check_re.sub(r"SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = '\1' AND name = '\2'", sql)
+    sql = _date_sub_re.sub(lambda m: _interval(m.group(1), "-", m.group(2), m.group(3)), sql)
+    sql = _interval_re.sub(lambda m: _interval(m.group(1), m.group(2), m.group(3), m.group(4)), sql)
+    sql = re.sub(r"\bCURDATE\(\)", _TODAY, sql, flags=re.I)
+    sql = re.sub(r"\bNOW\(\)", _NOW, sql, flags=re.I)
+    sql = re.sub(r"\bIF\(", "IIF(", sql)
+    sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.I)
+    sql = re.sub(r"\s+FOR\s+UPDATE(\s+SKIP\s+LOCKED)?", "", sql, flags=re.I)
+
+    returns_id = False
+    if _on_duplicate_id_re.search(sql):
+        # lastrowid must be the existing row's id on a duplicate, as with LAST_INSERT_ID(id)
+        column = _on_duplicate_id_re.search(sql).group(1)
+        sql = _on_duplicate_id_re.sub(f"ON CONFLICT DO UPDATE SET {column} = {column} RETURNING {column}", sql)
+        returns_id = True
+    elif _on_duplicate_re.search(sql):
+        sql = _values_fn_re.sub(r"excluded.\1", _on_duplicate_re.sub("ON CONFLICT DO UPDATE SET", sql))
+
+    extra = []
+    table = _create_table_re.match(sql)
+    if table:
+        sql = _auto_increment_re.sub("INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+        sql = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP", "", sql, flags=re.I)
+        sql = _enum_re.sub("TEXT", sql)
+        extra = _index_statements(table.group(1), _inline_index_re.findall(sql))
+        sql = _inline_index_re.sub("", sql)
+        sql = _unique_key_re.sub("UNIQUE (", sql)
+    alter = _alter_add_re.match(sql)
+    if alter:
+        # SQLite takes one ADD COLUMN per ALTER TABLE, and indexes separately
+        table_name, clauses = alter.group(1), re.split(r",\s*(?=ADD\s)", alter.group(2).strip().rstrip(";"), flags=re.I)
+        statements = []
+        for clause in clauses:
+            index = re.match(r"ADD\s+(?:INDEX|KEY)\s*(?:`?\w+`?\s*)?\(([^)]*)\)", clause, re.I)
+            if index:
+                extra.extend(_index_statements(table_name, [index.group(1)]))
+            else:
+                statements.append(f"ALTER TABLE {table_name} {clause}")
+        return tuple(statements + extra), False
+    return (sql,) + tuple(extra), returns_id
+
+def _wrap_error(e):
+    """sqlite3 errors as the mysql.connector classes the modules catch."""
+    if isinstance(e, sqlite3.IntegrityError):
+        return mysql_errors.IntegrityError(msg=str(e))
+    if isinstance(e, sqlite3.OperationalError):
+        return mysql_errors.OperationalError(msg=str(e))
+    if isinstance(e, sqlite3.ProgrammingError):
+        return mysql_errors.ProgrammingError(msg=str(e))
+    return mysql_errors.DatabaseError(msg=str(e))
+
+_datetime_re = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$")
+_date_re = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def _convert(value):
+    # MySQL returns DATETIME / DATE values (including MIN(), DATE() ...) as datetime objects
+    if isinstance(value, str) and len(value) in (10, 19):
+        if len(value) == 19 and _datetime_re.match(value):
+            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        if len(value) == 10 and _date_re.match(value):
+            return datetime.strptime(value, "%Y-%m-%d").date()
+    return value
+
+class SQLiteCursor:
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._conn.cursor()
+        self._dictionary = dictionary
+        self._pending = None
+        self.lastrowid = None
+
+    def _row(self, row):
+        row = tuple(_convert(value) for value in row)
+        if self._dictionary:
+            return dict(zip([c[0] for c in self._cursor.description], row))
+        return row
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        statements, returns_id = translate(operation)
+        self._pending = None
+        try:
+            if "FOR UPDATE" in operation.upper() and not self._connection._conn.in_transaction:
+                # Row locks become one write lock: the whole select-then-update runs alone
+                self._cursor.execute("BEGIN IMMEDIATE")
+            for i, statement in enumerate(statements):
+                self._cursor.execute(statement, tuple(params or ()) if i == 0 else ())
+            if returns_id:
+                self._pending = []
+                self.lastrowid = self._cursor.fetchall()[0][0]
+            else:
+                self.lastrowid = self._cursor.lastrowid
+        except sqlite3.Error as e:
+            raise _wrap_error(e) from e
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        statements, returns_id = translate(operation)
+        try:
+            if returns_id:
+                for params in seq_params:
+                    self._cursor.execute(statements[0], tuple(params))
+                    self.lastrowid = self._cursor.fetchall()[0][0]
+            elif statements:
+                self._cursor.executemany(statements[0], [tuple(p) for p in seq_params])
+            for statement in statements[1:]:
+                self._cursor.execute(statement)
+        except sqlite3.Error as e:
+            raise _wrap_error(e) from e
+
+    def fetchone(self):
+        if self._pending is not None:
+            return None
+        row = self._cursor.fetchone()
+        return None if row is None else self._row(row)
+
+    def fetchmany(self, size=1):
+        if self._pending is not None:
+            return []
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        if self._pending is not None:
+            return []
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def with_rows(self):
+        return self._cursor.description is not None
+
+    def close(self):
+        self._cursor.close()
+
+_wal_lock = threading.Lock()
+_wal_ready = set()
+
+class SQLiteConnection:
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The pipeline hands cursors to its writer thread, as it does with MySQL
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        self._conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        with _wal_lock:
+            if path not in _wal_ready:
+                # Persistent: readers never block the writer and commits are sequential appends
+                self._conn.execute("PRAGMA journal_mode = WAL")
+                _wal_ready.add(path)
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA temp_store = MEMORY")
+        self._conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}")
+        self._conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def start_transaction(self):
+        # IMMEDIATE takes the write lock up front: concurrent job leasing queues on
+        # busy_timeout instead of failing at its UPDATE (SQLite's SKIP LOCKED)
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def is_connected(self):
+        return True
+
+    @property
+    def autocommit(self):
+        return self._conn.isolation_level is None
+
+    @autocommit.setter
+    def autocommit(self, value):
+        self._conn.isolation_level = None if value else ""
+
+def tune_for_bulk_load(cursor):
+    """Session settings for bulk imports on this connection."""
+    if is_sqlite():
+        # A crash mid-import can lose the last batches, which the import checkpoints resume anyway
+        cursor.execute("PRAGMA synchronous = OFF")
+    else:
+        # Duplicates are already filtered before they are inserted
+        cursor.execute("SET SESSION unique_checks = 0")
+
+def explain_statement(operation):
+    """The EXPLAIN form of a statement for the slow-query log."""
+    return ("EXPLAIN QUERY PLAN " if is_sqlite() else "EXPLAIN ") + operation
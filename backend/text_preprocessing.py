@@ -7,8 +7,8 @@
 import re
 import string
 import nltk
-import spacy
-from textblob import TextBlob
+from model_registry import get_model
+from spell_correction import correct_text
 from nltk.corpus import stopwords
 
 try:
@@ -17,7 +17,6 @@ except LookupError:
     nltk.download('stopwords')
 
 stop_words = set(stopwords.words('english'))
-nlp = spacy.load("en_core_web_sm")
 
 def preprocess_text(text):
     if not text:
@@ -35,7 +34,8 @@ def preprocess_text(text):
     # Remove numbers
     text = re.sub(r'\d+', '', text)
 
-    # Tokenize using spaCy
+    # Tokenize using spaCy (shared model, loaded on first use)
+    nlp = get_model("spacy")
     doc = nlp(text)
 
     tokens = []
@@ -51,8 +51,8 @@ def preprocess_text(text):
     # Join tokens back to string
     cleaned_text = " ".join(tokens)
 
-    # Spell correction with TextBlob (optional)
-    corrected_text = str(TextBlob(cleaned_text).correct())
+    # Spell correction with the precomputed SymSpell index (see spell_correction.py)
+    corrected_text = correct_text(cleaned_text)
 
     return corrected_text
 
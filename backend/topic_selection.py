@@ -1,13 +1,17 @@
 from dotenv import load_dotenv
 import pandas as pd
+import numpy as np
 import nltk
 from nltk.corpus import stopwords
 import re
 import string
-from sklearn.feature_extraction.text import CountVectorizer
-from sentence_transformers import SentenceTransformer
-from bertopic import BERTopic
 from fetch_news import connect_db
+from model_registry import get_model, register, unload, precision_tag
+import inference_client
+import enrichment_cache
+import backlog_stream
+import enrichment_stages
+import pipeline_metrics
 import os
 
 load_dotenv()
@@ -19,6 +23,20 @@ BERTOPIC_MODEL_PATH = os.path.join(MODEL_DIR, "BERTopic_model")
 # Ensure the 'models' directory exists
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+def load_topic_model():
+    from bertopic import BERTopic
+    # Reuse the registry's encoder (possibly int8) instead of loading another copy
+    return BERTopic.load(BERTOPIC_MODEL_PATH, embedding_model=get_model("sentence_encoder"))
+
+register("bertopic", load_topic_model)
+
+def topic_model_version():
+    # Retraining writes a new model file, which invalidates cached topic assignments
+    try:
+        return f"bertopic-{int(os.path.getmtime(BERTOPIC_MODEL_PATH))}-{precision_tag()}"
+    except OSError:
+        return "bertopic-untrained"
+
 # Manually update this map after you run training and see the
 # "Topics Detected" output in your terminal.
 # Topic -1 is the outlier topic in BERTopic.
@@ -66,6 +84,10 @@ def preprocess_text_for_bert(text):
     text = " ".join(text.split()) 
     return text
 
+def embed_texts(texts):
+    """Encodes texts with the local sentence encoder (same model BERTopic was trained with)."""
+    return get_model("sentence_encoder").encode(list(texts), show_progress_bar=False)
+
 def create_and_sync_topic_tables():
     conn = connect_db()
     cursor = conn.cursor()
@@ -117,30 +139,36 @@ def train_models():
     print("Starting BERTopic Model Training....")
     
     create_and_sync_topic_tables()
-    conn = connect_db()
-    cursor = conn.cursor()
 
-    print("Fetching all articles for training...")
-    cursor.execute("SELECT id, title, description, content FROM news")
-    rows = cursor.fetchall()
+    # Stream the articles and keep only the cleaned text: BERTopic needs the whole
+    # corpus, but not the raw LONGTEXT rows next to it
+    print("Fetching and preprocessing all articles for training...")
+    import retention
+    conn = connect_db()
+    cursor = conn.cursor(dictionary=True)
+    docs_text = []
+    for rows in backlog_stream.iter_chunks("SELECT n.id, n.title, n.description, n.content FROM news n WHERE 1 = 1"):
+        # Old articles have their bodies in news_archive
+        retention.hydrate_many(cursor, rows)
+        for row in rows:
+            title = row['title'] or ""
+            description = row['description'] or ""
+            content = row['content'] or ""
+            text = (title + " " + description + " " + content)
+            docs_text.append(preprocess_text_for_bert(text))
     cursor.close()
     conn.close()
 
-    if not rows:
+    if not docs_text:
         print("No articles in database to train on.")
         return
+    print(f"Preprocessed {len(docs_text)} articles (minimal cleaning).")
 
-    print(f"Preprocessing {len(rows)} articles (minimal cleaning)...")
-    docs_text = [] 
-    for row in rows:
-        title = row[1] or ""
-        description = row[2] or ""
-        content = row[3] or ""
-        text = (title + " " + description + " " + content)
-        docs_text.append(preprocess_text_for_bert(text))
+    from sklearn.feature_extraction.text import CountVectorizer
+    from bertopic import BERTopic
 
     print("Loading embedding model...")
-    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    embedding_model = get_model("sentence_encoder")
 
     stop_words = get_stopwords()
     vectorizer_model = CountVectorizer(stop_words=stop_words)
@@ -162,6 +190,7 @@ def train_models():
 
     print("Saving model...")
     topic_model.save(BERTOPIC_MODEL_PATH)
+    unload("bertopic")
 
     print("\nTraining Complete!")
     
@@ -187,14 +216,33 @@ def train_models():
     print("If topic names (0, 1, 2, etc.) don't match your `manual_topic_labels` dict,")
     print("please update the dictionary in this script.")
 
+def assign_topics_batch(topic_model, texts):
+    """(topic_id, relevance score) per preprocessed text."""
+    def transform_batch(texts):
+        # Embeddings come from the shared inference server when one is configured
+        embeddings = None
+        if inference_client.enabled():
+            embeddings = inference_client.call("embed", texts)
+        if embeddings is not None:
+            embeddings = np.array(embeddings)
+
+        # Get both the predicted topic ID and the probability matrix
+        topic_ids, probabilities = topic_model.transform(texts, embeddings=embeddings)
+
+        # Get the relevance score (the probability of the *assigned* topic)
+        return [(int(t), float(p)) for t, p in zip(topic_ids, probabilities)]
+
+    # Texts already seen by this exact model file are served from the enrichment cache
+    return enrichment_cache.cached_batch("topic", topic_model_version(), texts, transform_batch)
+
 def assign_topic():
     # LOADS the saved models and assigns topics to new article
     
     create_and_sync_topic_tables()
 
     try:
-        # Load the saved BERTopic model
-        topic_model = BERTopic.load(BERTOPIC_MODEL_PATH)
+        # Load the saved BERTopic model (cached after the first call)
+        topic_model = get_model("bertopic")
     except FileNotFoundError:
         print("Model files not found. Please run this file from your terminal to train them:")
         print("python topic_selection.py")
@@ -203,78 +251,39 @@ def assign_topic():
         print(f"Error loading model: {e}")
         return
 
+    print("Assigning topics to new articles...")
+    # Articles that are NOT in the article_topics mapping table yet, streamed in chunks
+    def infer(rows):
+        texts = [preprocess_text_for_bert((row['title'] or "") + " " + (row['description'] or "") + " " + (row['content'] or ""))
+                 for row in rows]
+        return assign_topics_batch(topic_model, texts)
+
     conn = connect_db()
     cursor = conn.cursor()
 
-    print("Finding new articles to assign topics to...")
-    # Find articles that are NOT in the article_topics mapping table yet
-    cursor.execute("""
-        SELECT n.id, n.title, n.description, n.content 
-        FROM news n
-        LEFT JOIN article_topics_mapping at ON n.id = at.article_id
-        WHERE at.article_id IS NULL;
-    """)
-    rows = cursor.fetchall()
-    
-    if not rows:
-        print("No new articles to assign topics to.")
-        cursor.close()
-        conn.close()
-        return
-    
-    print(f"Assigning topics to {len(rows)} new articles...")
-
-    texts_to_assign = []
-    doc_ids = []
-    for row in rows:
-        doc_id = row[0]
-        title = row[1] or ""
-        description = row[2] or ""
-        content = row[3] or ""
-        text = (title + " " + description + " " + content)
-        
-        texts_to_assign.append(preprocess_text_for_bert(text))
-        doc_ids.append(doc_id)
-
-    if not texts_to_assign:
-        print("No processable text found in new articles.")
-        cursor.close()
-        conn.close()
-        return
+    def write(rows, results):
+        cursor.executemany("""
+            INSERT IGNORE INTO article_topics_mapping (article_id, topic_id, relevance_score, assigned_at)
+            VALUES (%s, %s, %s, NOW())""",
+            [(row['id'], int(topic_id), float(score)) for row, (topic_id, score) in zip(rows, results)])
+        enrichment_stages.mark_done(cursor, 'topics', [row['id'] for row in rows])
+        conn.commit()
+        return len(rows)
 
     try:
-        # Get both the predicted topic ID and the probability matrix
-        topic_ids, probabilities = topic_model.transform(texts_to_assign)
-        
-        # Get the relevance score (the probability of the *assigned* topic)
-        relevance_scores = list(probabilities)
-        
+        with pipeline_metrics.track('topics') as run:
+            updates = backlog_stream.run_pipeline(backlog_stream.iter_backlog('topics'), infer, write, metrics=run)
     except Exception as e:
-        print(f"Error transforming new articles: {e}")
+        print(f"Error assigning topics: {e}")
+        return
+    finally:
         cursor.close()
         conn.close()
-        return
 
-    # Loop through results and update DB
-    updates = 0
-    for i in range(len(doc_ids)):
-        doc_id = doc_ids[i]
-        topic_id = int(topic_ids[i])
-        score = float(relevance_scores[i])
-        
-        try:
-            cursor.execute("""
-                INSERT INTO article_topics_mapping (article_id, topic_id, relevance_score, assigned_at)
-                VALUES (%s, %s, %s, NOW())""", (doc_id, topic_id, score))
-            updates += 1
-        except Exception as e:
-            if "Duplicate entry" not in str(e):
-                print(f"Error updating article {doc_id}: {e}")
-    
-    conn.commit()
+    if not updates:
+        print("No new articles to assign topics to.")
+        return
     print(f"Topic assignment complete. {updates} articles mapped.")
-    cursor.close()
-    conn.close()
 
 if __name__ == "__main__":
     print("Running in training mode:")
@@ -1,33 +1,43 @@
 import pandas as pd
-import mysql.connector
+import db_instrumentation
+import request_metrics
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from collections import Counter
-import nltk
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
 import re
 import json
+from model_registry import web_only
+import keyword_dictionary
 
 load_dotenv()
 
-# Download stopwords if not already downloaded
-try:
-    nltk.download('stopwords', quiet=True)
-    stop_words = set(stopwords.words('english'))
-except:
-    stop_words = set()
+# Stopwords are loaded on first use instead of running nltk.download at import
+stop_words = None
+
+def get_stop_words():
+    global stop_words
+    if stop_words is None:
+        try:
+            import nltk
+            from nltk.corpus import stopwords
+            try:
+                stop_words = set(stopwords.words('english'))
+            except LookupError:
+                nltk.download('stopwords', quiet=True)
+                stop_words = set(stopwords.words('english'))
+        except:
+            stop_words = set()
+    return stop_words
 
 class TrendDetector:
     def __init__(self):
         self.connection = self.connect_db()
     
     def connect_db(self):
-        return mysql.connector.connect(
+        return db_instrumentation.connect(
             host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT", 3306)),
+            port=db_instrumentation.mysql_port(),
             user=os.getenv("MYSQL_USER"),
             password=os.getenv("MYSQL_PASSWORD"),
             database=os.getenv("MYSQL_DB")
@@ -37,6 +47,7 @@ class TrendDetector:
         if not text:
             return ""
         text = re.sub(r'\W+', ' ', text.lower())
+        stop_words = get_stop_words()
         tokens = [word for word in text.split() if word not in stop_words and len(word) > 2]
         return ' '.join(tokens)
     
@@ -50,10 +61,11 @@ class TrendDetector:
             LEFT JOIN keywords k ON n.id = k.article_id
             LEFT JOIN article_topics_mapping atm ON n.id = atm.article_id
             LEFT JOIN topics t ON atm.topic_id = t.id
-            WHERE publishedAt >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            ORDER BY publishedAt DESC
+            WHERE n.publishedAt >= %s
+            ORDER BY n.publishedAt DESC
         """
-        cursor.execute(query, (days,))
+        # A constant bound (not NOW() - INTERVAL) lets a partitioned news table skip old months
+        cursor.execute(query, (datetime.now() - timedelta(days=days),))
         articles = cursor.fetchall()
         cursor.close()
         
@@ -61,6 +73,11 @@ class TrendDetector:
     
     def detect_topic_trends(self, df, num_topics=5):
         """Detect trending topics using LDA"""
+        if web_only():
+            return {}
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.decomposition import LatentDirichletAllocation
+
         if len(df) < num_topics:
             num_topics = max(1, len(df) // 2)
         
@@ -78,7 +95,8 @@ class TrendDetector:
             
             # Apply LDA
             lda = LatentDirichletAllocation(n_components=num_topics, random_state=42)
-            lda.fit(X)
+            with request_metrics.timer("model"):
+                lda.fit(X)
             
             # Extract top words for each topic
             feature_names = vectorizer.get_feature_names_out()
@@ -93,15 +111,10 @@ class TrendDetector:
             print(f"Topic modeling error: {e}")
             return {}
     
-    def detect_keyword_trends(self, df, top_n=10):
+    def detect_keyword_trends(self, df, top_n=10, days=3):
         """Detect trending keywords"""
         all_keywords = []
         
-        # Extract keywords from keywords column
-        for keywords in df['keywords'].dropna():
-            if keywords:
-                all_keywords.extend([kw.strip().lower() for kw in keywords.split(',')])
-        
         # Also extract from titles
         for title in df['title'].dropna():
             processed = self.preprocess_text(title)
@@ -109,6 +122,14 @@ class TrendDetector:
         
         # Count and get top trends
         keyword_counts = Counter(all_keywords)
+
+        # Extracted keywords come pre-counted from the keyword_daily_counts rollup, which
+        # is kept per day: the last `days` calendar days are the closest match to the
+        # days * 24h of titles in df
+        try:
+            keyword_counts.update(keyword_dictionary.get_top_keywords(days=days, limit=top_n * 10))
+        except Exception as e:
+            print(f"Error reading keyword counts: {e}")
         
         # Filter out very common words
         common_news_words = {'news', 'update', 'report', 'said', 'year', 'time', 'day'}
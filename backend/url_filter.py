@@ -0,0 +1,168 @@
+import os
+import math
+import mmap
+import fcntl
+import struct
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Persistent Bloom filter of every URL stored in 'news', memory-mapped from disk so
+# all fetcher processes share it without loading it. "Not in the filter" means the
+# URL is new for certain and needs no duplicate check; "maybe in the filter" is
+# confirmed against the database (see fetch_news.store_articles).
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+URL_BLOOM_PATH = os.getenv("URL_BLOOM_PATH", os.path.join(BASE_DIR, "models", "url_bloom.bin"))
+URL_BLOOM_CAPACITY = int(os.getenv("URL_BLOOM_CAPACITY", 10_000_000))
+URL_BLOOM_FP_RATE = float(os.getenv("URL_BLOOM_FP_RATE", 0.001))
+URL_BLOOM_ENABLED = os.getenv("URL_BLOOM", "1").lower() not in ("0", "false", "no")
+
+_MAGIC = b"VSBLOOM1"
+# magic, number of bits, number of hashes, items added
+_HEADER = struct.Struct("<8sQIQ")
+
+def optimal_size(capacity, fp_rate):
+    """(bits, hashes) for `capacity` items at the target false-positive rate."""
+    bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+class BloomFilter:
+    def __init__(self, path=URL_BLOOM_PATH, capacity=URL_BLOOM_CAPACITY, fp_rate=URL_BLOOM_FP_RATE):
+        self.path = path
+        self.lock = threading.Lock()
+        if not os.path.exists(path):
+            self._create(path, *optimal_size(capacity, fp_rate))
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.bits, self.hashes, _ = _HEADER.unpack_from(self.map, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a URL Bloom filter")
+
+    @staticmethod
+    def _create(path, bits, hashes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, bits, hashes, 0))
+            f.truncate(_HEADER.size + (bits + 7) // 8)
+        os.replace(tmp, path)
+
+    @property
+    def count(self):
+        return _HEADER.unpack_from(self.map, 0)[3]
+
+    def _positions(self, url):
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one 128-bit digest
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, url):
+        data, offset = self.map, _HEADER.size
+        return all(data[offset + (p >> 3)] & (1 << (p & 7)) for p in self._positions(url))
+
+    def add(self, url):
+        self.add_many([url])
+
+    def add_many(self, urls):
+        positions = [self._positions(url) for url in urls if url]
+        if not positions:
+            return
+        data, offset = self.map, _HEADER.size
+        # The file lock keeps concurrent fetcher processes from losing each other's bits
+        with self.lock:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                for url_positions in positions:
+                    for p in url_positions:
+                        data[offset + (p >> 3)] |= 1 << (p & 7)
+                magic, bits, hashes, count = _HEADER.unpack_from(data, 0)
+                _HEADER.pack_into(data, 0, magic, bits, hashes, count + len(positions))
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def expected_fp_rate(self):
+        """Theoretical false-positive rate at the current fill."""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'items': self.count,
+            'bits': self.bits,
+            'hashes': self.hashes,
+            'memory_mb': round((_HEADER.size + (self.bits + 7) // 8) / (1024 * 1024), 2),
+            'bits_per_item': round(self.bits / self.count, 1) if self.count else None,
+            'expected_fp_rate': round(self.expected_fp_rate(), 6)
+        }
+
+def measure_fp_rate(bloom, samples=100000):
+    """Measured false-positive rate: the share of never-stored URLs that the filter claims to know."""
+    hits = sum(f"https://fp-probe.invalid/{os.urandom(8).hex()}" in bloom for _ in range(samples))
+    return hits / samples
+
+def rebuild(path=URL_BLOOM_PATH, capacity=None, chunk_size=50000):
+    """Builds a fresh filter from every URL in 'news', sized for twice the current row count by default."""
+    from fetch_news import connect_db
+
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM news")
+    rows = cursor.fetchone()[0]
+    capacity = capacity or max(URL_BLOOM_CAPACITY, rows * 2)
+
+    tmp = path + ".rebuild"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    bloom = BloomFilter(tmp, capacity)
+    last = 0
+    while True:
+        cursor.execute("SELECT id, url FROM news WHERE id > %s ORDER BY id LIMIT %s", (last, chunk_size))
+        chunk = cursor.fetchall()
+        if not chunk:
+            break
+        bloom.add_many([url for _, url in chunk])
+        last = chunk[-1][0]
+    cursor.close()
+    conn.close()
+    bloom.flush()
+    bloom.close()
+    os.replace(tmp, path)
+    print(f"URL Bloom filter rebuilt with {rows} URLs.")
+
+_filter = None
+_filter_lock = threading.Lock()
+
+def get_url_filter():
+    """The process-wide filter, built from the database on first use. None if disabled or unavailable."""
+    global _filter
+    if not URL_BLOOM_ENABLED:
+        return None
+    with _filter_lock:
+        if _filter is None:
+            try:
+                if not os.path.exists(URL_BLOOM_PATH):
+                    rebuild()
+                _filter = BloomFilter()
+            except Exception as e:
+                print(f"URL Bloom filter unavailable, checking every URL in the database: {e}")
+                return None
+    return _filter
+
+if __name__ == "__main__":
+    rebuild()
+    bloom = BloomFilter()
+    report = bloom.stats()
+    report['measured_fp_rate'] = measure_fp_rate(bloom)
+    print(report)
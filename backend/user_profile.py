@@ -1,4 +1,4 @@
-import mysql.connector
+import db_instrumentation
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
@@ -6,9 +6,9 @@ from datetime import datetime, timedelta
 load_dotenv()
 
 def connect_db():
-    conn = mysql.connector.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -1,4 +1,5 @@
 import mysql.connector
+import db_instrumentation
 import os
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -9,9 +10,9 @@ import user_profile
 load_dotenv()
 
 def connect_db():
-    conn = mysql.connector.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -55,6 +56,17 @@ def register_user(email, password, role='user'):
         conn.close()
     return True # Registration successful
 
+def create_token(user_data, secret_key, lifetime=timedelta(days=1)):
+    """The session JWT login() sets as the 'token' cookie, for a login_user() result."""
+    token_payload = {
+        'exp': datetime.utcnow() + lifetime,
+        'iat': datetime.utcnow(),
+        'sub': str(user_data['id']),
+        'username': user_data.get('username', user_data['email']),
+        'role': user_data.get('role', 'user')
+    }
+    return jwt.encode(token_payload, secret_key, algorithm='HS256')
+
 def login_user(email, password):
     conn = connect_db()
     cursor = conn.cursor(dictionary=True)
@@ -1,11 +1,24 @@
-from flask import Flask, render_template, request, redirect, flash, make_response, g, current_app, jsonify
+from flask import Flask, render_template, request, redirect, flash, make_response, g, current_app, jsonify, send_file
 import mysql.connector as mysql
-from text_preprocessing import preprocess_text
+import db_instrumentation
+import request_metrics
+import request_profiler
+import pipeline_metrics
+import retention
+import model_registry
+import work_queue
+
+# Record how long each project module takes to import for the startup report
+# (the regular imports below are then served from the module cache).
+for _module_name in ("query_normalizer", "fetch_news", "user_profile", "users", "analytics_utils", "trend_detector"):
+    model_registry.timed_import(_module_name)
+
+from query_normalizer import normalize_query
 import fetch_news
-import keyword_extractor
 import user_profile
-import topic_selection
 import users
+import entity_dictionary
+import keyword_dictionary
 import os
 from dotenv import load_dotenv
 from functools import wraps
@@ -27,10 +40,6 @@ from analytics_utils import (
     get_top_topics_from_db
 )
 
-# Import sentiment and NER logic
-from sentiment import analyze_and_save_sentiments
-from ner import analyze_and_save_entities
-
 # ADD THIS IMPORT for trend analysis
 from trend_detector import TrendDetector
 
@@ -38,16 +47,33 @@ app_start_time = datetime.now()
 
 load_dotenv()
 
+def run_enrichment_pipeline():
+    # The enrichment modules (and the models behind them) are imported on first use.
+    # In web-only mode they are never imported; the batch scripts do this work instead.
+    if model_registry.web_only():
+        return
+    # Stages run by work_queue.py workers are theirs alone
+    queued = work_queue.queued_stages()
+    if 'keywords' not in queued:
+        import keyword_extractor
+        keyword_extractor.extract_and_store_keywords()
+    if 'topics' not in queued:
+        import topic_selection
+        topic_selection.assign_topic()
+    if 'sentiment' not in queued:
+        from sentiment import analyze_and_save_sentiments
+        analyze_and_save_sentiments()
+    if 'ner' not in queued:
+        from ner import analyze_and_save_entities
+        analyze_and_save_entities()
+
 def fetch_from_db(search_query):
     fetch_news.fetch_and_store()
-    keyword_extractor.extract_and_store_keywords()
-    topic_selection.assign_topic()
-    analyze_and_save_sentiments()
-    analyze_and_save_entities()
+    run_enrichment_pipeline()
     try:
-        connection = mysql.connect(
+        connection = db_instrumentation.connect(
             host = os.getenv("MYSQL_HOST"),
-            port = int(os.getenv("MYSQL_PORT")),
+            port = db_instrumentation.mysql_port(),
             user = os.getenv("MYSQL_USER"),
             password = os.getenv("MYSQL_PASSWORD"),
             database = os.getenv("MYSQL_DB")
@@ -70,7 +96,7 @@ def fetch_from_db(search_query):
                         LEFT JOIN topics t ON atm.topic_id = t.id"""
     articles_raw = []
     if search_query:
-        cleaned_search_query = preprocess_text(search_query)
+        cleaned_search_query = normalize_query(search_query)
         if cleaned_search_query:
             # Add the WHERE clause for searching
             sql_query = sql_select_clause + """ WHERE
@@ -122,24 +148,13 @@ def fetch_from_db(search_query):
         articles_dict[row['id']] = row
         article_ids.append(row['id'])
 
-    ids_placeholder = ','.join(['%s'] * len(article_ids))
-    entity_query = f"""SELECT article_id, name, type 
-                    FROM entities 
-                    WHERE article_id IN ({ids_placeholder})"""
-    cursor.execute(entity_query, tuple(article_ids))
-    entities_raw = cursor.fetchall()
-
-    for entity in entities_raw:
-        article_id = entity['article_id']
-        if article_id in articles_dict:
-            ent_type = entity['type']
-            ent_name = entity['name']
-            if ent_type == 'PERSON':
-                articles_dict[article_id]['entities']['people'].append(ent_name)
-            elif ent_type == 'ORG':
-                articles_dict[article_id]['entities']['organizations'].append(ent_name)
-            elif ent_type in ['GPE', 'LOC']:
-                articles_dict[article_id]['entities']['locations'].append(ent_name)
+    # Canonical entities (one row per article/entity pair) from the entity dictionary
+    grouped_entities = entity_dictionary.get_grouped_entities(cursor, article_ids)
+    for article_id, entities in grouped_entities.items():
+        articles_dict[article_id]['entities'] = entities
+
+    for article_id, keyword_list in keyword_dictionary.get_article_keywords(cursor, article_ids).items():
+        articles_dict[article_id]['keyword_list'] = keyword_list
 
     connection.close()
     
@@ -155,7 +170,9 @@ def generate_summary(articles, user_query=None, max_keywords=3, max_entities=3):
     for article in articles:
         if not headline and article.get('title'):
             headline = article['title']
-        if article.get('keywords'):
+        if article.get('keyword_list'):
+            keyword_list.extend(article['keyword_list'])
+        elif article.get('keywords'):
             keyword_list.extend([k.strip().lower() for k in article['keywords'].split(',') if k.strip()])
         if article.get('topic'):
             topic_list.append(article['topic'].strip())
@@ -201,6 +218,13 @@ def generate_summary(articles, user_query=None, max_keywords=3, max_entities=3):
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
+# Per-route latency, DB and model time (admin dashboard and /metrics)
+request_metrics.init_app(app)
+
+# Optional warm-up hook, e.g. MODEL_WARM_UP=spacy,sentiment,keybert,bertopic
+if os.getenv("MODEL_WARM_UP") and not model_registry.web_only():
+    import topic_selection  # registers the 'bertopic' loader
+    model_registry.warm_up(os.getenv("MODEL_WARM_UP").split(","))
 
 # Decorator to protect routes
 def token_required(f):
@@ -277,15 +301,7 @@ def login():
         user_data = users.login_user(email, password)
 
         if user_data:
-            token_payload = {
-                'exp': datetime.utcnow() + timedelta(days=1),
-                'iat': datetime.utcnow(),
-                'sub': str(user_data['id']),
-                'username': user_data.get('username', user_data['email']),
-                'role': user_data.get('role', 'user')
-            }
-
-            token = jwt.encode(token_payload, secret_key, algorithm='HS256')
+            token = users.create_token(user_data, secret_key)
 
             response = make_response(redirect('/dashboard'))
             response.set_cookie('token', token, httponly=True, samesite='Lax')
@@ -452,9 +468,9 @@ def analytics():
 def article_detail(article_id):
     """Detailed view of a single article"""
     try:
-        connection = mysql.connect(
+        connection = db_instrumentation.connect(
             host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
+            port=db_instrumentation.mysql_port(),
             user=os.getenv("MYSQL_USER"),
             password=os.getenv("MYSQL_PASSWORD"),
             database=os.getenv("MYSQL_DB")
@@ -479,6 +495,8 @@ def article_detail(article_id):
             connection.close()
             flash("Article not found!", "danger")
             return redirect("/dashboard")
+        # Bodies of old articles live compressed in news_archive
+        retention.hydrate(cursor, article)
 
         article['sentiment'] = {
             'positive': article.get('positive'),
@@ -488,20 +506,9 @@ def article_detail(article_id):
         } if article.get('overall') else None
         article['topic'] = article.get('topic_name')
         
-        cursor.execute("""SELECT name, type FROM entities WHERE article_id = %s""", (article_id,))
-        
-        entities_raw = cursor.fetchall()
+        entities = entity_dictionary.get_grouped_entities(cursor, [article_id])[article_id]
         connection.close()
         
-        entities = {'people': [], 'organizations': [], 'locations': []}
-        for ent in entities_raw:
-            if ent['type'] == 'PERSON':
-                entities['people'].append(ent['name'])
-            elif ent['type'] == 'ORG':
-                entities['organizations'].append(ent['name'])
-            elif ent['type'] in ['GPE', 'LOC']:
-                entities['locations'].append(ent['name'])
-        
         return render_template(
             "article_detail.html",
             article=article,
@@ -515,15 +522,29 @@ def article_detail(article_id):
         flash("Error loading article!", "danger")
         return redirect("/trends")
 
+@app.route('/api/trending_entities')
+@token_required
+def api_trending_entities():
+    """Most mentioned canonical entities, e.g. /api/trending_entities?type=PERSON&days=1"""
+    # A missing or non-numeric value falls back to the default instead of a 500
+    days = min(max(request.args.get("days", 1, type=int), 1), 365)
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    entity_type = request.args.get("type")
+    try:
+        return jsonify(entity_dictionary.get_trending_entities(days=days, entity_type=entity_type, limit=limit))
+    except mysql.Error as err:
+        print(f"Database error in trending entities: {err}")
+        return jsonify([])
+
 @app.route('/api/suggest')
 def suggest():
     query = request.args.get('q', '').strip().lower()
     if not query or len(query) < 2:
         return jsonify([])
     try:
-        connection = mysql.connect(
+        connection = db_instrumentation.connect(
             host = os.getenv("MYSQL_HOST"),
-            port = int(os.getenv("MYSQL_PORT")),
+            port = db_instrumentation.mysql_port(),
             user = os.getenv("MYSQL_USER"),
             password = os.getenv("MYSQL_PASSWORD"),
             database = os.getenv("MYSQL_DB")
@@ -535,15 +556,8 @@ def suggest():
                             LIMIT 5""", (f"%{query}%",))
         topics = [row[0] for row in cursor.fetchall() if row[0]]
         
-        cursor.execute("""SELECT DISTINCT keywords FROM keywords
-                            WHERE LOWER(keywords) LIKE %s AND keywords IS NOT NULL
-                            LIMIT 10""", (f"%{query}%",))
-        keywords = []
-        for row in cursor.fetchall():
-            for word in row[0].split(","):
-                word = word.strip()
-                if word and query in word.lower() and word not in keywords:
-                    keywords.append(word)
+        # Distinct keywords come straight from the keyword dictionary, no splitting needed
+        keywords = keyword_dictionary.search_keywords(cursor, query, limit=10)
         suggestions = list(dict.fromkeys(topics + keywords))[:5]
         connection.close()
         return jsonify(suggestions)
@@ -554,9 +568,9 @@ def suggest():
 # ========== ADMIN ROUTES ==========
 def is_admin(user_id):
     """Check if user has admin privileges"""
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -583,6 +597,9 @@ def is_admin(user_id):
     
     return is_admin_user
 
+# Admins can profile any single request with ?profile=1 or 'X-Profile: 1'
+request_profiler.init_app(app, is_admin)
+
 @app.route("/admin")
 @token_required
 def admin_dashboard():
@@ -590,9 +607,9 @@ def admin_dashboard():
         flash("Access denied. Admin privileges required.", "danger")
         return redirect('/dashboard')
     
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -628,8 +645,12 @@ def admin_dashboard():
     
     cursor.execute("SELECT u.id, u.email, u.role, u.createdAt, up.username FROM users u LEFT JOIN user_preferences up ON u.id = up.user_id ORDER BY u.createdAt DESC")
     all_users = cursor.fetchall()
+
+    pipeline_stages = pipeline_metrics.stage_summary(cursor)
     
     conn.close()
+
+    latency = request_metrics.summary()
     
     return render_template(
         "admin_dashboard.html",
@@ -640,7 +661,11 @@ def admin_dashboard():
         keyword_count=keyword_count,
         topic_count=topic_count,
         system_uptime=system_uptime,
-        avg_response=128,
+        avg_response=latency['avg_response_ms'],
+        route_latency=latency['endpoints'],
+        profiles=request_profiler.list_profiles(limit=10),
+        query_stats=db_instrumentation.query_stats(limit=15),
+        pipeline_stages=pipeline_stages,
         users=all_users,
         user=g.username,
         current_user_id=g.user_id,
@@ -658,9 +683,9 @@ def delete_user(user_id):
         flash("You cannot delete your own account.", "danger")
         return redirect('/admin')
     
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -695,9 +720,9 @@ def edit_user(user_id):
         flash("Invalid role specified.", "danger")
         return redirect('/admin')
     
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -747,7 +772,13 @@ def refresh_news():
         flash("Access denied. Admin privileges required.", "danger")
         return redirect('/admin')
     
+    if model_registry.web_only():
+        flash("News enrichment is disabled in web-only mode. Run the batch scripts instead.", "warning")
+        return redirect('/admin')
+
     try:
+        import keyword_extractor
+        import topic_selection
         fetch_news.fetch_and_store()
         keyword_extractor.extract_and_store_keywords()
         topic_selection.assign_topic()
@@ -757,12 +788,90 @@ def refresh_news():
     
     return redirect('/admin')
 
+@app.route("/admin/startup_report")
+@token_required
+def startup_report():
+    """Import and model-load timings of this worker"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    return jsonify(model_registry.startup_report())
+
+@app.route("/admin/enrichment_cache")
+@token_required
+def enrichment_cache_stats():
+    """Hit/miss counters and size of the enrichment result cache"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    import enrichment_cache
+    return jsonify(enrichment_cache.stats())
+
+@app.route("/admin/pipeline_runs")
+@token_required
+def pipeline_runs():
+    """Recent batch stage runs from pipeline_runs, optionally ?stage=sentiment"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    conn = db_instrumentation.connect()
+    cursor = conn.cursor(dictionary=True)
+    runs = pipeline_metrics.recent_runs(cursor, stage=request.args.get("stage"), limit=int(request.args.get("limit", 50)))
+    conn.close()
+    return jsonify(runs)
+
+@app.route("/admin/query_stats")
+@token_required
+def query_stats():
+    """Per-statement SQL timings collected by db_instrumentation"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    return jsonify(db_instrumentation.query_stats(limit=int(request.args.get("limit", 50))))
+
+@app.route("/admin/url_filter")
+@token_required
+def url_filter_stats():
+    """Size, fill and false-positive rate of the fetcher's seen-URL Bloom filter"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    from url_filter import get_url_filter, measure_fp_rate
+    url_filter = get_url_filter()
+    if url_filter is None:
+        return jsonify({'enabled': False})
+    report = url_filter.stats()
+    report['measured_fp_rate'] = measure_fp_rate(url_filter, samples=10000)
+    return jsonify(report)
+
+@app.route("/admin/profiles/<profile_id>/<kind>")
+@token_required
+def download_profile(profile_id, kind):
+    """Saved request profile, kind is 'pstats' or 'collapsed'"""
+    if not is_admin(g.user_id):
+        flash("Access denied. Admin privileges required.", "danger")
+        return redirect('/dashboard')
+    path = request_profiler.profile_path(profile_id, kind)
+    if path is None:
+        return "Profile not found", 404
+    return send_file(path, as_attachment=True)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require 'Authorization: Bearer <token>'"""
+    metrics_token = os.getenv("METRICS_TOKEN")
+    if metrics_token and request.headers.get("Authorization") != f"Bearer {metrics_token}":
+        return "Unauthorized", 401
+    response = make_response(request_metrics.prometheus_text())
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return response
+
 @app.route("/make_me_admin")
 @token_required
 def make_me_admin():
-    conn = mysql.connect(
+    conn = db_instrumentation.connect(
         host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
+        port=db_instrumentation.mysql_port(),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         database=os.getenv("MYSQL_DB")
@@ -807,4 +916,5 @@ def home():
     return render_template("home.html")
 
 if __name__ == "__main__":
+    model_registry.print_startup_report()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,270 @@
+import os
+import time
+import socket
+import argparse
+import multiprocessing
+from dotenv import load_dotenv
+from fetch_news import connect_db
+import enrichment_stages
+
+load_dotenv()
+
+# Job queue for the enrichment stages, so any number of workers on any number of
+# machines can share one MySQL backlog. Workers lease a batch of jobs with
+# SELECT ... FOR UPDATE SKIP LOCKED (MySQL 8.0+), so two workers never get the same
+# article; a worker that dies simply lets its lease expire and the jobs are retried.
+#
+# Start a worker:          python work_queue.py sentiment
+# Try 4 local processes:   python work_queue.py ner --processes 4 --exit-when-idle
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", 32))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 5))
+JOB_ENQUEUE_LIMIT = int(os.getenv("JOB_ENQUEUE_LIMIT", 10000))
+# Stages whose backlog is left to these workers (comma separated, or "all"); the
+# web app then skips them on /dashboard instead of racing the workers
+JOB_QUEUE_STAGES = os.getenv("JOB_QUEUE_STAGES", "")
+
+STAGES = enrichment_stages.RESULT_TABLES
+
+def queued_stages():
+    names = {name.strip() for name in JOB_QUEUE_STAGES.split(",") if name.strip()}
+    return set(STAGES) if "all" in names else names & set(STAGES)
+
+_table_ready = False
+
+def create_jobs_table():
+    global _table_ready
+    if _table_ready:
+        return
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS enrichment_jobs (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        stage VARCHAR(32) NOT NULL,
+        article_id INT NOT NULL,
+        status ENUM('pending', 'leased', 'done', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        lease_owner VARCHAR(128),
+        lease_expires DATETIME,
+        last_error TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY (stage, article_id),
+        INDEX (stage, status, lease_expires),
+        FOREIGN KEY (article_id) REFERENCES news(id)
+    );''')
+    conn.commit()
+    conn.close()
+    _table_ready = True
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue_new_articles(stage, limit=JOB_ENQUEUE_LIMIT):
+    """Adds a job for every article this stage has not processed and has no job for yet. Returns the number added."""
+    enrichment_stages.check_stage(stage)
+    create_jobs_table()
+    enrichment_stages.create_done_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        # The UNIQUE(stage, article_id) key makes concurrent enqueues from several workers harmless
+        cursor.execute(f'''INSERT IGNORE INTO enrichment_jobs (stage, article_id)
+                           SELECT %s, n.id
+                           FROM news n
+                           LEFT JOIN {STAGES[stage]} r ON n.id = r.article_id
+                           LEFT JOIN enrichment_done d ON d.stage = %s AND d.article_id = n.id
+                           LEFT JOIN enrichment_jobs j ON j.stage = %s AND j.article_id = n.id
+                           WHERE r.article_id IS NULL AND d.article_id IS NULL AND j.id IS NULL
+                           LIMIT %s''', (stage, stage, stage, limit))
+        added = cursor.rowcount
+        conn.commit()
+    except Exception as e:
+        # The result table may not exist until the stage has run once
+        print(f"Error enqueueing {stage} jobs: {e}")
+        conn.rollback()
+        added = 0
+    finally:
+        cursor.close()
+        conn.close()
+    return added
+
+def lease_jobs(stage, worker_id, batch_size=JOB_BATCH_SIZE, lease_seconds=JOB_LEASE_SECONDS):
+    """
+    Leases up to batch_size pending (or lease-expired) jobs to worker_id.
+    Returns [(job_id, article_id), ...]. Rows locked by other workers are skipped, not waited on.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute('''SELECT id, article_id FROM enrichment_jobs
+                          WHERE stage = %s AND attempts < %s
+                            AND (status = 'pending' OR (status = 'leased' AND lease_expires < NOW()))
+                          ORDER BY id
+                          LIMIT %s
+                          FOR UPDATE SKIP LOCKED''', (stage, JOB_MAX_ATTEMPTS, batch_size))
+        jobs = cursor.fetchall()
+        if jobs:
+            ids_placeholder = ','.join(['%s'] * len(jobs))
+            cursor.execute(f'''UPDATE enrichment_jobs
+                               SET status = 'leased', lease_owner = %s,
+                                   lease_expires = NOW() + INTERVAL %s SECOND,
+                                   attempts = attempts + 1
+                               WHERE id IN ({ids_placeholder})''',
+                           (worker_id, lease_seconds) + tuple(job_id for job_id, _ in jobs))
+        conn.commit()
+        return jobs
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def complete_jobs(job_ids, worker_id):
+    """Marks jobs done. Jobs whose lease was taken over by another worker are left alone."""
+    if not job_ids:
+        return 0
+    conn = connect_db()
+    cursor = conn.cursor()
+    ids_placeholder = ','.join(['%s'] * len(job_ids))
+    cursor.execute(f'''UPDATE enrichment_jobs
+                       SET status = 'done', lease_owner = NULL, lease_expires = NULL, last_error = NULL
+                       WHERE id IN ({ids_placeholder}) AND lease_owner = %s''',
+                   tuple(job_ids) + (worker_id,))
+    done = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return done
+
+def fail_job(job_id, worker_id, error):
+    """Puts a job back in the queue, or marks it failed once it has used JOB_MAX_ATTEMPTS."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE enrichment_jobs
+                      SET status = IF(attempts >= %s, 'failed', 'pending'),
+                          lease_owner = NULL, lease_expires = NULL, last_error = %s
+                      WHERE id = %s AND lease_owner = %s''',
+                   (JOB_MAX_ATTEMPTS, str(error)[:2000], job_id, worker_id))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+def fail_expired_jobs(stage):
+    """Jobs whose last allowed attempt died with its worker (lease expired) are marked failed."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE enrichment_jobs
+                      SET status = 'failed', lease_owner = NULL, last_error = 'lease expired'
+                      WHERE stage = %s AND status = 'leased' AND attempts >= %s AND lease_expires < NOW()''',
+                   (stage, JOB_MAX_ATTEMPTS))
+    failed = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return failed
+
+def retry_failed_jobs(stage):
+    """Gives failed jobs a fresh set of attempts, e.g. after fixing the cause."""
+    create_jobs_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE enrichment_jobs SET status = 'pending', attempts = 0
+                      WHERE stage = %s AND status = 'failed' ''', (stage,))
+    retried = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return retried
+
+def queue_stats():
+    """{stage: {status: count}}, with expired leases counted separately."""
+    create_jobs_table()
+    conn = connect_db()
+    cursor = conn.cursor()
+    cursor.execute('''SELECT stage,
+                             IF(status = 'leased' AND lease_expires < NOW(), 'expired', status) AS state,
+                             COUNT(*)
+                      FROM enrichment_jobs
+                      GROUP BY stage, state''')
+    stats = {}
+    for stage, state, count in cursor.fetchall():
+        stats.setdefault(stage, {})[state] = count
+    cursor.close()
+    conn.close()
+    return stats
+
+def process_jobs(stage, jobs, worker_id):
+    """Runs one leased batch; on a batch error each job is retried on its own so one bad article cannot sink the rest."""
+    # Articles that already have a result (e.g. written before an expired lease) are skipped by the fetch
+    by_article = {article_id: job_id for job_id, article_id in jobs}
+    try:
+        enrichment_stages.run_batch(stage, list(by_article))
+        return complete_jobs(list(by_article.values()), worker_id)
+    except Exception as e:
+        print(f"[{worker_id}] {stage} batch of {len(jobs)} failed ({e}), retrying jobs one by one...")
+
+    done = 0
+    for article_id, job_id in by_article.items():
+        try:
+            enrichment_stages.run_batch(stage, [article_id])
+            done += complete_jobs([job_id], worker_id)
+        except Exception as e:
+            print(f"[{worker_id}] {stage} job for article {article_id} failed: {e}")
+            fail_job(job_id, worker_id, e)
+    return done
+
+def run_worker(stage, worker_id=None, batch_size=JOB_BATCH_SIZE, exit_when_idle=False):
+    """Leases and processes jobs for one stage until stopped (or until the queue is empty with exit_when_idle)."""
+    enrichment_stages.check_stage(stage)
+    enrichment_stages.prepare(stage)
+    create_jobs_table()
+    worker_id = worker_id or default_worker_id()
+    print(f"[{worker_id}] {stage} worker started.")
+    processed = 0
+    while True:
+        jobs = lease_jobs(stage, worker_id, batch_size)
+        if not jobs:
+            # Discovery only runs when there is nothing leased, so idle workers keep the queue topped up
+            if enqueue_new_articles(stage):
+                continue
+            fail_expired_jobs(stage)
+            if exit_when_idle:
+                break
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        processed += process_jobs(stage, jobs, worker_id)
+    print(f"[{worker_id}] {stage} worker finished, {processed} jobs done.")
+    return processed
+
+def run_local_workers(stage, processes, batch_size=JOB_BATCH_SIZE, exit_when_idle=True):
+    """Starts `processes` workers for a stage on this machine and waits for them."""
+    enrichment_stages.check_stage(stage)
+    create_jobs_table()
+    workers = [multiprocessing.Process(target=run_worker, args=(stage, f"{socket.gethostname()}:local-{i}", batch_size, exit_when_idle))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    print(queue_stats().get(stage, {}))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrichment job queue worker")
+    parser.add_argument("stage", choices=sorted(STAGES) + ["stats"])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=JOB_BATCH_SIZE)
+    parser.add_argument("--exit-when-idle", action="store_true")
+    parser.add_argument("--retry-failed", action="store_true")
+    args = parser.parse_args()
+
+    if args.stage == "stats":
+        print(queue_stats())
+    else:
+        if args.retry_failed:
+            print(f"{retry_failed_jobs(args.stage)} failed jobs re-queued.")
+        if args.processes > 1:
+            run_local_workers(args.stage, args.processes, args.batch_size, args.exit_when_idle)
+        else:
+            run_worker(args.stage, batch_size=args.batch_size, exit_when_idle=args.exit_when_idle)